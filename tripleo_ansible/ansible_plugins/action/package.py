@@ -14,11 +14,25 @@
 # under the License.
 
 
-import imp
+import fcntl
+import json
 import os
+import re
+import sys
+import time
 
+import ansible.constants as C
+import ansible.module_utils.six as six
 import ansible.plugins.action as action
 
+from ansible.module_utils.six.moves import shlex_quote
+
+try:
+    import importlib.util as importlib_util
+except ImportError:  # py27
+    import imp
+    importlib_util = None
+
 
 DOCUMENTATION = """
 ---
@@ -53,6 +67,20 @@ description:
     which indicates why it was skipped. Messages will only be visualized
     when debug mode has been enabled or through registering a variable and
     using it a task which can print messages; e.g. `debug` or `fail`.
+
+    When `tripleo_package_batch` is true, package installations are queued
+    on the controller instead of being executed. Queued packages are
+    installed in a single transaction for each host when a package task
+    with `tripleo_package_batch_flush` set to true runs, or when the last
+    package task of the play runs. Package tasks which can not be queued,
+    for example a removal, flush the queue before they run so ordering is
+    kept. Delegated tasks neither queue nor flush, the queue of a host is
+    only installed on the host itself. Queued tasks are reported as changed
+    since their packages are pending installation. Packages left in the
+    queue at the end of a play, e.g. when the last package tasks of the
+    play were skipped, are installed by the next package task of the host.
+    The `package_batch` callback reports packages still queued at the end
+    of the run as an error.
 options:
   tripleo_enable_package_install:
     description:
@@ -61,6 +89,74 @@ options:
         **NOT** a module argument.
     required: True
     default: True
+  tripleo_package_batch:
+    description:
+      - Boolean option to queue package installations and install them in
+        a single transaction. Only tasks with a `name` and a `state` of
+        `present`, `installed` or `latest` are queued. This option is
+        **NOT** a module argument.
+    required: False
+    default: False
+  tripleo_package_batch_flush:
+    description:
+      - Boolean option which installs the queued packages, together with
+        the packages of the task itself. This option is **NOT** a module
+        argument.
+    required: False
+    default: False
+  tripleo_package_snapshot:
+    description:
+      - Boolean option to skip tasks installing packages which are already
+        installed, based on a snapshot of the installed packages taken once
+        per play. The snapshot is taken again when the configuration of the
+        package manager, its repositories or the rpm database of the host
+        changed. Only tasks with a `name` and a `state` of `present` or
+        `installed` are evaluated. This option is **NOT** a module argument.
+    required: False
+    default: False
+  tripleo_package_prefetch:
+    description:
+      - Boolean option to download, but not install, the packages installed
+        by the play, together with the packages of the task itself. Only
+        supported by the dnf and yum package managers. This option is
+        **NOT** a module argument.
+    required: False
+    default: False
+  tripleo_package_prefetch_concurrency:
+    description:
+      - Maximum number of hosts downloading packages from the same
+        repository host at once. This option is **NOT** a module argument.
+    required: False
+    default: 10
+  tripleo_package_prefetch_wait:
+    description:
+      - Number of seconds a prefetch waits for one of the
+        `tripleo_package_prefetch_concurrency` slots of its repository host.
+        The prefetch is skipped with a warning when no slot was freed in
+        time. This option is **NOT** a module argument.
+    required: False
+    default: 300
+  tripleo_package_prefetch_repo_host:
+    description:
+      - Name of the repository host the packages are downloaded from, used
+        to group the hosts limited by
+        `tripleo_package_prefetch_concurrency`. This option is **NOT** a
+        module argument.
+    required: False
+    default: default
+  tripleo_package_manager_cache_dir:
+    description:
+      - Directory on the controller where the detected package manager of
+        every host is cached. This option is **NOT** a module argument.
+    required: False
+    default: ~/.ansible/tripleo_package_manager
+  tripleo_package_manager_cache_ttl:
+    description:
+      - Number of seconds a cached package manager is valid for. Setting
+        this option to 0 disables the cache. This option is **NOT** a
+        module argument.
+    required: False
+    default: 86400
 """
 
 
@@ -72,26 +168,165 @@ EXAMPLES = """
     state: present
   vars:
     tripleo_enable_package_install: true
+
+# Queue package installations and install them in a single transaction
+- name: Queue Package Installation
+  package:
+    name: mypackage
+    state: present
+  vars:
+    tripleo_package_batch: true
+
+- name: Queue Another Package Installation
+  package:
+    name: myotherpackage
+    state: latest
+  vars:
+    tripleo_package_batch: true
+
+- name: Install Queued Packages
+  package:
+    name: []
+    state: present
+  vars:
+    tripleo_package_batch: true
+    tripleo_package_batch_flush: true
+
+# Download the packages installed by the play before installing them
+- name: Prefetch Packages
+  package:
+    name: []
+    state: present
+  vars:
+    tripleo_package_prefetch: true
+    tripleo_package_prefetch_concurrency: 20
+    tripleo_package_prefetch_repo_host: mirror.example.com
+
+# Skip package installations which are already satisfied
+- name: Run Package Installation
+  package:
+    name: mypackage
+    state: present
+  vars:
+    tripleo_package_snapshot: true
 """
 
+# Package states which can be queued, mapped to the state used to install
+# the queued packages.
+BATCH_STATES = {
+    'present': 'present',
+    'installed': 'present',
+    'latest': 'latest'
+}
 
-# NOTE(cloudnull): imp is being used because core action plugins are not
-#                  importable in py27. Once we get to the point where we
-#                  no longer support py27 these lines should be converted
-#                  to a straight python import.
-#
-#                  >>> from ansible.plugins.action import package
-#
-PKG = imp.load_source(
+# Package states which can be satisfied by the installed package snapshot.
+SNAPSHOT_STATES = ('present', 'installed')
+
+# Package names which are not plain package specs, e.g. version
+# comparisons, globs, groups, files and urls.
+SNAPSHOT_SKIP = re.compile(r'[<>=*?\[/@]|\.rpm$')
+
+# Actions resolved by prefetch, the package module and the modules it
+# hands off to.
+PREFETCH_ACTIONS = (
     'package',
-    os.path.join(
-        os.path.dirname(
-            action.__file__
-        ),
-        'package.py'
-    )
+    'dnf',
+    'yum',
+    'ansible.builtin.package',
+    'ansible.builtin.dnf',
+    'ansible.builtin.yum',
+    'ansible.legacy.package',
+    'ansible.legacy.dnf',
+    'ansible.legacy.yum'
 )
 
+# Actions which may load more tasks while the play runs.
+INCLUDE_ACTIONS = (
+    'include',
+    'include_role',
+    'include_tasks',
+    'ansible.builtin.include',
+    'ansible.builtin.include_role',
+    'ansible.builtin.include_tasks',
+    'ansible.legacy.include',
+    'ansible.legacy.include_role',
+    'ansible.legacy.include_tasks'
+)
+
+# Package names which are the items of a loop.
+LOOP_ITEM = re.compile(r'^\s*\{\{\s*item\s*\}\}\s*$')
+
+# Default maximum of hosts prefetching from the same repository host.
+PREFETCH_CONCURRENCY = 10
+
+# Default number of seconds a prefetch waits for a free slot.
+PREFETCH_WAIT = 300
+
+# Settings of the package manager detection cache.
+PKG_MGR_CACHE_DIR = '~/.ansible/tripleo_package_manager'
+PKG_MGR_CACHE_TTL = 86400
+
+# One line for every installed package, read in a single remote command.
+RPM_QUERY = (
+    "rpm -qa --qf '%{NAME} %{ARCH} %{EPOCHNUM} %{VERSION} %{RELEASE}\\n'"
+)
+
+# Configuration of the package managers and their repositories, and the
+# rpm database. The installed package snapshot of a host is taken again
+# when one of these files changed.
+SNAPSHOT_FILES = (
+    '/etc/yum.conf',
+    '/etc/yum.repos.d/*',
+    '/etc/yum/vars/*',
+    '/etc/yum/pluginconf.d/*',
+    '/etc/dnf/dnf.conf',
+    '/etc/dnf/vars/*',
+    '/etc/dnf/modules.d/*',
+    '/etc/dnf/plugins/*',
+    '/usr/bin/yum',
+    '/usr/bin/dnf',
+    '/var/lib/rpm/Packages',
+    '/var/lib/rpm/rpmdb.sqlite'
+)
+
+
+# Name under which the core package action plugin is loaded. The core
+# plugin can not be imported by its own name because this shim is loaded
+# as `ansible.plugins.action.package`.
+CORE_PKG_MODULE = 'tripleo_core_package_action'
+
+
+def _core_package_action():
+    """Return the core package action plugin module.
+
+    The module is loaded on first use only, tasks which never reach the
+    core plugin (skipped, queued or satisfied tasks) do not load it at all.
+
+    returns: `module`
+    """
+    module = sys.modules.get(CORE_PKG_MODULE)
+    if module is None:
+        path = os.path.join(os.path.dirname(action.__file__), 'package.py')
+        if importlib_util is None:
+            module = imp.load_source(CORE_PKG_MODULE, path)
+        else:
+            spec = importlib_util.spec_from_file_location(
+                CORE_PKG_MODULE,
+                path
+            )
+            module = importlib_util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            sys.modules[CORE_PKG_MODULE] = module
+    return module
+
+
+def _is_template(value):
+    """Check if a variable value needs to be templated.
+
+    returns: `bool`
+    """
+    return isinstance(value, six.string_types) and ('{{' in value or '{%' in value)
+
 
 def _bool_set(bool_opt):
     """Check if option is a bool and return its type.
@@ -117,7 +352,660 @@ def _bool_set(bool_opt):
             return None
 
 
-class ActionModule(PKG.ActionModule):
+def _names(names):
+    """Return package names as a list.
+
+    returns: `list`
+    """
+    if not names:
+        return list()
+    elif isinstance(names, (list, tuple)):
+        return [i for i in names if i]
+    else:
+        return [i.strip() for i in str(names).split(',') if i.strip()]
+
+
+def _package_specs(installed):
+    """Return every spec which matches a package in an rpm snapshot.
+
+    A package can be requested as `name`, `name.arch`, `name-version`,
+    `name-version-release`, `name-version-release.arch` or with an epoch
+    as `name-epoch:version-release` and `name-epoch:version-release.arch`.
+
+    returns: `set`
+    """
+    specs = set()
+    for line in installed:
+        try:
+            name, arch, epoch, version, release = line.split()
+        except ValueError:
+            continue
+        vr = '{}-{}'.format(version, release)
+        evr = '{}:{}'.format(epoch, vr)
+        specs.update([
+            name,
+            '{}.{}'.format(name, arch),
+            '{}-{}'.format(name, version),
+            '{}-{}'.format(name, vr),
+            '{}-{}.{}'.format(name, vr, arch),
+            '{}-{}'.format(name, evr),
+            '{}-{}.{}'.format(name, evr, arch)
+        ])
+    return specs
+
+
+def _play_uuid(task):
+    """Return the uuid of the play a task belongs to.
+
+    returns: `string` || `None`
+    """
+    play = _play_of(task)
+    if play is not None:
+        return play._uuid
+
+
+def _play_tasks(blocks):
+    """Yield every task found in a list of blocks.
+
+    returns: `generator`
+    """
+    for block in blocks:
+        for item in block.block + block.rescue + block.always:
+            if hasattr(item, 'block'):
+                for task in _play_tasks([item]):
+                    yield task
+            else:
+                yield item
+
+
+def _play_of(task):
+    parent = task
+    while parent is not None:
+        play = getattr(parent, '_play', None)
+        if play is not None:
+            return play
+        parent = getattr(parent, '_parent', None)
+
+
+def _play_layout(task):
+    """Return the package tasks of the play a task belongs to.
+
+    The play is compiled by the first task asking for its layout only, the
+    layout is kept in a controller side cache file named after the play
+    uuid, as every task runs in its own worker. `last` holds the uuids of
+    the tasks followed by no package task and no dynamic include,
+    `packages` the arguments, `tripleo_enable_package_install` variable
+    and loop of every package task.
+
+    returns: `dict` || `None`
+    """
+    play = _play_of(task)
+    if play is None:
+        return None
+    layout = _load_cache('play', play._uuid)
+    if layout is not None:
+        return layout
+
+    layout = dict(last=list(), packages=list())
+    for item in _play_tasks(play.compile()):
+        if item.action in PREFETCH_ACTIONS + INCLUDE_ACTIONS:
+            layout['last'] = list()
+        layout['last'].append(item._uuid)
+        if item.action not in PREFETCH_ACTIONS:
+            continue
+        package = dict(
+            args=dict(
+                (k, v) for k, v in item.args.items()
+                if k in ('name', 'state')
+            ),
+            loop=item.loop,
+            loop_with=item.loop_with
+        )
+        item_vars = item.get_vars()
+        if 'tripleo_enable_package_install' in item_vars:
+            package['enabled'] = item_vars['tripleo_enable_package_install']
+        layout['packages'].append(package)
+    try:
+        _save_cache('play', play._uuid, layout)
+    except (TypeError, ValueError):
+        # Values which can not be stored, e.g. vaulted variables, the next
+        # task compiles the play again.
+        pass
+    return layout
+
+
+class _PrefetchSlot(object):
+    """Controller wide slot limiting concurrent prefetches.
+
+    Every repository host has `concurrency` lock files in the local
+    temporary directory of the controller, which is shared by all workers.
+    A prefetch holds a lock on one of them while it downloads. When no slot
+    is free after `wait` seconds, `lock_file` is left unset and the
+    prefetch is given up.
+    """
+
+    def __init__(self, repo_host, concurrency, wait=PREFETCH_WAIT):
+        self.repo_host = re.sub(r'[^A-Za-z0-9_.-]', '_', str(repo_host))
+        self.concurrency = max(int(concurrency), 1)
+        self.wait = float(wait)
+        self.lock_file = None
+
+    def __enter__(self):
+        deadline = time.time() + self.wait
+        while True:
+            for slot in range(self.concurrency):
+                lock_file = open(
+                    os.path.join(
+                        C.DEFAULT_LOCAL_TMP,
+                        'tripleo-package-prefetch-{}-{}.lock'.format(
+                            self.repo_host,
+                            slot
+                        )
+                    ),
+                    'w'
+                )
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    lock_file.close()
+                else:
+                    self.lock_file = lock_file
+                    return self
+            if time.time() >= deadline:
+                return self
+            time.sleep(0.5)
+
+    def __exit__(self, *args):
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+
+
+def _snapshot_query(fingerprint):
+    """Return the remote command reading the installed packages.
+
+    The first line of the output is the fingerprint of `SNAPSHOT_FILES`,
+    the installed packages follow when it differs from `fingerprint`.
+
+    returns: `string`
+    """
+    return (
+        "fingerprint=$(stat -L -c '%n %s %Y' {files} 2>/dev/null | md5sum);"
+        " echo \"$fingerprint\";"
+        " [ \"$fingerprint\" = {previous} ] || ".format(
+            files=' '.join(SNAPSHOT_FILES),
+            previous=shlex_quote(fingerprint or '')
+        ) + RPM_QUERY
+    )
+
+
+def _cache_file(cache_name, host):
+    """Return the controller side cache file for a host.
+
+    Cache files are stored in the local temporary directory of the
+    controller which is removed when the run ends.
+
+    returns: `string`
+    """
+    return os.path.join(
+        C.DEFAULT_LOCAL_TMP,
+        'tripleo-package-{}-{}.json'.format(cache_name, host)
+    )
+
+
+def _load_cache(cache_name, host):
+    try:
+        with open(_cache_file(cache_name, host)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _save_cache(cache_name, host, data):
+    cache_file = _cache_file(cache_name, host)
+    if data is None:
+        if os.path.exists(cache_file):
+            os.unlink(cache_file)
+    else:
+        with open(cache_file + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.rename(cache_file + '.tmp', cache_file)
+
+
+def _pkg_mgr_cache(cache_dir, host, entry=None):
+    """Read or, when `entry` is given, write a package manager cache entry.
+
+    Every host has its own file so concurrent workers never write to the
+    same file.
+
+    returns: `dict` || `None`
+    """
+    cache_file = os.path.join(cache_dir, '{}.json'.format(host))
+    try:
+        if entry is None:
+            with open(cache_file) as f:
+                return json.load(f)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(cache_file + '.tmp', 'w') as f:
+            json.dump(entry, f)
+        os.rename(cache_file + '.tmp', cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class ActionModule(action.ActionBase):
+
+    TRANSFERS_FILES = False
+
+    def __init__(self, *args, **kwargs):
+        super(ActionModule, self).__init__(*args, **kwargs)
+        # Templated variables resolved for this task, by variable name.
+        self._lookups = dict()
+
+    def _lookup_var(self, var_name):
+        """Return the templated value of a host variable.
+
+        The variable is read from the task vars, or the hostvars of the
+        delegated host when delegating. Only values which are templates are
+        rendered. The rendered value is kept for the action, which runs
+        with a single set of task vars, one host and one loop item. In the
+        event of ANY exception `None` is returned.
+
+        returns: `object` || `None`
+        """
+        if var_name in self._lookups:
+            return self._lookups[var_name]
+        task_vars = self._task_vars
+        try:
+            if self._task.delegate_to:
+                host = self._task.delegate_to
+                value = task_vars['hostvars'][host][var_name]
+            else:
+                value = task_vars[var_name]
+            if _is_template(value):
+                value = self._templar.template(value)
+        except Exception:
+            return None
+        self._lookups[var_name] = value
+        return value
+
+    def _lookup_bool(self, var_name):
+        """Return the boolean value of a host variable.
+
+        returns: `bool` || `None`
+        """
+        return _bool_set(bool_opt=self._lookup_var(var_name))
+
+    def _host_facts(self, task_vars):
+        """Return the facts of the target host.
+
+        returns: `dict`
+        """
+        try:
+            if self._task.delegate_to:
+                return task_vars['hostvars'][self._task.delegate_to].get(
+                    'ansible_facts', dict())
+            return task_vars.get('ansible_facts', dict())
+        except Exception:
+            return dict()
+
+    def _package_manager(self, task_vars):
+        """Return the cached package manager of the target host.
+
+        When the package manager is known from the facts of the host
+        `None` is returned and nothing is cached. On a cache miss the
+        package manager is detected on the host and cached.
+
+        returns: `string` || `None`
+        """
+        facts = self._host_facts(task_vars)
+        if facts.get('pkg_mgr'):
+            return None
+
+        ttl = self._lookup_var('tripleo_package_manager_cache_ttl')
+        try:
+            ttl = int(PKG_MGR_CACHE_TTL if ttl is None else ttl)
+        except (TypeError, ValueError):
+            ttl = PKG_MGR_CACHE_TTL
+        if ttl <= 0:
+            return None
+
+        cache_dir = self._lookup_var('tripleo_package_manager_cache_dir')
+        cache_dir = os.path.expanduser(cache_dir or PKG_MGR_CACHE_DIR)
+        host = self._target_host(task_vars)
+        distribution = None
+        if facts.get('distribution'):
+            distribution = '{} {}'.format(
+                facts['distribution'],
+                facts.get('distribution_version')
+            )
+
+        entry = _pkg_mgr_cache(cache_dir, host) or dict()
+        expired = (time.time() - entry.get('time', 0)) >= ttl
+        if distribution and distribution != entry.get('distribution'):
+            expired = True
+        if entry and not expired:
+            return entry.get('pkg_mgr')
+
+        facts = self._execute_module(
+            module_name='setup',
+            module_args=dict(gather_subset='!all'),
+            task_vars=task_vars
+        ).get('ansible_facts', dict())
+        pkg_mgr = facts.get('ansible_pkg_mgr')
+        if pkg_mgr and pkg_mgr != 'unknown':
+            _pkg_mgr_cache(
+                cache_dir,
+                host,
+                dict(
+                    pkg_mgr=pkg_mgr,
+                    distribution='{} {}'.format(
+                        facts.get('ansible_distribution'),
+                        facts.get('ansible_distribution_version')
+                    ),
+                    time=time.time()
+                )
+            )
+            return pkg_mgr
+
+    def _last_package_task(self):
+        """Check if no other package task follows the task in its play.
+
+        Tasks loaded by a dynamic include are not known in advance, they are
+        never considered the last one, nor are tasks followed by a dynamic
+        include.
+
+        returns: `bool`
+        """
+        layout = _play_layout(self._task)
+        return layout is not None and self._task._uuid in layout['last']
+
+    def _batch_state(self):
+        """Return the batch state of the task if it can be queued.
+
+        returns: `string` || `None`
+        """
+        args = self._task.args
+        if self._task.delegate_to or self._task.async_val:
+            return None
+        elif set(args.keys()) - set(['name', 'state']):
+            return None
+        return BATCH_STATES.get(args.get('state', 'present'))
+
+    def _target_host(self, task_vars):
+        return self._task.delegate_to or task_vars.get('inventory_hostname')
+
+    def _run_package(self, tmp, task_vars):
+        """Run the package module.
+
+        Any change made by the package module, which is not a download only
+        run, drops the installed package snapshot of the host. When the
+        package manager is not known from the facts of the host the cached
+        package manager is used.
+
+        returns: `dict`
+        """
+        task_args = self._task.args
+        if task_args.get('use', 'auto') == 'auto':
+            pkg_mgr = self._package_manager(task_vars)
+            if pkg_mgr:
+                self._task.args = dict(task_args, use=pkg_mgr)
+        try:
+            core = _core_package_action().ActionModule(
+                self._task,
+                self._connection,
+                self._play_context,
+                self._loader,
+                self._templar,
+                self._shared_loader_obj
+            )
+            result = core.run(tmp, task_vars)
+        finally:
+            self._task.args = task_args
+        if result.get('changed') and not task_args.get('download_only'):
+            _save_cache('snapshot', self._target_host(task_vars), None)
+        return result
+
+    def _snapshot(self, task_vars):
+        """Return the installed packages of the target host.
+
+        The package list is kept on the controller for the play, with a
+        fingerprint of the package manager, repository and rpm database
+        files of the host. Every use checks the fingerprint in a single
+        remote command, which reads the package list again when the files
+        changed.
+
+        returns: `list` || `None`
+        """
+        host = self._target_host(task_vars)
+        play = _play_uuid(self._task)
+        snapshot = _load_cache('snapshot', host) or dict()
+        previous = None
+        if snapshot.get('play') == play:
+            previous = snapshot.get('fingerprint')
+        query = self._low_level_execute_command(
+            _snapshot_query(previous),
+            sudoable=False
+        )
+        lines = query.get('stdout', '').splitlines()
+        fingerprint = lines[0] if lines else None
+        if previous and fingerprint == previous:
+            return snapshot['packages']
+
+        snapshot = dict(play=play, fingerprint=fingerprint, packages=None)
+        if query.get('rc') == 0 and fingerprint:
+            snapshot['packages'] = lines[1:]
+        _save_cache('snapshot', host, snapshot)
+        return snapshot['packages']
+
+    def _run_snapshot(self, task_vars):
+        """Return an ok result when every package is already installed.
+
+        returns: `dict` || `None`
+        """
+        args = self._task.args
+        if set(args.keys()) - set(['name', 'state', 'use']):
+            return None
+        elif args.get('state', 'present') not in SNAPSHOT_STATES:
+            return None
+
+        names = _names(args.get('name'))
+        if not names or any(SNAPSHOT_SKIP.search(i) for i in names):
+            return None
+
+        installed = self._snapshot(task_vars)
+        if installed is None:
+            return None
+
+        specs = _package_specs(installed)
+        if all(i in specs for i in names):
+            return {
+                'changed': False,
+                'rc': 0,
+                'results': [],
+                'msg': 'all packages are installed, found in the package'
+                       ' snapshot of the host.'
+            }
+
+    def _run_packages(self, tmp, task_vars, packages, **kwargs):
+        """Run the package module once for every state in `packages`.
+
+        Any keyword arguments are passed to the package module.
+
+        returns: `dict`
+        """
+        result = dict(changed=False, results=list())
+        task_args = self._task.args
+        try:
+            for state in sorted(packages):
+                if not packages[state]:
+                    continue
+                self._task.args = dict(
+                    kwargs,
+                    name=packages[state],
+                    state=state
+                )
+                state_result = self._run_package(tmp, task_vars)
+                result['results'].append(state_result)
+                result['changed'] |= state_result.get('changed', False)
+                if state_result.get('failed'):
+                    result.update(
+                        failed=True,
+                        msg=state_result.get('msg', 'Batch install failed')
+                    )
+                    break
+        finally:
+            self._task.args = task_args
+        return result
+
+    def _task_packages(self, package):
+        """Return the state and package names installed by a package task.
+
+        `package` is an entry of the `packages` of the play layout. Tasks
+        which can not be resolved from the current variables, or which are
+        disabled, return `None`.
+
+        returns: `tuple` || `None`
+        """
+        args = package['args']
+        state = BATCH_STATES.get(args.get('state', 'present'))
+        if not state:
+            return None
+        try:
+            if 'enabled' in package and _bool_set(
+                    self._templar.template(package['enabled'])) is False:
+                return None
+            if package['loop'] is not None:
+                # Only loops over the package names are resolved.
+                if not LOOP_ITEM.match(str(args.get('name'))) or \
+                        package['loop_with'] not in (None, 'items', 'list'):
+                    return None
+                names = list()
+                for item in self._templar.template(package['loop']):
+                    names.extend(_names(item))
+            else:
+                names = _names(self._templar.template(args.get('name')))
+        except Exception:
+            return None
+        return state, [i for i in names if not SNAPSHOT_SKIP.search(i)]
+
+    def _run_prefetch(self, tmp, task_vars):
+        """Download the packages installed by the play.
+
+        returns: `dict`
+        """
+        packages = dict()
+        own = self._batch_state()
+        if own:
+            packages[own] = _names(self._task.args.get('name'))
+        layout = _play_layout(self._task)
+        if layout is not None:
+            for package in layout['packages']:
+                task_packages = self._task_packages(package)
+                if task_packages:
+                    state, names = task_packages
+                    state_packages = packages.setdefault(state, list())
+                    for name in names:
+                        if name not in state_packages:
+                            state_packages.append(name)
+
+        if self._lookup_bool('tripleo_package_snapshot') is True:
+            installed = self._snapshot(task_vars)
+            if installed is not None and packages.get('present'):
+                specs = _package_specs(installed)
+                packages['present'] = [
+                    i for i in packages['present'] if i not in specs
+                ]
+
+        concurrency = self._lookup_var('tripleo_package_prefetch_concurrency')
+        repo_host = self._lookup_var('tripleo_package_prefetch_repo_host')
+        wait = self._lookup_var('tripleo_package_prefetch_wait')
+        with _PrefetchSlot(repo_host or 'default',
+                           concurrency or PREFETCH_CONCURRENCY,
+                           PREFETCH_WAIT if wait is None else wait) as slot:
+            if slot.lock_file is None:
+                return {
+                    'changed': False,
+                    'prefetched': dict(),
+                    'warnings': [
+                        'no package prefetch slot was free for {} after {}'
+                        ' seconds, packages will be downloaded at install'
+                        ' time'.format(repo_host or 'default', slot.wait)
+                    ]
+                }
+            result = self._run_packages(
+                tmp,
+                task_vars,
+                packages,
+                download_only=True
+            )
+
+        result['prefetched'] = packages
+        if result.pop('failed', False):
+            result['changed'] = False
+            result['warnings'] = [
+                'package prefetch failed, packages will be downloaded at'
+                ' install time: {}'.format(result.get('msg'))
+            ]
+        return result
+
+    def _run_batch(self, tmp, task_vars, batch):
+        """Queue, flush or run the package task for batched installs.
+
+        returns: `dict`
+        """
+        host = task_vars.get('inventory_hostname')
+        play = _play_uuid(self._task)
+        queue = _load_cache('batch', host) or dict(play=play)
+        flushed = dict(changed=False, results=list())
+        if queue.pop('play') != play:
+            # Packages left in the queue by a previous play are installed
+            # before anything else happens.
+            _save_cache('batch', host, None)
+            flushed = self._run_packages(tmp, task_vars, queue)
+            if flushed.get('failed'):
+                return flushed
+            queue = dict()
+
+        state = batch and self._batch_state()
+        if state:
+            queued = queue.setdefault(state, list())
+            for name in _names(self._task.args.get('name')):
+                if name not in queued:
+                    queued.append(name)
+            flush = self._lookup_bool('tripleo_package_batch_flush')
+            if flush is not True and not self._last_package_task():
+                queue['play'] = play
+                _save_cache('batch', host, queue)
+                # The packages are not installed yet, the task reports the
+                # pending installation as a change.
+                return {
+                    'changed': True,
+                    'pending': True,
+                    'queued': queued,
+                    'msg': 'package installation queued for batch install,'
+                           ' the packages are installed when the queue is'
+                           ' flushed'
+                }
+
+        _save_cache('batch', host, None)
+        result = self._run_packages(tmp, task_vars, queue)
+        result['changed'] |= flushed['changed']
+        result['results'] = flushed['results'] + result['results']
+        if state or result.get('failed'):
+            return result
+
+        # The task could not be queued, it runs after the queue is flushed.
+        task_result = self._run_package(tmp, task_vars)
+        task_result['changed'] = (
+            task_result.get('changed', False) or result['changed']
+        )
+        if result['results']:
+            task_result['batch_results'] = result['results']
+        return task_result
+
     def run(self, tmp=None, task_vars=None):
         """Shim for tripleo package operations.
 
@@ -130,31 +1018,41 @@ class ActionModule(PKG.ActionModule):
           delegation.
         * In the event of ANY exception the module will hand off back to the
           normal package module.
+        * When `tripleo_package_batch` is true package installations are
+          queued and installed in a single transaction at a flush point.
+        * When `tripleo_package_snapshot` is true installations which are
+          already satisfied return without running the package module.
+        * When `tripleo_package_prefetch` is true the packages of the play
+          are downloaded without being installed.
         """
-        try:
-            if self._task.delegate_to:
-                tripleo_pkg = self._templar.template(
-                    "{{ hostvars['%s']['tripleo_enable_package_install'] }}"
-                    % self._task.delegate_to
-                )
-            else:
-                tripleo_pkg = self._templar.template(
-                    "{{ tripleo_enable_package_install }}"
-                )
-        except Exception:  # If any exception run the normal pkg module
-            tripleo_pkg = None
+        self._task_vars = task_vars = task_vars or dict()
+        tripleo_pkg = self._lookup_bool('tripleo_enable_package_install')
+        if (tripleo_pkg is not None) and (tripleo_pkg is False):
+            return {
+                'failed': False,
+                'skipped': True,
+                'msg': 'package installations are currently disabled,'
+                       ' via "tripleo_enable_package_install" being'
+                       ' set to "{}". please check the deployment'
+                       ' settings.'.format(tripleo_pkg),
+                'bool_param': tripleo_pkg
+            }
+
+        if self._lookup_bool('tripleo_package_prefetch') is True:
+            return self._run_prefetch(tmp, task_vars)
+
+        if self._lookup_bool('tripleo_package_snapshot') is True:
+            result = self._run_snapshot(task_vars)
+            if result:
+                return result
+
+        if self._task.delegate_to:
+            # The queue belongs to the host, it is never installed on the
+            # delegated host.
+            return self._run_package(tmp, task_vars)
+
+        batch = self._lookup_bool('tripleo_package_batch') is True
+        if batch or _load_cache('batch', task_vars.get('inventory_hostname')):
+            return self._run_batch(tmp, task_vars, batch)
         else:
-            tripleo_pkg = _bool_set(bool_opt=tripleo_pkg)
-        finally:
-            if (tripleo_pkg is not None) and (tripleo_pkg is False):
-                return {
-                    'failed': False,
-                    'skipped': True,
-                    'msg': 'package installations are currently disabled,'
-                           ' via "tripleo_enable_package_install" being'
-                           ' set to "{}". please check the deployment'
-                           ' settings.'.format(tripleo_pkg),
-                    'bool_param': tripleo_pkg
-                }
-            else:
-                return super(ActionModule, self).run(tmp, task_vars)
+            return self._run_package(tmp, task_vars)
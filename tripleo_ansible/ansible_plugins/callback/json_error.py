@@ -16,9 +16,14 @@
 # Ansible has another callback plugin just called "json.py", which overrides
 # a normal import of "import json", so use absolute imports
 from __future__ import absolute_import
+import hashlib
 import json
 import os
+import re
+import sys
+import time
 
+from ansible.module_utils.six import string_types
 from ansible.plugins.callback import CallbackBase
 
 
@@ -27,6 +32,14 @@ DOCUMENTATION = '''
     short_description: Write errors in JSON format to a log file
     description:
         - This callback writes errors in JSON format to a log file
+        - In streaming mode every error is appended to the log file as a
+          single JSON line as soon as it happens, nothing is kept in
+          memory. The aggregated format can be rebuilt from a stream with
+          `python json_error.py <stream file>`.
+        - In compact mode errors are fingerprinted by task name and
+          normalised message. Each distinct error is stored once together
+          with the list of affected hosts and the number of failures, and
+          large fields of the result are truncated.
     type: aggregate
     options:
       output_dir:
@@ -35,8 +48,161 @@ DOCUMENTATION = '''
         description: Log file where to write errors in JSON format.
         env:
           - name: JSON_ERROR_LOG_FILE
+      stream:
+        name: json-error streaming mode
+        default: False
+        description: Append errors to the log file in JSON Lines format.
+        env:
+          - name: JSON_ERROR_STREAM
+      fsync_interval:
+        name: json-error fsync interval
+        default: 5
+        description:
+          - Minimum number of seconds between two fsync calls of the log
+            file in streaming mode.
+        env:
+          - name: JSON_ERROR_FSYNC_INTERVAL
+      compact:
+        name: json-error compact mode
+        default: False
+        description: Store each distinct error once with its hosts.
+        env:
+          - name: JSON_ERROR_COMPACT
+      max_lines:
+        name: json-error maximum lines
+        default: 50
+        description:
+          - Number of lines kept, from the end, of list fields such as
+            `stdout_lines` in compact mode.
+        env:
+          - name: JSON_ERROR_MAX_LINES
+      max_size:
+        name: json-error maximum field size
+        default: 4096
+        description:
+          - Number of characters kept, from the end, of string fields such
+            as `stdout` in compact mode. `invocation` is replaced by its
+            truncated JSON representation when it is larger.
+        env:
+          - name: JSON_ERROR_MAX_SIZE
 '''
 
+NORMALISE = (
+    (re.compile(r'[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}'),
+     '<uuid>'),
+    (re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}\b'), '<ip>'),
+    (re.compile(r'\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}\b'), '<id>'),
+    (re.compile(r'\d+'), '<n>'),
+)
+
+
+def normalise_message(msg, host=None):
+    """Remove the host specific parts of an error message.
+
+    Host names, UUIDs, addresses and numbers are replaced by placeholders
+    so the same error on different hosts results in the same message.
+
+    returns: `str`
+    """
+    if host:
+        msg = msg.replace(host, '<host>')
+    for pattern, placeholder in NORMALISE:
+        msg = pattern.sub(placeholder, msg)
+    return msg
+
+
+def fingerprint(task, msg):
+    """Return the fingerprint of a task name and normalised message.
+
+    returns: `str`
+    """
+    key = u'{}\0{}'.format(task, msg).encode('utf-8')
+    return hashlib.sha1(key).hexdigest()[:16]
+
+
+def error_message(result):
+    """Return the message of a failed result.
+
+    The last line of stderr is added to the message so commands failing
+    for different reasons are told apart.
+
+    returns: `str`
+    """
+    msg = result.get('msg') or ''
+    if not isinstance(msg, string_types):
+        msg = json.dumps(msg, sort_keys=True)
+    stderr = result.get('stderr')
+    if isinstance(stderr, string_types) and stderr.strip():
+        msg = u'{}\n{}'.format(msg, stderr.strip().splitlines()[-1])
+    return msg.strip()
+
+
+def compact_result(result, max_lines=50, max_size=4096):
+    """Return a copy of a result with its large fields truncated.
+
+    returns: `dict`
+    """
+    compacted = {}
+    for key, value in result.items():
+        if key == 'results' and isinstance(value, list):
+            value = [
+                compact_result(i, max_lines, max_size)
+                if isinstance(i, dict) else i for i in value
+            ]
+        elif key == 'invocation':
+            text = json.dumps(value, sort_keys=True)
+            if len(text) > max_size:
+                value = text[:max_size] + '...'
+        elif isinstance(value, list) and key.endswith('_lines'):
+            if len(value) > max_lines:
+                value = ['... {} lines truncated'.format(
+                    len(value) - max_lines)] + value[-max_lines:]
+        elif isinstance(value, string_types) and len(value) > max_size:
+            value = '...' + value[-max_size:]
+        compacted[key] = value
+    return compacted
+
+
+def add_failure(error, host):
+    """Count a failure of a compact error on a host."""
+    error['count'] += 1
+    if host not in error['hosts']:
+        error['hosts'].append(host)
+
+
+def aggregate_stream(stream_file):
+    """Rebuild the aggregated errors from a JSON Lines stream.
+
+    Incomplete lines, e.g. the last line of an interrupted run, are
+    ignored. Streams written in compact mode are rebuilt in the compact
+    format.
+
+    returns: `dict`
+    """
+    errors = {}
+    with open(stream_file) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'fingerprint' in record:
+                error = errors.setdefault(record['fingerprint'], {
+                    'task': record['task'],
+                    'msg': record.get('msg'),
+                    'hosts': [],
+                    'count': 0,
+                    'result': None
+                })
+                add_failure(error, record['host'])
+                if 'result' in record:
+                    error['msg'] = record['msg']
+                    error['result'] = record['result']
+            else:
+                host_errors = errors.setdefault(record['host'], [])
+                host_errors.append((record['task'], record['result']))
+    return errors
+
 
 class CallbackModule(CallbackBase):
     CALLBACK_VERSION = 2.5
@@ -48,12 +214,83 @@ class CallbackModule(CallbackBase):
         self.errors = {}
         self.log_file = os.getenv(
             'JSON_ERROR_LOG_FILE', 'ansible-errors.json')
+        self.stream = os.getenv(
+            'JSON_ERROR_STREAM', 'false').lower() in ('true', 'yes', '1')
+        self.fsync_interval = float(os.getenv(
+            'JSON_ERROR_FSYNC_INTERVAL', 5))
+        self.compact = os.getenv(
+            'JSON_ERROR_COMPACT', 'false').lower() in ('true', 'yes', '1')
+        self.max_lines = int(os.getenv('JSON_ERROR_MAX_LINES', 50))
+        self.max_size = int(os.getenv('JSON_ERROR_MAX_SIZE', 4096))
+        self.stream_file = None
+        self.last_sync = 0
+
+    def _sync(self):
+        self.stream_file.flush()
+        os.fsync(self.stream_file.fileno())
+        self.last_sync = time.time()
+
+    def _write(self, record):
+        self.stream_file.write(json.dumps(record) + '\n')
+        if time.time() - self.last_sync >= self.fsync_interval:
+            self._sync()
+
+    def _compact_error(self, host, task, result):
+        msg = normalise_message(error_message(result), host)
+        key = fingerprint(task, msg)
+        record = {'fingerprint': key, 'host': host, 'task': task}
+        if key not in self.errors:
+            # Only the first result of a fingerprint is kept, the results
+            # of the other hosts differ by host specific details only.
+            record['msg'] = msg
+            record['result'] = compact_result(
+                result, self.max_lines, self.max_size)
+            self.errors[key] = {
+                'task': task,
+                'msg': msg,
+                'hosts': [],
+                'count': 0,
+                'result': None if self.stream else record['result']
+            }
+        # In streaming mode only the fingerprints are held in memory.
+        if not self.stream:
+            add_failure(self.errors[key], host)
+        return record
+
+    def v2_playbook_on_start(self, playbook):
+        if self.stream and not self.stream_file:
+            self.stream_file = open(self.log_file, 'w')
 
     def v2_playbook_on_stats(self, stats):
-        with open(self.log_file, 'w') as f:
-            f.write(json.dumps(self.errors))
+        if self.stream:
+            if self.stream_file:
+                self._sync()
+                self.stream_file.close()
+                self.stream_file = None
+        else:
+            with open(self.log_file, 'w') as f:
+                f.write(json.dumps(self.errors))
 
     def v2_runner_on_failed(self, result, ignore_errors=False):
         if not ignore_errors:
-            host_errors = self.errors.setdefault(result._host.name, [])
-            host_errors.append((result.task_name, result._result))
+            host = result._host.name
+            task = result.task_name
+            if self.compact:
+                record = self._compact_error(host, task, result._result)
+                if self.stream:
+                    self._write(record)
+            elif self.stream:
+                self._write({
+                    'host': host,
+                    'task': task,
+                    'result': result._result
+                })
+            else:
+                host_errors = self.errors.setdefault(host, [])
+                host_errors.append((task, result._result))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit('usage: {} <stream file>'.format(sys.argv[0]))
+    print(json.dumps(aggregate_stream(sys.argv[1])))
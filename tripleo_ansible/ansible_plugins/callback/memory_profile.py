@@ -0,0 +1,273 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Ansible has another callback plugin just called "json.py", which overrides
+# a normal import of "import json", so use absolute imports
+from __future__ import absolute_import
+import json
+import os
+import resource
+
+from ansible.parsing.ajson import AnsibleJSONEncoder
+from ansible.plugins.callback import CallbackBase
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+DOCUMENTATION = '''
+    callback: memory_profile
+    short_description: Account for the memory used by the controller
+    description:
+        - This callback samples the resident memory of the controller at
+          every task boundary and attributes the growth to the task which
+          just ended.
+        - The serialized size of registered results and of facts returned
+          by tasks is estimated from the first results of every task, the
+          tasks and variables contributing the most are reported at the end
+          of the run and written to a JSON file.
+        - Optionally tracemalloc snapshots are compared at task boundaries
+          to report the source lines allocating the most memory. This is
+          expensive and disabled by default.
+    type: aggregate
+    options:
+      output_file:
+        name: memory-profile JSON file
+        default: ansible-memory.json
+        description: File where the report is written in JSON format.
+        env:
+          - name: MEMORY_PROFILE_FILE
+      samples:
+        name: memory-profile samples
+        default: 10
+        description:
+          - Number of results of every task which are serialized to
+            estimate the size of its registered result and facts.
+        env:
+          - name: MEMORY_PROFILE_SAMPLES
+      top:
+        name: memory-profile report size
+        default: 20
+        description: Number of contributors shown in the report.
+        env:
+          - name: MEMORY_PROFILE_TOP
+      tracemalloc:
+        name: memory-profile tracemalloc
+        default: 0
+        description:
+          - Take a tracemalloc snapshot every this many tasks, 0 disables
+            tracemalloc. Only available with python 3.
+        env:
+          - name: MEMORY_PROFILE_TRACEMALLOC
+'''
+
+PAGE_SIZE = resource.getpagesize()
+
+
+def rss():
+    """Return the resident memory of the controller in bytes.
+
+    The peak resident memory is returned when /proc is not available.
+
+    returns: `int`
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (IOError, OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def serialized_size(value):
+    """Return the size of a value serialized to JSON.
+
+    returns: `int`
+    """
+    try:
+        return len(json.dumps(value, cls=AnsibleJSONEncoder))
+    except (TypeError, ValueError):
+        return 0
+
+
+class Contributor(object):
+    """Estimated memory contribution of a task or variable."""
+
+    __slots__ = ('count', 'sampled', 'size')
+
+    def __init__(self):
+        self.count = 0
+        self.sampled = 0
+        self.size = 0
+
+    def estimate(self):
+        if not self.sampled:
+            return 0
+        return int(self.size * self.count / self.sampled)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sampled': self.sampled,
+            'estimated_bytes': self.estimate()
+        }
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.5
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'memory_profile'
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self, display=None):
+        super(CallbackModule, self).__init__(display)
+        self.output_file = os.getenv(
+            'MEMORY_PROFILE_FILE', 'ansible-memory.json')
+        self.samples = int(os.getenv('MEMORY_PROFILE_SAMPLES', 10))
+        self.top = int(os.getenv('MEMORY_PROFILE_TOP', 20))
+        self.tracemalloc_interval = int(
+            os.getenv('MEMORY_PROFILE_TRACEMALLOC', 0))
+        if tracemalloc is None:
+            self.tracemalloc_interval = 0
+        if self.tracemalloc_interval:
+            tracemalloc.start()
+        self.snapshot = None
+        self.allocations = {}
+        self.task_count = 0
+        self.rss_start = self.rss_peak = self.rss_last = rss()
+        self.task = None
+        # task name: rss growth in bytes
+        self.rss_growth = {}
+        # task name: registered result size
+        self.tasks = {}
+        # variable name: registered result or fact size
+        self.variables = {}
+
+    def _contributor(self, contributors, key):
+        contributor = contributors.get(key)
+        if contributor is None:
+            contributor = contributors[key] = Contributor()
+        return contributor
+
+    def _boundary(self):
+        current = rss()
+        self.rss_peak = max(self.rss_peak, current)
+        if self.task is not None:
+            self.rss_growth[self.task] = (
+                self.rss_growth.get(self.task, 0) + current - self.rss_last)
+        self.rss_last = current
+
+        if not self.tracemalloc_interval:
+            return
+        self.task_count += 1
+        if self.task_count % self.tracemalloc_interval:
+            return
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        if self.snapshot is not None:
+            for stat in snapshot.compare_to(self.snapshot, 'lineno')[:50]:
+                line = str(stat.traceback)
+                self.allocations[line] = (
+                    self.allocations.get(line, 0) + stat.size_diff)
+        self.snapshot = snapshot
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._boundary()
+        self.task = task.get_name().strip()
+
+    v2_playbook_on_handler_task_start = v2_playbook_on_task_start
+
+    def _record(self, result):
+        register = result._task.register
+        facts = result._result.get('ansible_facts') or {}
+        if not register and not facts:
+            return
+        contributor = self._contributor(self.tasks, result.task_name)
+        # Only the first results of a task are serialized, the size of the
+        # others is extrapolated.
+        sample = contributor.sampled < self.samples
+        contributor.count += 1
+        if sample:
+            contributor.sampled += 1
+        if register:
+            variable = self._contributor(self.variables, register)
+            variable.count += 1
+            if sample:
+                size = serialized_size(result._result)
+                contributor.size += size
+                variable.sampled += 1
+                variable.size += size
+        for fact, value in facts.items():
+            variable = self._contributor(self.variables, fact)
+            variable.count += 1
+            if sample:
+                size = serialized_size(value)
+                variable.sampled += 1
+                variable.size += size
+                if not register:
+                    contributor.size += size
+
+    def v2_runner_on_ok(self, result):
+        self._record(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result)
+
+    def _report(self, title, items, unit='bytes'):
+        self._display.banner('{} (top {})'.format(title, self.top))
+        for name, size in items[:self.top]:
+            self._display.display(
+                '{:>14} {}  {}'.format(size, unit, name))
+
+    def v2_playbook_on_stats(self, stats):
+        self._boundary()
+        tasks = sorted(
+            ((k, v.estimate()) for k, v in self.tasks.items()),
+            key=lambda i: i[1], reverse=True)
+        variables = sorted(
+            ((k, v.estimate()) for k, v in self.variables.items()),
+            key=lambda i: i[1], reverse=True)
+        growth = sorted(
+            self.rss_growth.items(), key=lambda i: i[1], reverse=True)
+        allocations = sorted(
+            self.allocations.items(), key=lambda i: i[1], reverse=True)
+
+        self._display.banner('CONTROLLER MEMORY')
+        self._display.display(
+            'rss start {} bytes, end {} bytes, peak {} bytes'.format(
+                self.rss_start, self.rss_last, self.rss_peak))
+        self._report('RSS GROWTH BY TASK', growth)
+        self._report('RESULT AND FACT SIZE BY TASK', tasks)
+        self._report('RESULT AND FACT SIZE BY VARIABLE', variables)
+        if self.tracemalloc_interval:
+            self._report('ALLOCATIONS BY SOURCE LINE', allocations)
+
+        report = {
+            'rss': {
+                'start': self.rss_start,
+                'end': self.rss_last,
+                'peak': self.rss_peak
+            },
+            'rss_growth': dict(growth),
+            'tasks': dict((k, v.to_dict()) for k, v in self.tasks.items()),
+            'variables': dict(
+                (k, v.to_dict()) for k, v in self.variables.items()),
+            'allocations': dict(allocations[:self.top])
+        }
+        with open(self.output_file, 'w') as f:
+            f.write(json.dumps(report))
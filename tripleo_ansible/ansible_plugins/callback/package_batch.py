@@ -0,0 +1,82 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Ansible has another callback plugin just called "json.py", which overrides
+# a normal import of "import json", so use absolute imports
+from __future__ import absolute_import
+import glob
+import json
+import os
+
+import ansible.constants as C
+from ansible.plugins.callback import CallbackBase
+
+
+DOCUMENTATION = '''
+    callback: package_batch
+    short_description: Report package installations left in the batch queue
+    description:
+        - The package action plugin queues package installations when
+          C(tripleo_package_batch) is set and installs them when the queue
+          is flushed. Packages which are still queued at the end of the run
+          were never installed, this callback reports them as an error.
+        - The callback is enabled as soon as it is found in the callback
+          plugins path.
+    type: aggregate
+'''
+
+# Queue files of the package action plugin, one for every host, in the
+# local temporary directory of the run.
+QUEUE_PREFIX = 'tripleo-package-batch-'
+QUEUE_SUFFIX = '.json'
+
+
+def pending_packages(tmp_dir):
+    """Return the queued packages of every host.
+
+    returns: `dict` of host name: `dict` of state: `list` of packages.
+    """
+    pending = dict()
+    pattern = os.path.join(tmp_dir, QUEUE_PREFIX + '*' + QUEUE_SUFFIX)
+    for queue_file in glob.glob(pattern):
+        try:
+            with open(queue_file) as f:
+                queue = json.load(f)
+        except (IOError, OSError, ValueError):
+            continue
+        queue.pop('play', None)
+        queue = dict((k, v) for k, v in queue.items() if v)
+        if queue:
+            host = os.path.basename(queue_file)[
+                len(QUEUE_PREFIX):-len(QUEUE_SUFFIX)]
+            pending[host] = queue
+    return pending
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.5
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'package_batch'
+
+    def v2_playbook_on_stats(self, stats):
+        pending = pending_packages(C.DEFAULT_LOCAL_TMP)
+        for host in sorted(pending):
+            packages = ', '.join(
+                '{} ({})'.format(' '.join(names), state)
+                for state, names in sorted(pending[host].items()))
+            self._display.error(
+                'packages queued for batch install on {} were never'
+                ' installed: {}. End the play with a package task setting'
+                ' tripleo_package_batch_flush.'.format(host, packages))
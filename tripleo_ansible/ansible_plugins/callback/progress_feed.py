@@ -0,0 +1,221 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Ansible has another callback plugin just called "json.py", which overrides
+# a normal import of "import json", so use absolute imports
+from __future__ import absolute_import
+import collections
+import errno
+import json
+import os
+import socket
+import sys
+import time
+
+try:
+    from ansible.plugins.callback import CallbackBase
+except ImportError:
+    # The reference consumer does not need ansible.
+    CallbackBase = object
+
+
+DOCUMENTATION = '''
+    callback: progress_feed
+    short_description: Publish progress events on a unix socket
+    description:
+        - This callback listens on a unix socket and publishes compact
+          progress events, one JSON document per line, to every connected
+          consumer. Events are sent for the start of every play and task,
+          every host result and the final per-host counts.
+        - Sockets are never blocking. Events which can not be delivered are
+          kept in a ring buffer per consumer and the oldest events are
+          dropped when it is full, a slow or absent consumer never stalls
+          the playbook. A consumer connecting during the run first receives
+          the events still held in the ring buffer.
+        - A reference consumer printing the events is available with
+          `python progress_feed.py <socket>`.
+    type: aggregate
+    options:
+      socket:
+        name: progress-feed socket
+        default: ansible-progress.sock
+        description: Path of the unix socket the events are published on.
+        env:
+          - name: PROGRESS_FEED_SOCKET
+      buffer:
+        name: progress-feed ring buffer size
+        default: 1000
+        description: Number of events kept for every consumer.
+        env:
+          - name: PROGRESS_FEED_BUFFER
+'''
+
+RETRY_ERRNOS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+
+class Consumer(object):
+    """Connected consumer and the events not yet sent to it."""
+
+    __slots__ = ('connection', 'pending', 'partial')
+
+    def __init__(self, connection, events):
+        self.connection = connection
+        self.pending = collections.deque(events, maxlen=events.maxlen)
+        self.partial = b''
+
+    def flush(self):
+        """Send as many pending events as the socket accepts.
+
+        returns: `bool` False once the consumer went away.
+        """
+        while self.partial or self.pending:
+            if not self.partial:
+                self.partial = self.pending.popleft()
+            try:
+                sent = self.connection.send(self.partial)
+            except socket.error as e:
+                if e.errno in RETRY_ERRNOS:
+                    return True
+                return False
+            self.partial = self.partial[sent:]
+        return True
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.5
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'progress_feed'
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self, display=None):
+        super(CallbackModule, self).__init__(display)
+        self.socket_path = os.getenv(
+            'PROGRESS_FEED_SOCKET', 'ansible-progress.sock')
+        self.events = collections.deque(
+            maxlen=int(os.getenv('PROGRESS_FEED_BUFFER', 1000)))
+        self.consumers = []
+        self.server = None
+        self.play = None
+
+    def _listen(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.setblocking(False)
+        self.server.bind(self.socket_path)
+        self.server.listen(5)
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except socket.error:
+                return
+            connection.setblocking(False)
+            self.consumers.append(Consumer(connection, self.events))
+
+    def _publish(self, event, **kwargs):
+        if self.server is None:
+            return
+        kwargs['event'] = event
+        kwargs['time'] = round(time.time(), 3)
+        line = (json.dumps(kwargs, separators=(',', ':')) + '\n').encode(
+            'utf-8')
+        # New consumers start with the events published so far.
+        self._accept()
+        self.events.append(line)
+        for consumer in list(self.consumers):
+            consumer.pending.append(line)
+            if not consumer.flush():
+                consumer.connection.close()
+                self.consumers.remove(consumer)
+
+    def v2_playbook_on_start(self, playbook):
+        if self.server is None:
+            self._listen()
+        self._publish('playbook_start',
+                      playbook=os.path.basename(playbook._file_name))
+
+    def v2_playbook_on_play_start(self, play):
+        self.play = play.get_name().strip()
+        self._publish('play_start', play=self.play)
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._publish('task_start', play=self.play,
+                      task=task.get_name().strip())
+
+    v2_playbook_on_handler_task_start = v2_playbook_on_task_start
+
+    def v2_runner_on_ok(self, result):
+        status = 'changed' if result._result.get('changed') else 'ok'
+        self._publish('result', host=result._host.name, status=status)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._publish('result', host=result._host.name,
+                      status='ignored' if ignore_errors else 'failed')
+
+    def v2_runner_on_skipped(self, result):
+        self._publish('result', host=result._host.name, status='skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self._publish('result', host=result._host.name,
+                      status='unreachable')
+
+    def v2_playbook_on_stats(self, stats):
+        hosts = dict(
+            (h, stats.summarize(h)) for h in sorted(stats.processed.keys()))
+        self._publish('playbook_stats', hosts=hosts)
+        if self.server is None:
+            return
+        # Give consumers a last chance to receive the final events without
+        # waiting for them.
+        for consumer in self.consumers:
+            consumer.flush()
+            consumer.connection.close()
+        self.consumers = []
+        self.server.close()
+        self.server = None
+        os.unlink(self.socket_path)
+
+
+def consume(socket_path, out=sys.stdout):
+    """Reference consumer, print the progress of a run.
+
+    Per-host result counts are kept and printed with every task.
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(socket_path)
+    counts = collections.Counter()
+    for line in connection.makefile('r'):
+        event = json.loads(line)
+        if event['event'] == 'play_start':
+            out.write('PLAY {}\n'.format(event['play']))
+        elif event['event'] == 'task_start':
+            out.write('  TASK {} ({})\n'.format(
+                event['task'],
+                ', '.join('{}={}'.format(k, v)
+                          for k, v in sorted(counts.items()))))
+        elif event['event'] == 'result':
+            counts[event['status']] += 1
+        elif event['event'] == 'playbook_stats':
+            for host, summary in sorted(event['hosts'].items()):
+                out.write('{} {}\n'.format(host, json.dumps(summary)))
+        out.flush()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit('usage: {} <socket>'.format(sys.argv[0]))
+    consume(sys.argv[1])
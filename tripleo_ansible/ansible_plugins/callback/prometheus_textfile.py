@@ -0,0 +1,285 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from __future__ import absolute_import
+import os
+import sys
+import tempfile
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+try:
+    import importlib.util as importlib_util
+except ImportError:  # py27
+    import imp
+    importlib_util = None
+
+
+DOCUMENTATION = '''
+    callback: prometheus_textfile
+    short_description: Export playbook run metrics to a Prometheus textfile
+    description:
+        - This callback keeps counters and histograms of a playbook run in
+          memory and writes them to a file in the Prometheus text format,
+          as read by the textfile collector of node_exporter.
+        - The file is replaced atomically, at most every
+          `PROMETHEUS_TEXTFILE_INTERVAL` seconds while the run is going and
+          once more at the end of the run.
+        - Metrics are labelled by playbook, play, role and task status only,
+          never by host or task, so the number of series does not grow
+          with the size of the deployment.
+    type: aggregate
+    options:
+      output_file:
+        name: prometheus textfile
+        default: tripleo_ansible.prom
+        description:
+          - File the metrics are written to. It has to end with `.prom`
+            to be read by the textfile collector.
+        env:
+          - name: PROMETHEUS_TEXTFILE
+      interval:
+        name: prometheus textfile interval
+        default: 30
+        description:
+          - Minimum number of seconds between two writes of the file while
+            the run is going.
+        env:
+          - name: PROMETHEUS_TEXTFILE_INTERVAL
+'''
+
+PREFIX = 'tripleo_ansible'
+
+# Name under which the task timing module_utils, shared by the timing
+# callback plugins, is loaded.
+TASK_TIMING_MODULE = 'tripleo_task_timing'
+
+
+def _task_timing():
+    """Return the task timing module_utils.
+
+    Callback plugins can not import module_utils on the controller, the
+    module is loaded from the module_utils directory next to the callback
+    plugins, once for all of them.
+
+    returns: `module`
+    """
+    module = sys.modules.get(TASK_TIMING_MODULE)
+    if module is None:
+        path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            os.pardir,
+            'module_utils',
+            'task_timing.py'
+        )
+        if importlib_util is None:
+            module = imp.load_source(TASK_TIMING_MODULE, path)
+        else:
+            spec = importlib_util.spec_from_file_location(
+                TASK_TIMING_MODULE,
+                path
+            )
+            module = importlib_util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            sys.modules[TASK_TIMING_MODULE] = module
+    return module
+
+
+task_timing = _task_timing()
+
+
+def escape(value):
+    """Escape a label value.
+
+    returns: `str`
+    """
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def labels(**kwargs):
+    """Return the label set of a sample, sorted by label name.
+
+    returns: `str`
+    """
+    return ','.join(
+        '{}="{}"'.format(k, escape(v)) for k, v in sorted(kwargs.items()))
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.5
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'prometheus_textfile'
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self, display=None):
+        super(CallbackModule, self).__init__(display)
+        self.output_file = os.path.abspath(os.getenv(
+            'PROMETHEUS_TEXTFILE', 'tripleo_ansible.prom'))
+        self.interval = float(os.getenv('PROMETHEUS_TEXTFILE_INTERVAL', 30))
+        self.playbook = ''
+        self.play = ''
+        self.start = time.time()
+        self.end = None
+        self.last_write = 0
+        self.timer = task_timing.TaskTimer()
+        # task uuid: role
+        self.task_roles = {}
+        # (play, role, status): count
+        self.results = {}
+        # (play, role): histogram
+        self.durations = {}
+        # play: [start, end]
+        self.plays = {}
+
+    def _write(self):
+        now = time.time()
+        self.last_write = now
+        base = labels(playbook=self.playbook)
+        end = self.end or now
+        lines = [
+            '# HELP {0}_playbook_start_time_seconds Start time of the '
+            'playbook run.'.format(PREFIX),
+            '# TYPE {0}_playbook_start_time_seconds gauge'.format(PREFIX),
+            '{0}_playbook_start_time_seconds{{{1}}} {2:.3f}'.format(
+                PREFIX, base, self.start),
+            '# HELP {0}_playbook_duration_seconds Duration of the playbook '
+            'run so far.'.format(PREFIX),
+            '# TYPE {0}_playbook_duration_seconds gauge'.format(PREFIX),
+            '{0}_playbook_duration_seconds{{{1}}} {2:.3f}'.format(
+                PREFIX, base, end - self.start),
+            '# HELP {0}_playbook_running Whether the playbook run is '
+            'going.'.format(PREFIX),
+            '# TYPE {0}_playbook_running gauge'.format(PREFIX),
+            '{0}_playbook_running{{{1}}} {2}'.format(
+                PREFIX, base, 0 if self.end else 1),
+            '# HELP {0}_play_duration_seconds Duration of the '
+            'plays.'.format(PREFIX),
+            '# TYPE {0}_play_duration_seconds gauge'.format(PREFIX),
+        ]
+        for play, (start, play_end) in sorted(self.plays.items()):
+            lines.append('{0}_play_duration_seconds{{{1}}} {2:.3f}'.format(
+                PREFIX, labels(playbook=self.playbook, play=play),
+                (play_end or end) - start))
+
+        lines.extend([
+            '# HELP {0}_task_results_total Task results by '
+            'status.'.format(PREFIX),
+            '# TYPE {0}_task_results_total counter'.format(PREFIX),
+        ])
+        for (play, role, status), count in sorted(self.results.items()):
+            lines.append('{0}_task_results_total{{{1}}} {2}'.format(
+                PREFIX,
+                labels(playbook=self.playbook, play=play, role=role,
+                       status=status),
+                count))
+
+        lines.extend([
+            '# HELP {0}_task_duration_seconds Duration of the tasks on '
+            'every host.'.format(PREFIX),
+            '# TYPE {0}_task_duration_seconds histogram'.format(PREFIX),
+        ])
+        for (play, role), histogram in sorted(self.durations.items()):
+            series = labels(playbook=self.playbook, play=play, role=role)
+            for bound, cumulative in histogram.cumulative():
+                lines.append(
+                    '{0}_task_duration_seconds_bucket{{{1},le="{2}"}} '
+                    '{3}'.format(PREFIX, series, bound, cumulative))
+            lines.append(
+                '{0}_task_duration_seconds_bucket{{{1},le="+Inf"}} '
+                '{2}'.format(PREFIX, series, histogram.count))
+            lines.append('{0}_task_duration_seconds_sum{{{1}}} {2:.3f}'.format(
+                PREFIX, series, histogram.sum))
+            lines.append('{0}_task_duration_seconds_count{{{1}}} {2}'.format(
+                PREFIX, series, histogram.count))
+
+        # The collector may read the file at any time, write a temporary
+        # file next to it and rename it into place.
+        directory = os.path.dirname(self.output_file)
+        fd, path = tempfile.mkstemp(
+            prefix='.{}.'.format(os.path.basename(self.output_file)),
+            dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            os.chmod(path, 0o644)
+            os.rename(path, self.output_file)
+        except Exception:
+            os.unlink(path)
+            raise
+
+    def _maybe_write(self):
+        if time.time() - self.last_write >= self.interval:
+            self._write()
+
+    def v2_playbook_on_start(self, playbook):
+        self.playbook = os.path.basename(playbook._file_name)
+        self._write()
+
+    def v2_playbook_on_play_start(self, play):
+        now = time.time()
+        if self.play in self.plays:
+            self.plays[self.play][1] = now
+        self.play = play.get_name().strip()
+        self.plays[self.play] = [now, None]
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self.timer.task_started()
+        if task._uuid not in self.task_roles:
+            self.task_roles[task._uuid] = (
+                task._role.get_name() if task._role else '')
+
+    v2_playbook_on_handler_task_start = v2_playbook_on_task_start
+
+    def v2_runner_on_start(self, host, task):
+        self.timer.host_started(host, task)
+
+    def _record(self, result, status):
+        duration = time.time() - self.timer.host_done(result)
+        role = self.task_roles.get(result._task._uuid, '')
+        key = (self.play, role, status)
+        self.results[key] = self.results.get(key, 0) + 1
+
+        histogram = self.durations.get((self.play, role))
+        if histogram is None:
+            histogram = self.durations[(self.play, role)] = (
+                task_timing.Histogram())
+        histogram.add(duration)
+        self._maybe_write()
+
+    def v2_runner_on_ok(self, result):
+        if result._result.get('changed', False):
+            self._record(result, 'changed')
+        else:
+            self._record(result, 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        if ignore_errors:
+            self._record(result, 'ignored')
+        else:
+            self._record(result, 'failed')
+
+    def v2_runner_on_skipped(self, result):
+        self._record(result, 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self._record(result, 'unreachable')
+
+    def v2_playbook_on_stats(self, stats):
+        self.end = time.time()
+        if self.play in self.plays:
+            self.plays[self.play][1] = self.end
+        self._write()
@@ -0,0 +1,189 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Ansible has another callback plugin just called "json.py", which overrides
+# a normal import of "import json", so use absolute imports
+from __future__ import absolute_import
+import json
+import os
+import sys
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+try:
+    import importlib.util as importlib_util
+except ImportError:  # py27
+    import imp
+    importlib_util = None
+
+
+DOCUMENTATION = '''
+    callback: task_profile
+    short_description: Profile tasks, roles and hosts of a playbook run
+    description:
+        - This callback records how long every task takes on every host and
+          aggregates the durations per task, per role and per host into
+          histograms with fixed buckets, so memory use does not grow with
+          the number of hosts times tasks.
+        - At the end of the run a report of the slowest tasks, roles and
+          hosts is displayed and the histograms are written to a JSON file.
+    type: aggregate
+    options:
+      output_file:
+        name: task-profile JSON file
+        default: ansible-profile.json
+        description: File where the histograms are written in JSON format.
+        env:
+          - name: TASK_PROFILE_FILE
+      top:
+        name: task-profile report size
+        default: 20
+        description:
+          - Number of tasks, roles and hosts shown in the report.
+        env:
+          - name: TASK_PROFILE_TOP
+'''
+
+# Name under which the task timing module_utils, shared by the timing
+# callback plugins, is loaded.
+TASK_TIMING_MODULE = 'tripleo_task_timing'
+
+
+def _task_timing():
+    """Return the task timing module_utils.
+
+    Callback plugins can not import module_utils on the controller, the
+    module is loaded from the module_utils directory next to the callback
+    plugins, once for all of them.
+
+    returns: `module`
+    """
+    module = sys.modules.get(TASK_TIMING_MODULE)
+    if module is None:
+        path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            os.pardir,
+            'module_utils',
+            'task_timing.py'
+        )
+        if importlib_util is None:
+            module = imp.load_source(TASK_TIMING_MODULE, path)
+        else:
+            spec = importlib_util.spec_from_file_location(
+                TASK_TIMING_MODULE,
+                path
+            )
+            module = importlib_util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            sys.modules[TASK_TIMING_MODULE] = module
+    return module
+
+
+task_timing = _task_timing()
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.5
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'task_profile'
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self, display=None):
+        super(CallbackModule, self).__init__(display)
+        self.output_file = os.getenv(
+            'TASK_PROFILE_FILE', 'ansible-profile.json')
+        self.top = int(os.getenv('TASK_PROFILE_TOP', 20))
+        self.start = time.time()
+        self.play = None
+        self.timer = task_timing.TaskTimer()
+        # task uuid: (task key, role)
+        self.task_keys = {}
+        self.tasks = {}
+        self.roles = {}
+        self.hosts = {}
+
+    def _histogram(self, histograms, key):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = task_timing.Histogram()
+        return histogram
+
+    def v2_playbook_on_play_start(self, play):
+        self.play = play.get_name().strip()
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self.timer.task_started()
+        if task._uuid not in self.task_keys:
+            role = task._role.get_name() if task._role else ''
+            name = task.get_name().strip()
+            if role and not name.startswith(role):
+                name = '{} : {}'.format(role, name)
+            self.task_keys[task._uuid] = (
+                '{} | {}'.format(self.play, name), role)
+
+    v2_playbook_on_handler_task_start = v2_playbook_on_task_start
+
+    def v2_runner_on_start(self, host, task):
+        self.timer.host_started(host, task)
+
+    def _record(self, result):
+        duration = time.time() - self.timer.host_done(result)
+        host = result._host.name
+        key, role = self.task_keys.get(
+            result._task._uuid, (result.task_name, ''))
+        self._histogram(self.tasks, key).add(duration)
+        self._histogram(self.hosts, host).add(duration)
+        if role:
+            self._histogram(self.roles, role).add(duration)
+
+    def v2_runner_on_ok(self, result):
+        self._record(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result)
+
+    def v2_runner_on_skipped(self, result):
+        self._record(result)
+
+    def v2_runner_on_unreachable(self, result):
+        self._record(result)
+
+    def _report(self, title, histograms):
+        ranked = sorted(
+            histograms.items(), key=lambda i: i[1].sum, reverse=True)
+        self._display.banner('{} (top {})'.format(title, self.top))
+        self._display.display(
+            '{:>10} {:>10} {:>10} {:>7}  {}'.format(
+                'total', 'max', 'p95', 'count', 'name'))
+        for name, histogram in ranked[:self.top]:
+            self._display.display(
+                '{:>10.2f} {:>10.2f} {:>10.2f} {:>7}  {}'.format(
+                    histogram.sum, histogram.max, histogram.quantile(0.95),
+                    histogram.count, name))
+
+    def v2_playbook_on_stats(self, stats):
+        self._report('SLOWEST TASKS', self.tasks)
+        self._report('SLOWEST ROLES', self.roles)
+        self._report('SLOWEST HOSTS', self.hosts)
+        profile = {
+            'duration': round(time.time() - self.start, 3),
+            'buckets': list(task_timing.BUCKETS),
+            'tasks': dict((k, v.to_dict()) for k, v in self.tasks.items()),
+            'roles': dict((k, v.to_dict()) for k, v in self.roles.items()),
+            'hosts': dict((k, v.to_dict()) for k, v in self.hosts.items())
+        }
+        with open(self.output_file, 'w') as f:
+            f.write(json.dumps(profile))
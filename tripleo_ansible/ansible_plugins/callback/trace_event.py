@@ -0,0 +1,232 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Ansible has another callback plugin just called "json.py", which overrides
+# a normal import of "import json", so use absolute imports
+from __future__ import absolute_import
+import json
+import os
+import sys
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+try:
+    import importlib.util as importlib_util
+except ImportError:  # py27
+    import imp
+    importlib_util = None
+
+
+DOCUMENTATION = '''
+    callback: trace_event
+    short_description: Write a timeline of the run in Chrome trace format
+    description:
+        - This callback writes a timeline of the playbook run in the Chrome
+          trace event format, which can be loaded in chrome://tracing or
+          https://ui.perfetto.dev.
+        - Every host has its own track with a span for each task run on it.
+          Delegated and run_once tasks are marked in the span category. An
+          additional track shows the span of every task over all hosts,
+          which makes serial sections of a playbook easy to spot.
+        - Events are streamed to the file as they happen, memory use does
+          not grow with the length of the run.
+    type: aggregate
+    options:
+      output_file:
+        name: trace-event file
+        default: ansible-trace.json
+        description: File where the trace events are written.
+        env:
+          - name: TRACE_EVENT_FILE
+'''
+
+# Name under which the task timing module_utils, shared by the timing
+# callback plugins, is loaded.
+TASK_TIMING_MODULE = 'tripleo_task_timing'
+
+
+def _task_timing():
+    """Return the task timing module_utils.
+
+    Callback plugins can not import module_utils on the controller, the
+    module is loaded from the module_utils directory next to the callback
+    plugins, once for all of them.
+
+    returns: `module`
+    """
+    module = sys.modules.get(TASK_TIMING_MODULE)
+    if module is None:
+        path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            os.pardir,
+            'module_utils',
+            'task_timing.py'
+        )
+        if importlib_util is None:
+            module = imp.load_source(TASK_TIMING_MODULE, path)
+        else:
+            spec = importlib_util.spec_from_file_location(
+                TASK_TIMING_MODULE,
+                path
+            )
+            module = importlib_util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            sys.modules[TASK_TIMING_MODULE] = module
+    return module
+
+
+task_timing = _task_timing()
+
+
+# Thread id of the track holding the task spans over all hosts.
+TASKS_TID = 0
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.5
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'trace_event'
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self, display=None):
+        super(CallbackModule, self).__init__(display)
+        self.output_file = os.getenv('TRACE_EVENT_FILE', 'ansible-trace.json')
+        self.trace_file = None
+        self.start = time.time()
+        self.pid = os.getpid()
+        # host name: thread id
+        self.tids = {}
+        self.timer = task_timing.TaskTimer()
+        self.task = None
+        self.task_end = 0
+
+    def _ts(self, when, start=None):
+        # Trace timestamps and durations are in microseconds.
+        if start is None:
+            start = self.start
+        return round((when - start) * 1000000, 1)
+
+    def _event(self, event):
+        self.trace_file.write(json.dumps(event) + ',\n')
+
+    def _tid(self, host):
+        tid = self.tids.get(host)
+        if tid is None:
+            tid = self.tids[host] = len(self.tids) + 1
+            self._event({
+                'name': 'thread_name', 'ph': 'M', 'pid': self.pid,
+                'tid': tid, 'args': {'name': host}
+            })
+            self._event({
+                'name': 'thread_sort_index', 'ph': 'M', 'pid': self.pid,
+                'tid': tid, 'args': {'sort_index': tid}
+            })
+        return tid
+
+    def _end_task(self):
+        if self.task is None:
+            return
+        start = self.timer.task_start
+        end = max(self.task_end, start)
+        self._event({
+            'name': self.task[0], 'cat': self.task[1], 'ph': 'X',
+            'pid': self.pid, 'tid': TASKS_TID,
+            'ts': self._ts(start),
+            'dur': self._ts(end, start)
+        })
+        self.task = None
+
+    def v2_playbook_on_start(self, playbook):
+        if self.trace_file:
+            return
+        # The closing bracket is optional in the JSON array format, a trace
+        # of an interrupted run can still be loaded.
+        self.trace_file = open(self.output_file, 'w')
+        self.trace_file.write('[\n')
+        self._event({
+            'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+            'args': {'name': os.path.basename(playbook._file_name)}
+        })
+        self._event({
+            'name': 'thread_name', 'ph': 'M', 'pid': self.pid,
+            'tid': TASKS_TID, 'args': {'name': 'tasks'}
+        })
+
+    def v2_playbook_on_play_start(self, play):
+        self._end_task()
+        now = time.time()
+        self._event({
+            'name': play.get_name().strip(), 'cat': 'play', 'ph': 'i',
+            's': 'p', 'pid': self.pid, 'ts': self._ts(now)
+        })
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._end_task()
+        self.task_end = self.timer.task_started()
+        category = ['task']
+        if task.run_once:
+            category.append('run_once')
+        if task.delegate_to:
+            category.append('delegated')
+        self.task = (task.get_name().strip(), ','.join(category))
+
+    v2_playbook_on_handler_task_start = v2_playbook_on_task_start
+
+    def v2_runner_on_start(self, host, task):
+        self.timer.host_started(host, task)
+
+    def _record(self, result, status):
+        started = self.timer.host_done(result)
+        now = self.task_end = time.time()
+        host = result._host.name
+        task = result._task
+        category = ['task']
+        args = {'status': status}
+        if task.run_once:
+            category.append('run_once')
+        delegated_vars = result._result.get('_ansible_delegated_vars')
+        if delegated_vars:
+            category.append('delegated')
+            args['delegate_to'] = delegated_vars.get(
+                'ansible_delegated_host', delegated_vars.get('ansible_host'))
+        self._event({
+            'name': result.task_name, 'cat': ','.join(category), 'ph': 'X',
+            'pid': self.pid, 'tid': self._tid(host), 'ts': self._ts(started),
+            'dur': self._ts(now, started), 'args': args
+        })
+
+    def v2_runner_on_ok(self, result):
+        self._record(result, 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result, 'ignored' if ignore_errors else 'failed')
+
+    def v2_runner_on_skipped(self, result):
+        self._record(result, 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self._record(result, 'unreachable')
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.trace_file:
+            return
+        self._end_task()
+        self.trace_file.write(json.dumps({
+            'name': 'end', 'cat': 'playbook', 'ph': 'i', 's': 'g',
+            'pid': self.pid, 'ts': self._ts(time.time())
+        }) + '\n]\n')
+        self.trace_file.close()
+        self.trace_file = None
@@ -0,0 +1,194 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from __future__ import absolute_import
+import multiprocessing
+import weakref
+
+from ansible.errors import AnsibleFilterError
+from ansible.module_utils._text import to_text
+from ansible.module_utils.six import string_types
+from ansible.template import Templar
+from ansible.vars.hostvars import STATIC_VARS
+
+
+# id of the hostvars of a play: (weak reference to them, projections)
+_CACHE = {}
+
+_MISSING = object()
+
+
+def _memoize():
+    # Workers get their own copy of the hostvars of the play for every task
+    # and the variables of the hosts do not change while the task arguments
+    # are templated. The controller keeps the hostvars of the play while
+    # facts are set, nothing is memoized there.
+    return multiprocessing.current_process().name != 'MainProcess'
+
+
+def _host_values(hostvars, host, keys):
+    """Template the given keys of the variables of a host.
+
+    The variables of the host are gathered once for all the keys, as
+    ``hostvars[host]`` does for every single key it is asked for.
+    """
+    if host not in hostvars:
+        raise AnsibleFilterError('hostvars: unknown host %s' % host)
+    if hasattr(hostvars, 'raw_get'):
+        variables = hostvars.raw_get(host)
+        templar = Templar(loader=hostvars._loader, variables=variables)
+        values = {}
+        for key in keys:
+            if key in variables:
+                values[key] = templar.template(
+                    variables[key], fail_on_undefined=False,
+                    static_vars=STATIC_VARS)
+        return values
+    # Plain mapping of the variables of every host.
+    return dict((k, hostvars[host][k]) for k in keys if k in hostvars[host])
+
+
+def _projection(hostvars, hosts, keys):
+    """Return the values of the keys for every host, memoized per play.
+
+    returns: `dict`
+    """
+    if not _memoize():
+        return dict((h, _host_values(hostvars, h, keys)) for h in hosts)
+
+    ref, cache = _CACHE.get(id(hostvars), (None, None))
+    if ref is None or ref() is not hostvars:
+        # The hostvars of the previous play are gone.
+        _CACHE.clear()
+        cache = {}
+        try:
+            _CACHE[id(hostvars)] = (weakref.ref(hostvars), cache)
+        except TypeError:
+            pass
+    projection = {}
+    for host in hosts:
+        values = cache.setdefault(host, {})
+        missing = [k for k in keys if k not in values]
+        if missing:
+            found = _host_values(hostvars, host, missing)
+            for key in missing:
+                values[key] = found.get(key, _MISSING)
+        projection[host] = dict(
+            (k, values[k]) for k in keys if values[k] is not _MISSING)
+    return projection
+
+
+def _keys(keys):
+    if isinstance(keys, string_types):
+        return [keys]
+    return list(keys)
+
+
+class FilterModule(object):
+    """TripleO filters."""
+
+    def filters(self):
+        return {
+            'hostvars_project': self.hostvars_project,
+            'hostvars_values': self.hostvars_values,
+            'ssh_known_hosts_lines': self.ssh_known_hosts_lines,
+        }
+
+    def hostvars_project(self, hostvars, hosts, keys):
+        """Return the selected variables of the given hosts.
+
+        The variables of every host are gathered once and only the selected
+        keys are templated, instead of gathering them again for every
+        ``hostvars[host][key]`` access of a Jinja loop. Variables which are
+        not defined for a host are left out.
+
+        ``{{ hostvars | hostvars_project(groups['overcloud'],
+        ['ctlplane_ip', 'ansible_ssh_host_key_rsa_public']) }}``
+
+        returns: `dict` of host name: `dict` of variables.
+        """
+        return _projection(hostvars, list(hosts), _keys(keys))
+
+    def hostvars_values(self, hostvars, hosts, key, default=_MISSING):
+        """Return the value of a variable for every host, in host order.
+
+        ``{{ hostvars | hostvars_values(groups['octavia_nodes'], 'o_hm_ip')
+        | join(', ') }}``
+
+        returns: `list`
+        """
+        hosts = list(hosts)
+        projection = _projection(hostvars, hosts, [key])
+        values = []
+        for host in hosts:
+            value = projection[host].get(key, default)
+            if value is _MISSING:
+                raise AnsibleFilterError(
+                    'hostvars: %s is not defined for %s' % (key, host))
+            values.append(value)
+        return values
+
+    def ssh_known_hosts_lines(self, hostvars, hosts, ctlplane_ip,
+                              cloud_domain, enabled_networks, role_networks,
+                              networks):
+        """Return the ssh_known_hosts lines of the given hosts.
+
+        The lines are the same as the ones of the template previously used
+        by the tripleo-ssh-known-hosts role, the controller address and the
+        networks are the ones of the host templating them:
+
+        ``[ctlplane_ip]*,[host.cloud_domain]*,[host]*,`` then, for every
+        enabled network of the role, ``[ip]*,[host.net]*,[host.net.domain]*``
+        and finally `` ssh-rsa <key>``. Every line ends with a newline.
+
+        returns: `str`
+        """
+        hosts = list(hosts)
+        # Network: name of the network, None when not used by the role.
+        names = [
+            to_text(networks[network]['name'])
+            if network in role_networks else None
+            for network in enabled_networks]
+        keys = ['ansible_ssh_host_key_rsa_public']
+        keys.extend(name + '_ip' for name in names if name is not None)
+        projection = _projection(hostvars, hosts, keys)
+
+        ctlplane_ip = to_text(ctlplane_ip)
+        cloud_domain = to_text(cloud_domain)
+        last = len(names) - 1
+        lines = []
+        for host in hosts:
+            values = projection[host]
+            missing = [k for k in keys if k not in values]
+            if missing:
+                raise AnsibleFilterError(
+                    'hostvars: %s is not defined for %s' % (missing[0], host))
+            host = to_text(host)
+            line = [u'[%s]*,[%s.%s]*,[%s]*' % (
+                ctlplane_ip, host, cloud_domain, host)]
+            if names:
+                line.append(u',')
+            for index, name in enumerate(names):
+                if name is None:
+                    continue
+                line.append(u'[%s]*,[%s.%s]*,[%s.%s.%s]*' % (
+                    to_text(values[name + '_ip']), host, name, host, name,
+                    cloud_domain))
+                if index != last:
+                    line.append(u',')
+            line.append(u' ssh-rsa %s\n' % to_text(
+                values['ansible_ssh_host_key_rsa_public']))
+            lines.append(u''.join(line))
+        return u''.join(lines)
@@ -0,0 +1,197 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from __future__ import absolute_import
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+from ansible.errors import AnsibleParserError
+from ansible.module_utils._text import to_native
+from ansible.module_utils.common._collections_compat import MutableMapping
+from ansible.plugins.inventory.yaml import InventoryModule as YamlInventory
+from ansible.utils.display import Display
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+DOCUMENTATION = '''
+    inventory: tripleo_inventory_cache
+    short_description: YAML inventory parsed once and cached
+    description:
+        - Reads the same YAML inventory files as the C(yaml) inventory
+          plugin, typically the TripleO inventory shared by nested
+          ansible-playbook runs.
+        - The parsed inventory is cached in a compact serialized form keyed
+          by the hash of the file content, later runs on the same file skip
+          the YAML parsing. LibYAML is used to parse the file when it is
+          available.
+        - Files using vault or other Ansible specific YAML tags are parsed
+          by Ansible and never cached.
+        - Cache files which were not used for C(cache_max_age) seconds are
+          removed when a new inventory is cached. The cache directory can be
+          removed at any time.
+    options:
+      cache_dir:
+        description: Directory where the parsed inventories are cached.
+        default: ~/.ansible/tripleo_inventory_cache
+        env:
+          - name: TRIPLEO_INVENTORY_CACHE_DIR
+      cache_max_age:
+        description:
+          - Number of seconds an unused cache file is kept, C(0) keeps
+            cache files forever.
+        type: int
+        default: 86400
+        env:
+          - name: TRIPLEO_INVENTORY_CACHE_MAX_AGE
+      yaml_extensions:
+        description: List of valid extensions for files containing YAML.
+        type: list
+        default: ['.yaml', '.yml', '.json']
+        env:
+          - name: ANSIBLE_YAML_FILENAME_EXT
+          - name: ANSIBLE_INVENTORY_PLUGIN_EXTS
+        ini:
+          - key: yaml_valid_extensions
+            section: defaults
+          - section: inventory_plugin_yaml
+            key: yaml_valid_extensions
+'''
+
+# Changing the format of the cached data requires a new version.
+CACHE_VERSION = b'1'
+
+CACHE_SUFFIX = '.marshal'
+
+VAULT_HEADER = b'$ANSIBLE_VAULT'
+
+display = Display()
+
+
+class InventoryModule(YamlInventory):
+
+    NAME = 'tripleo_inventory_cache'
+
+    def _cache_file(self, content):
+        digest = hashlib.sha1(CACHE_VERSION + b'\0' + content).hexdigest()
+        # The marshal format depends on the python version.
+        return os.path.join(
+            os.path.expanduser(self.get_option('cache_dir')),
+            '{}-py{}{}{}'.format(digest, sys.version_info[0],
+                                 sys.version_info[1], CACHE_SUFFIX))
+
+    def _prune(self, cache_dir):
+        """Remove the cache files not used within `cache_max_age` seconds."""
+        max_age = self.get_option('cache_max_age')
+        if not max_age:
+            return
+        expired = time.time() - max_age
+        for name in os.listdir(cache_dir):
+            # Cache files and the temporary files of interrupted writes.
+            if not (name.endswith(CACHE_SUFFIX) or name.startswith('.')):
+                continue
+            path = os.path.join(cache_dir, name)
+            try:
+                if os.path.getmtime(path) < expired:
+                    os.unlink(path)
+            except OSError:
+                # Removed by a concurrent run.
+                pass
+
+    def _write_cache(self, cache_file, data):
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+        else:
+            self._prune(cache_dir)
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, prefix='.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                marshal.dump(data, f)
+            os.rename(tmp_file, cache_file)
+        except Exception:
+            os.unlink(tmp_file)
+            raise
+
+    def _load(self, path):
+        """Return the data of a YAML inventory, from the cache if possible.
+
+        returns: `object`
+        """
+        with open(path, 'rb') as f:
+            content = f.read()
+        if content.startswith(VAULT_HEADER):
+            return self.loader.load_from_file(path, cache=False)
+
+        cache_file = self._cache_file(content)
+        try:
+            with open(cache_file, 'rb') as f:
+                data = marshal.load(f)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            pass
+        else:
+            try:
+                # Keep the cache files in use from being pruned.
+                os.utime(cache_file, None)
+            except OSError:
+                pass
+            return data
+
+        try:
+            data = yaml.load(content, Loader=SafeLoader)
+        except yaml.YAMLError:
+            # Vaulted values and the other Ansible tags are not known to
+            # the safe loader, invalid files get the Ansible error message.
+            return self.loader.load_from_file(path, cache=False)
+
+        if isinstance(data, dict):
+            try:
+                self._write_cache(cache_file, data)
+            except (IOError, OSError, ValueError) as e:
+                display.vvv('Unable to cache inventory {}: {}'.format(
+                    path, to_native(e)))
+        return data
+
+    def parse(self, inventory, loader, path, cache=True):
+        # Skip the parse method of the yaml plugin, which loads the file.
+        super(YamlInventory, self).parse(inventory, loader, path)
+        self.set_options()
+
+        try:
+            data = self._load(path)
+        except Exception as e:
+            raise AnsibleParserError(e)
+
+        if not data:
+            raise AnsibleParserError('Parsed empty YAML file')
+        elif not isinstance(data, MutableMapping):
+            raise AnsibleParserError(
+                'YAML inventory has invalid structure, it should be a '
+                'dictionary, got: %s' % type(data))
+        elif data.get('plugin'):
+            raise AnsibleParserError(
+                'Plugin configuration YAML file, not YAML inventory')
+
+        for group_name in data:
+            self._parse_group(group_name, data[group_name])
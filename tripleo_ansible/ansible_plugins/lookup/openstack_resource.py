@@ -0,0 +1,397 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from __future__ import absolute_import
+import calendar
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+from ansible import constants as C
+from ansible.errors import AnsibleError
+from ansible.module_utils._text import to_bytes, to_native, to_text
+from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+from ansible.module_utils.six.moves.urllib.parse import quote, urlencode
+from ansible.module_utils.urls import open_url
+from ansible.plugins.lookup import LookupBase
+
+
+DOCUMENTATION = '''
+    lookup: openstack_resource
+    short_description: Find OpenStack resources by name or id
+    description:
+        - Returns the OpenStack projects, networks, subnets, ports, security
+          groups or images matching the given names or ids, or one of their
+          attributes. The first term is the resource type.
+        - All the lookups of a playbook run share one keystone token and
+          the resources found are cached, repeated lookups do not call the
+          OpenStack APIs until the cached entry is older than the ttl. The
+          cache is kept in the local temporary directory of the run, shared
+          by the worker processes and removed at the end of the run.
+        - Resources which are not found are not cached.
+    options:
+      _terms:
+        description:
+          - Resource type (project, network, subnet, port, security_group
+            or image) followed by the names or ids of the resources.
+        required: true
+      field:
+        description: Attribute of the resources to return.
+      filters:
+        description:
+          - Additional filters passed to the API to list the resources,
+            e.g. the owner and visibility of images.
+        type: dict
+      default:
+        description:
+          - Value returned for the resources not found, an error is raised
+            when it is not set.
+      ttl:
+        description: Time in seconds the resources found are cached.
+        default: 300
+        env:
+          - name: TRIPLEO_OPENSTACK_LOOKUP_TTL
+      auth_url:
+        description: Keystone URL.
+        env:
+          - name: OS_AUTH_URL
+      username:
+        description: User name.
+        env:
+          - name: OS_USERNAME
+      password:
+        description: Password.
+        env:
+          - name: OS_PASSWORD
+      project_name:
+        description: Project the token is scoped to.
+        env:
+          - name: OS_PROJECT_NAME
+      user_domain_name:
+        description: Domain of the user.
+        default: Default
+        env:
+          - name: OS_USER_DOMAIN_NAME
+      project_domain_name:
+        description: Domain of the project.
+        default: Default
+        env:
+          - name: OS_PROJECT_DOMAIN_NAME
+      region_name:
+        description: Region of the endpoints used.
+        env:
+          - name: OS_REGION_NAME
+      interface:
+        description: Interface of the endpoints used.
+        default: public
+        env:
+          - name: OS_INTERFACE
+      validate_certs:
+        description: Whether the certificates of the endpoints are checked.
+        type: bool
+        default: true
+'''
+
+EXAMPLES = '''
+- name: Get the id of the service project
+  set_fact:
+    service_project_id: "{{ lookup('openstack_resource', 'project', 'service',
+                            field='id', auth_url=os_auth_url,
+                            username=os_username, password=os_password,
+                            project_name=os_project_name) }}"
+
+- name: Get the private images of the service project named amphora
+  debug:
+    msg: "{{ query('openstack_resource', 'image', 'amphora',
+             filters={'owner': service_project_id,
+                      'visibility': 'private'}) }}"
+'''
+
+RETURN = '''
+    _raw:
+      description:
+        - The resources found, or the value of their I(field) attribute.
+'''
+
+# Resource type: (service type, path, collection)
+RESOURCES = {
+    'project': ('identity', '/v3/projects', 'projects'),
+    'network': ('network', '/v2.0/networks', 'networks'),
+    'subnet': ('network', '/v2.0/subnets', 'subnets'),
+    'port': ('network', '/v2.0/ports', 'ports'),
+    'security_group': ('network', '/v2.0/security-groups', 'security_groups'),
+    'image': ('image', '/v2/images', 'images'),
+}
+
+VERSION_RE = re.compile(r'/v\d+(\.\d+)?/?$')
+
+# Tokens are renewed when they expire in less than this many seconds.
+TOKEN_MARGIN = 60
+
+# Cache of this process, the files of the run cache are read only once.
+_CACHE = {}
+
+
+def _key(*items):
+    return hashlib.sha1(to_bytes(json.dumps(items, sort_keys=True))).hexdigest()
+
+
+def _cache_dir():
+    # The local temporary directory is created by the controller before
+    # forking the workers and removed at the end of the run.
+    cache_dir = os.path.join(C.DEFAULT_LOCAL_TMP, 'openstack_resource')
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir, 0o700)
+        except OSError:
+            if not os.path.isdir(cache_dir):
+                raise
+    return cache_dir
+
+
+def _cache_get(key, valid):
+    """Return a valid entry from the cache of the process or of the run."""
+    entry = _CACHE.get(key)
+    if entry is None or not valid(entry):
+        try:
+            with open(os.path.join(_cache_dir(), key)) as f:
+                entry = _CACHE[key] = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not valid(entry):
+            return None
+    return entry['value']
+
+
+def _cache_set(key, value):
+    entry = _CACHE[key] = {'time': time.time(), 'value': value}
+    try:
+        cache_dir = _cache_dir()
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, prefix='.')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.rename(tmp_file, os.path.join(cache_dir, key))
+    except (IOError, OSError):
+        # Other workers will call the APIs again.
+        pass
+
+
+def _cache_del(key):
+    _CACHE.pop(key, None)
+    try:
+        os.unlink(os.path.join(_cache_dir(), key))
+    except OSError:
+        pass
+
+
+@contextlib.contextmanager
+def _lock(key):
+    """Let one worker at a time look for an entry of the run cache.
+
+    The others wait and find it in the cache instead of calling the APIs.
+    """
+    try:
+        lock_file = open(os.path.join(_cache_dir(), '.lock-' + key), 'a')
+    except (IOError, OSError):
+        yield
+        return
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _token_valid(entry):
+    return entry['value']['expires'] - TOKEN_MARGIN > time.time()
+
+
+class LookupModule(LookupBase):
+
+    def _request(self, url, token=None, data=None):
+        headers = {'Accept': 'application/json'}
+        if token:
+            headers['X-Auth-Token'] = token
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+            data = json.dumps(data)
+        return open_url(
+            url, data=data, headers=headers,
+            method='POST' if data is not None else 'GET',
+            validate_certs=self.get_option('validate_certs'),
+            timeout=30)
+
+    def _session_key(self):
+        return _key('session', *[
+            self.get_option(i) for i in (
+                'auth_url', 'username', 'password', 'project_name',
+                'user_domain_name', 'project_domain_name')])
+
+    def _session(self):
+        """Return a token and the service catalog, reusing the run token.
+
+        returns: `dict`
+        """
+        key = self._session_key()
+        session = _cache_get(key, _token_valid)
+        if session is None:
+            with _lock(key):
+                # Another worker may have authenticated in the meantime.
+                session = _cache_get(key, _token_valid)
+                if session is None:
+                    session = self._authenticate()
+                    _cache_set(key, session)
+        return session
+
+    def _authenticate(self):
+        """Return a new token and the service catalog."""
+        auth_url = self.get_option('auth_url')
+        if not auth_url:
+            raise AnsibleError('openstack_resource: auth_url is not set')
+        auth = {
+            'auth': {
+                'identity': {
+                    'methods': ['password'],
+                    'password': {
+                        'user': {
+                            'name': self.get_option('username'),
+                            'password': self.get_option('password'),
+                            'domain': {
+                                'name': self.get_option('user_domain_name')
+                            }
+                        }
+                    }
+                },
+                'scope': {
+                    'project': {
+                        'name': self.get_option('project_name'),
+                        'domain': {
+                            'name': self.get_option('project_domain_name')
+                        }
+                    }
+                }
+            }
+        }
+        url = VERSION_RE.sub('', auth_url.rstrip('/')) + '/v3/auth/tokens'
+        try:
+            response = self._request(url, data=auth)
+            body = json.loads(to_text(response.read()))
+        except (HTTPError, URLError, ValueError) as e:
+            raise AnsibleError(
+                'openstack_resource: authentication failed: %s' % to_native(e))
+        expires = body['token']['expires_at']
+        return {
+            'token': response.info().get('X-Subject-Token'),
+            'catalog': body['token'].get('catalog', []),
+            'expires': calendar.timegm(
+                time.strptime(expires[:19], '%Y-%m-%dT%H:%M:%S'))
+        }
+
+    def _endpoint(self, session, service_type):
+        region = self.get_option('region_name')
+        interface = self.get_option('interface')
+        for service in session['catalog']:
+            if service.get('type') != service_type:
+                continue
+            for endpoint in service.get('endpoints', []):
+                if endpoint.get('interface') != interface:
+                    continue
+                if region and region not in (
+                        endpoint.get('region'), endpoint.get('region_id')):
+                    continue
+                return VERSION_RE.sub('', endpoint['url'].rstrip('/'))
+        raise AnsibleError(
+            'openstack_resource: no %s endpoint found in the catalog'
+            % service_type)
+
+    def _get(self, url):
+        """Return the decoded response, None when it was not found.
+
+        The token is renewed once when it was revoked.
+        """
+        for attempt in (1, 2):
+            session = self._session()
+            try:
+                response = self._request(url, token=session['token'])
+                return json.loads(to_text(response.read()))
+            except HTTPError as e:
+                if e.code == 404:
+                    return None
+                if e.code != 401 or attempt == 2:
+                    raise AnsibleError(
+                        'openstack_resource: %s: %s' % (url, to_native(e)))
+                _cache_del(self._session_key())
+            except (URLError, ValueError) as e:
+                raise AnsibleError(
+                    'openstack_resource: %s: %s' % (url, to_native(e)))
+
+    def _find(self, resource_type, term, filters):
+        service_type, path, collection = RESOURCES[resource_type]
+        base = self._endpoint(self._session(), service_type) + path
+        query = dict(filters, name=term)
+        found = self._get(base + '?' + urlencode(sorted(query.items())))
+        resources = (found or {}).get(collection, [])
+        if not resources:
+            # The resource can also be given by id.
+            found = self._get(base + '/' + quote(term))
+            if found:
+                resource = found.get(collection[:-1], found)
+                if all(resource.get(k) == v for k, v in filters.items()):
+                    resources = [resource]
+        if len(resources) > 1:
+            raise AnsibleError(
+                'openstack_resource: more than one %s named %s'
+                % (resource_type, term))
+        return resources[0] if resources else None
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+        if not terms or terms[0] not in RESOURCES:
+            raise AnsibleError(
+                'openstack_resource: the first term must be one of %s'
+                % ', '.join(sorted(RESOURCES)))
+        resource_type = terms[0]
+        field = self.get_option('field')
+        filters = self.get_option('filters') or {}
+        ttl = int(self.get_option('ttl'))
+
+        def fresh(entry):
+            return time.time() - entry['time'] <= ttl
+
+        ret = []
+        for term in terms[1:]:
+            key = _key(self._session_key(), resource_type, term, filters)
+            resource = _cache_get(key, fresh)
+            if resource is None:
+                with _lock(key):
+                    resource = _cache_get(key, fresh)
+                    if resource is None:
+                        resource = self._find(resource_type, term, filters)
+                        if resource is not None:
+                            _cache_set(key, resource)
+            if resource is None:
+                if 'default' not in kwargs:
+                    raise AnsibleError(
+                        'openstack_resource: no %s found for %s'
+                        % (resource_type, term))
+                ret.append(kwargs['default'])
+            elif field:
+                ret.append(resource.get(field))
+            else:
+                ret.append(resource)
+        return ret
@@ -0,0 +1,128 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Run podman commands with a timeout, retries and timings."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import random
+import re
+import time
+
+
+# Errors worth trying the command again for: storage lock contention and
+# registry server errors.
+TRANSIENT_ERRORS = re.compile(
+    r'database is locked'
+    r'|(error|timeout|timed out) (acquiring|waiting for|obtaining) [\w ]*lock'
+    r'|resource temporarily unavailable'
+    r'|unexpected http status: 5\d\d'
+    r'|(status|code)[: ]+5\d\d\b'
+    r'|\b50[0234] (internal server error|bad gateway|service unavailable'
+    r'|gateway time-?out)',
+    re.IGNORECASE
+)
+
+# Commands named after their first two arguments in the timings.
+COMMAND_GROUPS = ('container', 'image')
+
+# Exit code of timeout(1) when the command timed out.
+TIMEOUT_RC = 124
+
+
+class PodmanRunner(object):
+    """Run podman for a module.
+
+    The duration of the commands, retries included, is added to the
+    `timings` dictionary, keyed by phase. The timeout and the number of
+    retries default to the `timeout` and `retries` options of the module.
+    """
+
+    def __init__(self, module, executable, timings=None, timeout=None,
+                 retries=None, delay=1.0, max_delay=30.0):
+        self.module = module
+        self.executable = executable
+        self.timings = timings if timings is not None else dict()
+        if timeout is None:
+            timeout = module.params.get('timeout')
+        if retries is None:
+            retries = module.params.get('retries', 3)
+        self.timeout = timeout
+        self.retries = max(retries or 0, 0)
+        self.delay = delay
+        self.max_delay = max_delay
+        self._timeout_cmd = None
+        if self.timeout:
+            self._timeout_cmd = module.get_bin_path('timeout')
+            if not self._timeout_cmd:
+                module.warn('timeout(1) was not found, podman commands are '
+                            'run without a timeout')
+
+    def _command(self, args, timeout):
+        command = [self.executable] + list(args)
+        if timeout and self._timeout_cmd:
+            # Give podman a chance to release its locks before killing it.
+            command = [self._timeout_cmd, '--kill-after=10',
+                       str(timeout)] + command
+        return command
+
+    def backoff(self, attempt):
+        """Return the jittered number of seconds to wait before a retry.
+
+        returns: `float`
+        """
+        delay = min(self.max_delay, self.delay * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.5)
+
+    def run(self, args, phase=None, expected_rc=0, ignore_errors=False,
+            timeout=None, data=None):
+        """Run a podman command.
+
+        Commands failing with a transient error are run again after a
+        jittered exponential backoff. When `ignore_errors` is False the
+        module fails when the command does not return `expected_rc`.
+
+        returns: `tuple` rc, stdout, stderr
+        """
+        if phase is None:
+            phase = args[0]
+            if phase in COMMAND_GROUPS:
+                phase = ' '.join(args[:2])
+        if timeout is None:
+            timeout = self.timeout
+        command = self._command(args, timeout)
+        start = time.time()
+        attempt = 0
+        while True:
+            rc, out, err = self.module.run_command(command, data=data)
+            if rc == expected_rc or attempt >= self.retries:
+                break
+            if rc == TIMEOUT_RC or not TRANSIENT_ERRORS.search(err):
+                break
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+        self.timings[phase] = round(
+            self.timings.get(phase, 0) + time.time() - start, 3)
+        if rc == TIMEOUT_RC and timeout and self._timeout_cmd:
+            err = 'podman {0} timed out after {1} seconds {2}'.format(
+                ' '.join(args[:2]), timeout, err).strip()
+        if not ignore_errors and rc != expected_rc:
+            self.module.fail_json(
+                msg='Failed to run {command} {err}'.format(
+                    command=command, err=err),
+                timings=self.timings)
+        return rc, out, err
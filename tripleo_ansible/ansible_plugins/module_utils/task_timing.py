@@ -0,0 +1,119 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Task durations and histograms shared by the timing callback plugins."""
+
+from __future__ import absolute_import
+
+import bisect
+import time
+
+
+# Upper bounds of the histogram buckets in seconds, the last bucket holds
+# every duration longer than the last bound.
+BUCKETS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600
+)
+
+
+class Histogram(object):
+    """Fixed bucket histogram of durations."""
+
+    __slots__ = ('buckets', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.buckets[bisect.bisect_left(BUCKETS, duration)] += 1
+        self.count += 1
+        self.sum += duration
+        if duration > self.max:
+            self.max = duration
+
+    def cumulative(self):
+        """Yield the upper bound and cumulative count of every bucket.
+
+        The bucket of the durations longer than the last bound is not
+        included, its cumulative count is `count`.
+
+        returns: `generator`
+        """
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            yield bound, seen
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket holding the quantile.
+
+        The bound is capped by the largest duration seen.
+
+        returns: `float`
+        """
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                if index < len(BUCKETS):
+                    return min(BUCKETS[index], self.max)
+                break
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'max': round(self.max, 3),
+            'p95': round(self.quantile(0.95), 3),
+            'buckets': self.buckets
+        }
+
+
+class TaskTimer(object):
+    """Start times of the tasks running on every host.
+
+    Only the tasks in flight are kept, memory use does not grow with the
+    number of hosts times tasks. A host which did not report the start of
+    its task is timed from the start of the task.
+    """
+
+    def __init__(self):
+        self.task_start = 0
+        # (host, task uuid): start time
+        self.running = {}
+
+    def task_started(self):
+        """Record the start of a task.
+
+        returns: `float`
+        """
+        self.task_start = time.time()
+        return self.task_start
+
+    def host_started(self, host, task):
+        self.running[(host.name, task._uuid)] = time.time()
+
+    def host_done(self, result):
+        """Return the start time of the task of a result on its host.
+
+        returns: `float`
+        """
+        return self.running.pop(
+            (result._host.name, result._task._uuid), self.task_start)
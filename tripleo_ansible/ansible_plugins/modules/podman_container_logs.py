@@ -0,0 +1,347 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import calendar
+import json
+import os
+import re
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_text
+from ansible.module_utils.podman_utils import PodmanRunner
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = """
+---
+module: podman_container_logs
+author:
+    - Kevin Carter (@cloudnull)
+version_added: '2.8'
+short_description: Return the tail of a podman container log
+notes:
+    - Podman may required elevated privileges in order to run properly.
+    - Only the C(k8s-file) log driver is supported, containers logging to
+      journald have no log file to read.
+description:
+    - Read the log file of a container backwards from its end and return
+      the last lines. Unlike C(podman logs) the log is never read in full,
+      memory use is bound by the options given no matter how large the log
+      file is.
+options:
+  name:
+    description:
+      - Name or ID of the container.
+    required: True
+  executable:
+    description:
+      - Path to C(podman) executable if it is not in the C($PATH) on the
+        machine running C(podman)
+    default: 'podman'
+  lines:
+    description:
+      - Maximum number of lines to return.
+    default: 100
+    type: int
+  bytes:
+    description:
+      - Maximum number of bytes to read from the end of the log file. When
+        unset the file is read until enough lines have been found.
+    type: int
+  since:
+    description:
+      - Only return lines logged within this many seconds. Suffixes C(s),
+        C(m), C(h) and C(d) are supported, e.g. C(10m).
+  regex:
+    description:
+      - Only return lines matching this regular expression.
+  max_payload:
+    description:
+      - Maximum number of bytes returned by the module. Lines are dropped,
+        oldest first, once the limit has been reached.
+    default: 65536
+    type: int
+  timeout:
+    description:
+      - Maximum number of seconds a podman command may run, podman is not
+        limited by default.
+    type: int
+  retries:
+    description:
+      - Number of times a podman command failing with a transient error, such
+        as storage lock contention or a registry server error, is run again
+        after a jittered exponential backoff.
+    type: int
+    default: 3
+"""
+
+EXAMPLES = """
+- name: Return the last 50 lines of the keystone log
+  podman_container_logs:
+    name: keystone
+    lines: 50
+
+- name: Return errors logged by nova_api in the last 10 minutes
+  podman_container_logs:
+    name: nova_api
+    since: 10m
+    regex: 'ERROR|Traceback'
+"""
+
+RETURN = """
+lines:
+    description: Log lines, oldest first.
+    returned: always
+    type: list
+log_path:
+    description: Path of the container log file.
+    returned: always
+    type: str
+bytes_read:
+    description: Number of bytes read from the end of the log file.
+    returned: always
+    type: int
+truncated:
+    description:
+      - True when lines were dropped because of the C(max_payload) limit.
+    returned: always
+    type: bool
+timings:
+    description:
+        - Seconds spent running each podman command, retries included.
+    returned: always
+    type: dict
+    sample: {"inspect": 0.187}
+"""
+
+
+BLOCK_SIZE = 65536
+
+DURATION_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+}
+
+# k8s-file log lines start with an RFC3339 timestamp, e.g.
+# 2019-09-01T12:00:00.123456789+00:00 stdout F message
+TIMESTAMP_RE = re.compile(
+    r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.\d+)?'
+    r'(Z|[+-]\d{2}:\d{2})'
+)
+
+
+def parse_duration(value):
+    """Return the number of seconds for a duration like `10m`.
+
+    returns: `int` || `None`
+    """
+    match = re.match(r'^\s*(\d+)\s*([smhd]?)\s*$', str(value))
+    if not match:
+        return None
+    return int(match.group(1)) * DURATION_UNITS.get(match.group(2) or 's')
+
+
+def line_time(line):
+    """Return the epoch time of a k8s-file log line.
+
+    returns: `int` || `None`
+    """
+    match = TIMESTAMP_RE.match(line)
+    if not match:
+        return None
+    stamp = calendar.timegm(
+        time.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S')
+    )
+    offset = match.group(2)
+    if offset != 'Z':
+        sign = -1 if offset[0] == '+' else 1
+        stamp += sign * (int(offset[1:3]) * 3600 + int(offset[4:6]) * 60)
+    return stamp
+
+
+def reverse_lines(log_file, max_bytes=None, max_line=BLOCK_SIZE):
+    """Yield the lines of a file from its end towards its start.
+
+    Blocks of `BLOCK_SIZE` are read from the end of the file. A single line
+    is never buffered or returned beyond `max_line` bytes, only the end of
+    longer lines is kept.
+
+    returns: `generator`
+    """
+    log_file.seek(0, os.SEEK_END)
+    end = position = log_file.tell()
+    stop = 0
+    if max_bytes is not None:
+        stop = max(end - max_bytes, 0)
+
+    remainder = b''
+    overflow = False
+    while position > stop:
+        size = min(BLOCK_SIZE, position - stop)
+        position -= size
+        log_file.seek(position)
+        parts = (log_file.read(size) + remainder).split(b'\n')
+        remainder = parts.pop(0)
+        for part in reversed(parts):
+            if overflow:
+                # The start of a line which has already been returned.
+                overflow = False
+                continue
+            yield part[-max_line:], end - position
+        if overflow and not parts:
+            # Still within a line which has already been returned.
+            remainder = b''
+        elif len(remainder) > max_line:
+            # Keep the end of the line, the beginning is discarded.
+            yield remainder[-max_line:], end - position
+            overflow = True
+            remainder = b''
+
+    if remainder and not overflow:
+        yield remainder, end - position
+
+
+class PodmanContainerLogs(object):
+    """Tail the log file of a podman container."""
+
+    def __init__(self, module, results):
+        super(PodmanContainerLogs, self).__init__()
+        self.module = module
+        self.results = results
+        self.name = self.module.params['name']
+        self.lines = self.module.params['lines']
+        self.bytes = self.module.params['bytes']
+        self.max_payload = self.module.params['max_payload']
+        self.regex = None
+        if self.module.params['regex']:
+            try:
+                self.regex = re.compile(self.module.params['regex'])
+            except re.error as e:
+                self.module.fail_json(
+                    msg="Invalid regex '{0}': '{1}'".format(
+                        self.module.params['regex'], e))
+        self.since = None
+        if self.module.params['since'] is not None:
+            seconds = parse_duration(self.module.params['since'])
+            if seconds is None:
+                self.module.fail_json(
+                    msg="Invalid value for since: '{0}'".format(
+                        self.module.params['since']))
+            self.since = time.time() - seconds
+        self.executable = \
+            self.module.get_bin_path(self.module.params['executable'],
+                                     required=True)
+        self.runner = PodmanRunner(module, self.executable,
+                                   self.results['timings'])
+
+    def log_path(self):
+        command = ['container', 'inspect', self.name]
+        rc, out, err = self.runner.run(command, phase='inspect',
+                                       ignore_errors=True)
+        if rc != 0:
+            self.module.fail_json(
+                msg="Unable to inspect container '{0}': '{1}'".format(
+                    self.name, err))
+        parameters = json.loads(out)[0]
+        path = parameters.get('LogPath')
+        if not path:
+            log_config = parameters.get('HostConfig', {}).get('LogConfig', {})
+            path = log_config.get('Path')
+        if not path:
+            self.module.fail_json(
+                msg="Container '{0}' does not log to a file".format(
+                    self.name))
+        return path
+
+    def tail(self):
+        path = self.results['log_path'] = self.log_path()
+        found = list()
+        payload = 0
+        bytes_read = 0
+        try:
+            with open(path, 'rb') as log_file:
+                for line, bytes_read in reverse_lines(
+                        log_file=log_file,
+                        max_bytes=self.bytes,
+                        max_line=self.max_payload):
+                    if not line:
+                        continue
+                    line = to_text(line, errors='surrogate_or_replace')
+                    if self.since is not None:
+                        stamp = line_time(line)
+                        if stamp is not None and stamp < self.since:
+                            break
+                    if self.regex and not self.regex.search(line):
+                        continue
+                    payload += len(line) + 1
+                    if payload > self.max_payload:
+                        self.results['truncated'] = True
+                        break
+                    found.append(line)
+                    if len(found) >= self.lines:
+                        break
+        except (IOError, OSError) as e:
+            self.module.fail_json(
+                msg="Unable to read log file '{0}': '{1}'".format(path, e))
+
+        found.reverse()
+        self.results['lines'] = found
+        self.results['bytes_read'] = bytes_read
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            name=dict(type='str', required=True),
+            executable=dict(type='str', default='podman'),
+            lines=dict(type='int', default=100),
+            bytes=dict(type='int'),
+            since=dict(type='str'),
+            regex=dict(type='str'),
+            max_payload=dict(type='int', default=65536),
+            timeout=dict(type='int'),
+            retries=dict(type='int', default=3),
+        ),
+        supports_check_mode=True,
+    )
+
+    results = dict(
+        changed=False,
+        lines=[],
+        log_path='',
+        bytes_read=0,
+        truncated=False,
+        timings={}
+    )
+
+    PodmanContainerLogs(module, results).tail()
+    module.exit_json(**results)
+
+
+if __name__ == '__main__':
+    main()
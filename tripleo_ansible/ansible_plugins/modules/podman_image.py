@@ -23,6 +23,7 @@ import json
 import re
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.podman_utils import PodmanRunner
 
 ANSIBLE_METADATA = {
     'metadata_version': '1.1',
@@ -147,7 +148,18 @@ options:
           - docker-daemon
           - oci-archive
           - ostree
-
+  timeout:
+    description:
+      - Maximum number of seconds a podman command may run, podman is not
+        limited by default.
+    type: int
+  retries:
+    description:
+      - Number of times a podman command failing with a transient error, such
+        as storage lock contention or a registry server error, is run again
+        after a jittered exponential backoff.
+    type: int
+    default: 3
 """
 
 EXAMPLES = """
@@ -343,6 +355,12 @@ f17bacfbe21379",
         }
     ]
 }
+timings:
+  description:
+    - Seconds spent running each podman command, retries included.
+  returned: always
+  type: dict
+  sample: {"pull": 12.301, "inspect": 0.211}
 """
 
 
@@ -371,6 +389,8 @@ class PodmanImageManager(object):
         self.cert_dir = self.module.params.get('cert_dir')
         self.build_args = self.module.params.get('build_args')
         self.push_args = self.module.params.get('push_args')
+        self.runner = PodmanRunner(module, self.executable,
+                                   self.results['timings'])
 
         repo, repo_tag = parse_repository_tag(self.name)
         if repo_tag:
@@ -386,14 +406,8 @@ class PodmanImageManager(object):
             self.absent()
 
     def _run(self, args, expected_rc=0, ignore_errors=False):
-        if not isinstance(self.executable, list):
-            command = [self.executable]
-        command.extend(args)
-        rc, out, err = self.module.run_command(command)
-        if not ignore_errors and rc != expected_rc:
-            self.module.fail_json(msg='Failed to run {command} {err}'.format(
-                command=command, err=err))
-        return rc, out, err
+        return self.runner.run(args, expected_rc=expected_rc,
+                               ignore_errors=ignore_errors)
 
     def _get_id_from_output(self, lines, startswith=None, contains=None,
                             split_on=' ', maxsplit=1):
@@ -683,6 +697,8 @@ def main():
             ),
             tls_verify=dict(type='bool', default=True, aliases=['tlsverify']),
             executable=dict(type='str', default='podman'),
+            timeout=dict(type='int'),
+            retries=dict(type='int', default=3),
             auth_file=dict(type='path', aliases=['authfile']),
             username=dict(type='str'),
             password=dict(type='str', no_log=True),
@@ -740,6 +756,7 @@ def main():
         changed=False,
         actions=[],
         image={},
+        timings={},
         )
 
     PodmanImageManager(module, results)
@@ -20,6 +20,7 @@ from __future__ import division
 from __future__ import print_function
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.podman_utils import PodmanRunner
 import ansible.module_utils.six as six
 import json
 
@@ -53,7 +54,18 @@ options:
         description:
             - List of tags or UID to gather facts about. If no name is given
               return facts about all images.
-
+    timeout:
+        description:
+            - Maximum number of seconds a podman command may run, podman is
+              not limited by default.
+        type: int
+    retries:
+        description:
+            - Number of times a podman command failing with a transient
+              error, such as storage lock contention or a registry server
+              error, is run again after a jittered exponential backoff.
+        type: int
+        default: 3
 """
 
 EXAMPLES = """
@@ -186,18 +198,24 @@ a33458c67e1c1335edd8d18d738892356b"
             "VirtualSize": 569919342
         }
     ]
+timings:
+    description:
+        - Seconds spent running each podman command, retries included.
+    returned: always
+    type: dict
+    sample: {"list": 0.152, "inspect": 0.317}
 """
 
 
-def get_image_facts(module, executable, name):
+def get_image_facts(module, runner, name):
 
     if not isinstance(name, list):
         name = [name]
 
-    command = [executable, 'image', 'inspect']
+    command = ['image', 'inspect']
     command.extend(name)
 
-    rc, out, err = module.run_command(command)
+    rc, out, err = runner.run(command, phase='inspect', ignore_errors=True)
 
     if rc != 0:
         module.fail_json(msg="Unable to gather facts for '{0}': {1}"
@@ -206,11 +224,11 @@ def get_image_facts(module, executable, name):
     return out
 
 
-def get_all_image_facts(module, executable):
-    command = [executable, 'image', 'ls', '-q']
-    rc, out, err = module.run_command(command)
+def get_all_image_facts(module, runner):
+    command = ['image', 'ls', '-q']
+    rc, out, err = runner.run(command, phase='list', ignore_errors=True)
     name = out.split('\n')
-    out = get_image_facts(module, executable, name)
+    out = get_image_facts(module, runner, name)
 
     return out
 
@@ -219,7 +237,9 @@ def main():
     module = AnsibleModule(
         argument_spec=dict(
             executable=dict(type='str', default='podman'),
-            name=dict(type='list')
+            name=dict(type='list'),
+            timeout=dict(type='int'),
+            retries=dict(type='int', default=3),
         ),
         supports_check_mode=True,
     )
@@ -227,15 +247,18 @@ def main():
     executable = module.params['executable']
     name = module.params.get('name')
     executable = module.get_bin_path(executable, required=True)
+    timings = dict()
+    runner = PodmanRunner(module, executable, timings)
 
     if name:
-        results = json.loads(get_image_facts(module, executable, name))
+        results = json.loads(get_image_facts(module, runner, name))
     else:
-        results = json.loads(get_all_image_facts(module, executable))
+        results = json.loads(get_all_image_facts(module, runner))
 
     results = dict(
         changed=False,
-        ansible_facts=dict(podman_images=results)
+        ansible_facts=dict(podman_images=results),
+        timings=timings
     )
 
     module.exit_json(**results)
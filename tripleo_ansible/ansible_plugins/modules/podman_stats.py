@@ -0,0 +1,330 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import math
+import re
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.podman_utils import PodmanRunner
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = """
+---
+module: podman_stats
+author:
+    - Kevin Carter (@cloudnull)
+version_added: '2.8'
+short_description: Gather resource usage statistics for podman containers
+notes:
+    - Podman may required elevated privileges in order to run properly.
+description:
+    - Sample the resource usage of all running containers using a single
+      C(podman stats --no-stream --format json) call per sample. The
+      samples are aggregated within the module so only compact min, max,
+      avg and p95 values are returned for every container.
+options:
+  executable:
+    description:
+      - Path to C(podman) executable if it is not in the C($PATH) on the
+        machine running C(podman)
+    default: 'podman'
+    type: string
+  name:
+    description:
+      - List of container names or IDs to report on. If no name is given
+        all containers returned by podman are reported.
+    type: list
+  samples:
+    description:
+      - Number of times the containers are sampled.
+    default: 3
+    type: int
+  interval:
+    description:
+      - Number of seconds to wait between samples.
+    default: 1
+    type: float
+  timeout:
+    description:
+      - Maximum number of seconds a podman command may run, podman is not
+        limited by default.
+    type: int
+  retries:
+    description:
+      - Number of times a podman command failing with a transient error, such
+        as storage lock contention or a registry server error, is run again
+        after a jittered exponential backoff.
+    type: int
+    default: 3
+"""
+
+EXAMPLES = """
+- name: Gather stats for all running containers
+  podman_stats:
+  register: container_stats
+
+- name: Gather stats for a few containers over 10 seconds
+  podman_stats:
+    name:
+      - keystone
+      - nova_api
+    samples: 5
+    interval: 2
+"""
+
+RETURN = """
+stats:
+    description:
+      - Aggregated statistics for each container, keyed by container name.
+        Every metric contains the min, max, avg and p95 of the samples taken.
+    returned: always
+    type: dict
+    sample: {
+        "keystone": {
+            "id": "b4dd1e5ff2a7",
+            "samples": 3,
+            "cpu_percent": {
+                "min": 0.12,
+                "max": 4.3,
+                "avg": 1.59,
+                "p95": 4.3
+            },
+            "mem_usage_bytes": {
+                "min": 187904819.2,
+                "max": 188743680.0,
+                "avg": 188324249.6,
+                "p95": 188743680.0
+            }
+        }
+    }
+samples:
+    description: Number of samples which were taken.
+    returned: always
+    type: int
+timings:
+    description:
+        - Seconds spent running each podman command, retries included.
+    returned: always
+    type: dict
+    sample: {"stats": 3.214}
+"""
+
+
+# podman has used different keys for its json output over time, the first
+# key found for a given metric will be used.
+STAT_KEYS = {
+    'cpu_percent': ('cpu_percent', 'CPUPerc', 'cpu'),
+    'mem_usage': ('mem_usage', 'MemUsage'),
+    'mem_percent': ('mem_percent', 'MemPerc'),
+    'net_io': ('netio', 'net_io', 'NetIO'),
+    'block_io': ('blocki', 'block_io', 'BlockIO'),
+    'pids': ('pids', 'PIDs', 'PIDS'),
+}
+
+SIZE_UNITS = {
+    '': 1,
+    'b': 1,
+    'kb': 1000,
+    'mb': 1000 ** 2,
+    'gb': 1000 ** 3,
+    'tb': 1000 ** 4,
+    'kib': 1024,
+    'mib': 1024 ** 2,
+    'gib': 1024 ** 3,
+    'tib': 1024 ** 4,
+}
+
+SIZE_RE = re.compile(r'^\s*([0-9.]+)\s*([a-zA-Z]*)\s*$')
+
+
+def parse_size(value):
+    """Return the number of bytes for a human readable size string.
+
+    returns: `float` || `None`
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = SIZE_RE.match(str(value))
+    if not match:
+        return None
+    unit = SIZE_UNITS.get(match.group(2).lower())
+    if unit is None:
+        return None
+    return round(float(match.group(1)) * unit, 2)
+
+
+def parse_percent(value):
+    """Return a float for a percentage string like `1.23%`.
+
+    returns: `float` || `None`
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip().rstrip('%'))
+    except ValueError:
+        return None
+
+
+def parse_pair(value):
+    """Split an `input / output` pair into two sizes in bytes.
+
+    returns: `tuple`
+    """
+    parts = str(value).split('/')
+    if len(parts) != 2:
+        return None, None
+    return parse_size(parts[0]), parse_size(parts[1])
+
+
+def _get(entry, metric):
+    for key in STAT_KEYS[metric]:
+        if key in entry:
+            return entry[key]
+
+
+def parse_stats(entry):
+    """Convert a single podman stats entry into numeric metrics.
+
+    returns: `dict`
+    """
+    metrics = dict()
+    metrics['cpu_percent'] = parse_percent(_get(entry, 'cpu_percent'))
+    metrics['mem_percent'] = parse_percent(_get(entry, 'mem_percent'))
+    metrics['mem_usage_bytes'] = parse_pair(_get(entry, 'mem_usage'))[0]
+    (
+        metrics['net_input_bytes'],
+        metrics['net_output_bytes']
+    ) = parse_pair(_get(entry, 'net_io'))
+    (
+        metrics['block_input_bytes'],
+        metrics['block_output_bytes']
+    ) = parse_pair(_get(entry, 'block_io'))
+    try:
+        metrics['pids'] = float(_get(entry, 'pids'))
+    except (TypeError, ValueError):
+        metrics['pids'] = None
+    return metrics
+
+
+def aggregate(values):
+    """Return the min, max, avg and p95 of a list of values.
+
+    The p95 uses the nearest-rank method so it is always one of the
+    sampled values.
+
+    returns: `dict`
+    """
+    values = sorted(values)
+    rank = int(math.ceil(0.95 * len(values))) - 1
+    return dict(
+        min=values[0],
+        max=values[-1],
+        avg=round(sum(values) / len(values), 2),
+        p95=values[max(rank, 0)]
+    )
+
+
+def get_stats(module, runner):
+    command = ['stats', '--no-stream', '--format', 'json']
+    rc, out, err = runner.run(command, ignore_errors=True)
+    if rc != 0:
+        module.fail_json(msg="Unable to gather container stats: {0}"
+                         .format(err))
+    if not out.strip():
+        return list()
+    try:
+        return json.loads(out)
+    except ValueError as e:
+        module.fail_json(msg="Unable to parse container stats: {0}"
+                         .format(e))
+
+
+def sample_stats(module, runner, names, samples, interval):
+    collected = dict()
+    for sample in range(samples):
+        if sample > 0:
+            time.sleep(interval)
+        for entry in get_stats(module, runner) or list():
+            name = entry.get('name', entry.get('Name'))
+            container_id = entry.get('id', entry.get('ID', ''))
+            wanted = [i for i in names
+                      if i == name or container_id.startswith(i)]
+            if names and not wanted:
+                continue
+            container = collected.setdefault(
+                name,
+                dict(id=container_id, samples=0, metrics=dict())
+            )
+            container['samples'] += 1
+            for metric, value in parse_stats(entry).items():
+                if value is not None:
+                    container['metrics'].setdefault(metric, list())
+                    container['metrics'][metric].append(value)
+
+    stats = dict()
+    for name, container in collected.items():
+        stats[name] = dict(id=container['id'], samples=container['samples'])
+        for metric, values in container['metrics'].items():
+            stats[name][metric] = aggregate(values)
+    return stats
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            executable=dict(type='str', default='podman'),
+            name=dict(type='list'),
+            samples=dict(type='int', default=3),
+            interval=dict(type='float', default=1),
+            timeout=dict(type='int'),
+            retries=dict(type='int', default=3),
+        ),
+        supports_check_mode=True,
+    )
+
+    samples = module.params['samples']
+    if samples < 1:
+        module.fail_json(msg="samples must be greater than 0")
+
+    executable = module.get_bin_path(module.params['executable'],
+                                     required=True)
+    timings = dict()
+    stats = sample_stats(
+        module=module,
+        runner=PodmanRunner(module, executable, timings),
+        names=module.params.get('name') or list(),
+        samples=samples,
+        interval=module.params['interval']
+    )
+    module.exit_json(changed=False, stats=stats, samples=samples,
+                     timings=timings)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import fnmatch
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.facts.system.distribution import (
+    DistributionFactCollector
+)
+from ansible.module_utils.facts.system.platform import PlatformFactCollector
+from ansible.module_utils.facts.system.ssh_pub_keys import (
+    SshPubKeyFactCollector
+)
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = """
+---
+module: tripleo_facts
+author:
+    - OpenStack TripleO Contributors
+version_added: '2.8'
+short_description: Gather a few facts without running the setup module
+notes:
+    - The facts have the same names and values as the ones gathered by the
+      C(setup) module, roles using them work with either module.
+description:
+    - Gather only the given facts. Only the fact collectors of the
+      C(setup) module providing them are run, reading a handful of files
+      such as C(/etc/os-release) and C(/etc/ssh/ssh_host_*_key.pub),
+      instead of running all the collectors and the commands they use.
+    - The distribution facts (C(ansible_distribution*),
+      C(ansible_os_family)), the SSH host keys
+      (C(ansible_ssh_host_key_*)) and the platform facts (C(ansible_fqdn),
+      C(ansible_hostname), C(ansible_domain), C(ansible_nodename),
+      C(ansible_system), C(ansible_kernel), C(ansible_machine),
+      C(ansible_architecture)...) can be gathered.
+options:
+  facts:
+    description:
+      - Names of the facts to gather. Shell style wildcards can be used and
+        the C(ansible_) prefix can be left out. The module fails when a name
+        does not match any fact it can gather.
+    default:
+      - ansible_distribution*
+      - ansible_os_family
+      - ansible_fqdn
+      - ansible_hostname
+      - ansible_ssh_host_key_*
+    type: list
+"""
+
+EXAMPLES = """
+- name: Gather the facts of the operating system
+  tripleo_facts:
+    facts:
+      - ansible_distribution*
+      - ansible_os_family
+  when:
+    - ansible_distribution is undefined
+
+- name: Gather the RSA host key
+  tripleo_facts:
+    facts: ansible_ssh_host_key_rsa_public
+"""
+
+RETURN = """
+ansible_facts:
+    description: The facts gathered.
+    returned: always
+    type: dict
+    sample: {
+        "ansible_distribution": "CentOS",
+        "ansible_distribution_major_version": "7",
+        "ansible_distribution_release": "Core",
+        "ansible_distribution_version": "7.7",
+        "ansible_os_family": "RedHat",
+        "ansible_fqdn": "overcloud-controller-0.localdomain",
+        "ansible_hostname": "overcloud-controller-0"
+    }
+"""
+
+
+# Collector: facts it provides. Collectors are only run when one of their
+# facts is requested.
+COLLECTORS = (
+    (DistributionFactCollector, (
+        'distribution',
+        'distribution_version',
+        'distribution_release',
+        'distribution_major_version',
+        'distribution_file_path',
+        'distribution_file_variety',
+        'distribution_file_parsed',
+        'os_family'
+    )),
+    (SshPubKeyFactCollector, (
+        'ssh_host_key_dsa_public',
+        'ssh_host_key_rsa_public',
+        'ssh_host_key_ecdsa_public',
+        'ssh_host_key_ed25519_public',
+        'ssh_host_key_dsa_public_keytype',
+        'ssh_host_key_rsa_public_keytype',
+        'ssh_host_key_ecdsa_public_keytype',
+        'ssh_host_key_ed25519_public_keytype'
+    )),
+    (PlatformFactCollector, (
+        'system',
+        'kernel',
+        'kernel_version',
+        'machine',
+        'python_version',
+        'fqdn',
+        'hostname',
+        'nodename',
+        'domain',
+        'userspace_bits',
+        'architecture',
+        'userspace_architecture',
+        'machine_id'
+    )),
+)
+
+
+def _matches(name, patterns):
+    return any(fnmatch.fnmatch(name, i) for i in patterns)
+
+
+def _strip_prefix(patterns):
+    return [i[len('ansible_'):] if i.startswith('ansible_') else i
+            for i in patterns]
+
+
+def unknown_facts(patterns):
+    """Return the patterns which do not match any fact of the collectors.
+
+    returns: `list`
+    """
+    names = [name for _, names in COLLECTORS for name in names]
+    return [
+        pattern for pattern, stripped in zip(patterns,
+                                             _strip_prefix(patterns))
+        if not any(fnmatch.fnmatch(name, stripped) for name in names)
+    ]
+
+
+def gather_facts(module, patterns):
+    """Run the collectors providing the requested facts.
+
+    returns: `dict`
+    """
+    patterns = _strip_prefix(patterns)
+    collected = dict()
+    for collector, names in COLLECTORS:
+        if not any(_matches(name, patterns) for name in names):
+            continue
+        collected.update(
+            collector().collect(module=module, collected_facts=collected)
+        )
+    return dict(
+        ('ansible_{0}'.format(name), value)
+        for name, value in collected.items()
+        if _matches(name, patterns)
+    )
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            facts=dict(
+                type='list',
+                default=[
+                    'ansible_distribution*',
+                    'ansible_os_family',
+                    'ansible_fqdn',
+                    'ansible_hostname',
+                    'ansible_ssh_host_key_*'
+                ]
+            ),
+        ),
+        supports_check_mode=True,
+    )
+
+    unknown = unknown_facts(module.params['facts'])
+    if unknown:
+        module.fail_json(
+            msg="Unknown facts: {0}. Only the distribution, SSH host key and "
+                "platform facts can be gathered".format(', '.join(unknown)))
+
+    module.exit_json(
+        changed=False,
+        ansible_facts=gather_facts(module, module.params['facts'])
+    )
+
+
+if __name__ == '__main__':
+    main()
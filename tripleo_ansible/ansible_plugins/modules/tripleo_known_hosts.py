@@ -0,0 +1,213 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import errno
+import os
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_bytes, to_text
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = """
+---
+module: tripleo_known_hosts
+author:
+    - OpenStack TripleO Contributors
+version_added: '2.8'
+short_description: Merge lines into an SSH known hosts file in place
+notes:
+    - The file is updated in place, containers bind mounting it see the
+      new lines. See https://bugs.launchpad.net/tripleo/+bug/1810932.
+description:
+    - Add the lines which are not already in an SSH known hosts file at
+      its end, as C(lineinfile) does for a single line. The file is read
+      once and the missing lines are appended, the file is not replaced so
+      its inode, ownership and SELinux context are kept.
+    - With C(remove_stale) the lines giving another key of the same type
+      for the same hosts as one of the lines are removed, the file is then
+      rewritten in place.
+    - The module only reports a change when lines were added or removed.
+options:
+  path:
+    description:
+      - Path of the known hosts file. It is created with the C(0644) mode
+        when it does not exist.
+    default: /etc/ssh/ssh_known_hosts
+    type: path
+  lines:
+    description:
+      - Lines the file must contain.
+    required: true
+    type: list
+  remove_stale:
+    description:
+      - Remove the lines of the file having the same marker, host names and
+        key type as one of C(lines) but another key, such as the old key of
+        a host which was redeployed.
+    default: false
+    type: bool
+"""
+
+EXAMPLES = """
+- name: Add the host keys of the overcloud
+  tripleo_known_hosts:
+    lines: "{{ ssh_known_hosts_lines.splitlines() }}"
+
+- name: Replace the old host keys of the overcloud
+  tripleo_known_hosts:
+    lines: "{{ ssh_known_hosts_lines.splitlines() }}"
+    remove_stale: true
+"""
+
+RETURN = """
+added:
+    description: Number of lines added to the file.
+    returned: always
+    type: int
+removed:
+    description: Number of stale lines removed from the file.
+    returned: always
+    type: int
+"""
+
+
+def read_file(path):
+    """Return the content of a file, empty when it does not exist.
+
+    returns: `bytes`
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except IOError as e:
+        if e.errno == errno.ENOENT:
+            return b''
+        raise
+
+
+def missing_lines(content, lines):
+    """Return the lines not found in the content, in order, once each.
+
+    Lines are compared without their line ending, as C(lineinfile) does.
+
+    returns: `list`
+    """
+    present = set(i.rstrip(b'\r') for i in content.split(b'\n'))
+    missing = list()
+    for line in lines:
+        if line not in present:
+            present.add(line)
+            missing.append(line)
+    return missing
+
+
+def _entry(line):
+    """Return the marker, host names and key type of a known hosts line.
+
+    returns: `tuple` || `None`
+    """
+    fields = line.split()
+    if not fields or fields[0].startswith(b'#'):
+        return None
+    marker = fields.pop(0) if fields[0].startswith(b'@') else None
+    if len(fields) < 3:
+        return None
+    return marker, fields[0], fields[1]
+
+
+def stale_lines(content, lines):
+    """Return the lines of the content replaced by one of the lines.
+
+    returns: `set`
+    """
+    wanted = set(lines)
+    entries = set(_entry(i) for i in lines)
+    entries.discard(None)
+    stale = set()
+    for line in content.split(b'\n'):
+        line = line.rstrip(b'\r')
+        if line not in wanted and _entry(line) in entries:
+            stale.add(line)
+    return stale
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            path=dict(type='path', default='/etc/ssh/ssh_known_hosts'),
+            lines=dict(type='list', required=True),
+            remove_stale=dict(type='bool', default=False),
+        ),
+        supports_check_mode=True,
+    )
+
+    path = module.params['path']
+    lines = [to_bytes(i, errors='surrogate_or_strict').rstrip(b'\r\n')
+             for i in module.params['lines']]
+    try:
+        content = read_file(path)
+    except (IOError, OSError) as e:
+        module.fail_json(msg="Unable to read {0}: {1}".format(path, e))
+
+    stale = set()
+    if module.params['remove_stale']:
+        stale = stale_lines(content, lines)
+    parts = content.split(b'\n')
+    kept_parts = [i for i in parts if i.rstrip(b'\r') not in stale]
+    kept = b'\n'.join(kept_parts)
+    missing = missing_lines(kept, lines)
+    data = b''.join(i + b'\n' for i in missing)
+    if data and kept and not kept.endswith(b'\n'):
+        data = b'\n' + data
+    result = dict(changed=bool(missing or stale), added=len(missing),
+                  removed=len(parts) - len(kept_parts))
+    if module._diff:
+        result['diff'] = dict(
+            before_header=path, after_header=path,
+            before=to_text(content, errors='surrogate_or_replace'),
+            after=to_text(kept + data, errors='surrogate_or_replace'))
+
+    if result['changed'] and not module.check_mode:
+        try:
+            created = not os.path.exists(path)
+            # Update in place, the file must not be replaced.
+            if stale:
+                with open(path, 'r+b') as f:
+                    f.write(kept + data)
+                    f.truncate()
+            else:
+                with open(path, 'ab') as f:
+                    f.write(data)
+            if created:
+                os.chmod(path, 0o644)
+        except (IOError, OSError) as e:
+            module.fail_json(msg="Unable to update {0}: {1}".format(path, e))
+
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from __future__ import absolute_import
+import os
+
+from ansible.errors import AnsibleError
+from ansible.playbook.handler import Handler
+from ansible.playbook.task_include import TaskInclude
+from ansible.plugins.strategy.free import StrategyModule as FreeStrategy
+from ansible.template import Templar
+from ansible.utils.display import Display
+
+
+DOCUMENTATION = '''
+    strategy: tripleo_free
+    short_description: Let hosts progress independently between barriers
+    description:
+        - Tasks are sent to hosts as soon as they are free, as with the
+          C(free) strategy, except for tasks using C(run_once),
+          C(delegate_to) or C(any_errors_fatal). Hosts wait for each other
+          before those tasks, so they see the work done by all hosts in the
+          previous tasks.
+        - A C(run_once) task is run on the first host only and its result
+          is applied to all hosts, as with the C(linear) strategy.
+        - Once all hosts ran a C(any_errors_fatal) task, all hosts fail if
+          one of them failed or was unreachable. Hosts which do not reach the
+          task, e.g. because they did not include its file, are not stopped
+          from running the tasks which are not barriers in the meantime.
+        - The number of delegated tasks running at the same time against the
+          same delegate host is limited.
+        - Hosts reaching an include at different times load their own copy
+          of the included tasks. The copies of a task are a single barrier,
+          a C(run_once) task in an included file is run once for all the
+          hosts including the file with the same variables.
+        - Hosts waiting at different barriers, e.g. after including
+          different files, go through the barrier none of the other hosts
+          will reach first.
+        - As with the C(free) strategy, modules bypassing the host loop such
+          as C(add_host) are not supported.
+    options:
+      delegate_limit:
+        description:
+          - Maximum number of tasks running at the same time against a
+            single delegate host.
+        default: 10
+        env:
+          - name: TRIPLEO_FREE_DELEGATE_LIMIT
+'''
+
+display = Display()
+
+
+class StrategyModule(FreeStrategy):
+
+    def __init__(self, tqm):
+        super(StrategyModule, self).__init__(tqm)
+        self._delegate_limit = int(
+            os.getenv('TRIPLEO_FREE_DELEGATE_LIMIT', 10))
+        # Hosts marked as blocked by the strategy itself to hold them back.
+        self._held = set()
+        # Task uuid: key shared by the copies of the task, see _task_key.
+        self._keys = {}
+        # Keys of the barrier tasks all hosts have reached.
+        self._released = set()
+        # Task key: name of the host running a run_once task, None until
+        # a host has been picked.
+        self._run_once = {}
+        # Task key: names of the hosts which ran an any_errors_fatal task.
+        self._fatal = {}
+        # Task key: delegate host, learnt from the first host queued.
+        self._task_delegate = {}
+        # Delegate host: number of tasks running against it.
+        self._inflight = {}
+        # Host name: delegate host of the task it is running.
+        self._host_delegate = {}
+        # Task key: (task, attribute, value) to restore later on.
+        self._restore = {}
+
+    def _task_key(self, task):
+        """Return a key identifying the task across included copies.
+
+        Tasks outside of includes are identified by their uuid. The tasks
+        of an included file get new uuids every time the file is loaded,
+        they are identified by the key of the include, its variables (the
+        loop item) and their path.
+        """
+        key = self._keys.get(task._uuid)
+        if key is not None:
+            return key
+        parent = task._parent
+        while parent is not None and not isinstance(parent, TaskInclude):
+            parent = parent._parent
+        path = task.get_path()
+        if parent is None or not path:
+            key = task._uuid
+        else:
+            key = (self._task_key(parent),
+                   repr(sorted(parent.vars.items())),
+                   path)
+        self._keys[task._uuid] = key
+        return key
+
+    def _restore_task(self, key):
+        for task, attribute, value in self._restore.pop(key, []):
+            setattr(task, attribute, value)
+
+    def _disable(self, key, task):
+        # The free strategy warns about run_once and any_errors_fatal, both
+        # are handled here so they are turned off on every copy until the
+        # task is done.
+        restore = self._restore.setdefault(key, [])
+        for attribute in ('run_once', 'any_errors_fatal'):
+            value = getattr(task, attribute)
+            if value:
+                restore.append((task, attribute, value))
+                setattr(task, attribute, False)
+
+    @staticmethod
+    def _is_barrier(task):
+        if task is None or isinstance(task, Handler):
+            return False
+        return any((task.run_once, task.delegate_to, task.any_errors_fatal))
+
+    def _release(self, key, tasks):
+        # Hosts which ran an include have their own copy of the following
+        # tasks, all the copies are released together.
+        self._released.add(key)
+        if tasks[0].run_once is True:
+            self._run_once[key] = None
+        if tasks[0].any_errors_fatal:
+            self._fatal[key] = set()
+        for task in tasks:
+            self._disable(key, task)
+
+    def _fatal_done(self, iterator, hosts_left, key, next_tasks):
+        """Fail all hosts if a host failed an any_errors_fatal task.
+
+        returns: `bool` True once all hosts ran the task.
+        """
+        ran = self._fatal[key]
+        if any(t is not None and self._task_key(t) == key
+               for t in next_tasks.values()):
+            return False
+        if any(self._blocked_hosts.get(h) for h in ran):
+            return False
+        del self._fatal[key]
+        self._restore_task(key)
+        failed = [h for h in ran if h in self._tqm._unreachable_hosts]
+        failed.extend(h for h in ran if h in self._tqm._failed_hosts)
+        failed.extend(
+            h.name for h in hosts_left
+            if h.name in ran and iterator.is_failed(h))
+        if failed:
+            display.debug('any_errors_fatal task failed on %s' % failed)
+            for host in hosts_left:
+                if not iterator.is_failed(host):
+                    iterator.mark_host_failed(host)
+                self._tqm._failed_hosts[host.name] = True
+        return True
+
+    def _keys_ahead(self, iterator, host, keys):
+        """Return which of the task keys the host will reach later on.
+
+        The tasks following the next task of the host are walked on the
+        host state, which is restored afterwards.
+        """
+        state = iterator.get_host_state(host)
+        found = set()
+        try:
+            iterator.get_next_task_for_host(host)
+            while found != keys:
+                _, task = iterator.get_next_task_for_host(host)
+                if task is None:
+                    break
+                key = self._task_key(task)
+                if key in keys:
+                    found.add(key)
+        finally:
+            iterator._host_states[host.name] = state
+        return found
+
+    def _unreachable_barrier(self, iterator, hosts_left, next_tasks):
+        """Return the barrier the hosts waiting elsewhere will not reach.
+
+        Hosts held at different barriers, e.g. after taking different
+        include paths, would wait for each other forever. The barrier is
+        released for the hosts which reached it, releasing a barrier other
+        hosts reach later on would run a run_once task twice or let hosts
+        go past an any_errors_fatal task before it failed.
+        """
+        waiting = {}
+        for task in next_tasks.values():
+            if task is not None:
+                key = self._task_key(task)
+                if key not in self._released:
+                    waiting.setdefault(key, []).append(task)
+        # Hosts with the same next task object and failed state share the
+        # tasks ahead of them, one of them is walked.
+        walked = set()
+        ahead = set()
+        for host in hosts_left:
+            task = next_tasks.get(host.name)
+            if task is None:
+                continue
+            group = (id(task), iterator.is_failed(host))
+            if group in walked:
+                continue
+            walked.add(group)
+            others = set(waiting) - set([self._task_key(task)])
+            ahead.update(self._keys_ahead(iterator, host, others))
+        for key in waiting:
+            if key not in ahead:
+                return key, waiting[key]
+        raise AnsibleError(
+            'The tripleo_free strategy cannot order the barriers the hosts '
+            'are waiting at: %s, use the linear strategy for this play'
+            % ', '.join(sorted(set(
+                t[0].get_name() for t in waiting.values()))))
+
+    def get_hosts_left(self, iterator):
+        hosts_left = super(StrategyModule, self).get_hosts_left(iterator)
+        for host_name in self._held:
+            self._blocked_hosts[host_name] = False
+        self._held = set()
+
+        # Next task of every host which is not running anything.
+        next_tasks = {}
+        running = False
+        for host in hosts_left:
+            if self._blocked_hosts.get(host.name, False):
+                running = True
+                continue
+            if host.name in self._tqm._unreachable_hosts:
+                continue
+            _, task = iterator.get_next_task_for_host(host, peek=True)
+            next_tasks[host.name] = task
+
+        held = set()
+        for key in list(self._fatal):
+            ran = self._fatal[key]
+            if not self._fatal_done(iterator, hosts_left, key, next_tasks):
+                held.update(h for h in ran if h in next_tasks)
+
+        delegated = {}
+        progressed = False
+        for host in hosts_left:
+            task = next_tasks.get(host.name)
+            if host.name in held or task is None:
+                continue
+            key = self._task_key(task)
+            if key not in self._released:
+                if not self._is_barrier(task):
+                    continue
+                # Wait until every host which is still running the play
+                # reached the task.
+                if running or any(
+                        t is not None and self._task_key(t) != key
+                        for t in next_tasks.values()):
+                    held.add(host.name)
+                    continue
+                self._release(key, [
+                    t for t in next_tasks.values() if t is not None])
+            else:
+                # Copy of the task loaded by a host which included the file
+                # later than the others.
+                if task.any_errors_fatal:
+                    self._fatal.setdefault(key, set())
+                self._disable(key, task)
+
+            if key in self._run_once:
+                runner = self._run_once[key]
+                if runner is None:
+                    self._run_once[key] = host.name
+                elif runner != host.name:
+                    runner_task = next_tasks.get(runner)
+                    if self._blocked_hosts.get(runner):
+                        held.add(host.name)
+                        continue
+                    if (runner_task is not None
+                            and self._task_key(runner_task) == key):
+                        held.add(host.name)
+                        continue
+                    # The result of the run_once task has been applied to
+                    # all hosts, skip the task.
+                    iterator.get_next_task_for_host(host)
+                    held.add(host.name)
+                    progressed = True
+                    continue
+
+            if task.delegate_to:
+                delegate = self._task_delegate.get(key)
+                count = delegated.get(
+                    delegate, self._inflight.get(delegate, 0))
+                limit = self._delegate_limit if delegate is not None else 1
+                if count >= limit:
+                    held.add(host.name)
+                    continue
+                delegated[delegate] = count + 1
+
+        if held and not running and not progressed and all(
+                h in held for h, t in next_tasks.items() if t is not None):
+            key, tasks = self._unreachable_barrier(
+                iterator, hosts_left, next_tasks)
+            display.debug('releasing task %s reached by no other host' % (
+                tasks[0].get_name()))
+            # The hosts are still held until the next pass.
+            self._release(key, tasks)
+
+        for host_name in held:
+            self._blocked_hosts[host_name] = True
+        self._held = held
+        return hosts_left
+
+    def run(self, iterator, play_context):
+        try:
+            return super(StrategyModule, self).run(iterator, play_context)
+        finally:
+            for key in list(self._restore):
+                self._restore_task(key)
+
+    def _queue_task(self, host, task, task_vars, play_context):
+        key = self._task_key(task)
+        if self._run_once.get(key) == host.name:
+            # Turn run_once back on so the result is applied to all hosts.
+            task.run_once = True
+            self._restore[key] = [
+                i for i in self._restore.get(key, [])
+                if i[0] is not task or i[1] != 'run_once']
+        if task.delegate_to and not isinstance(task, Handler):
+            templar = Templar(loader=self._loader, variables=task_vars)
+            try:
+                delegate = templar.template(task.delegate_to)
+            except Exception:
+                delegate = task.delegate_to
+            self._task_delegate.setdefault(key, delegate)
+            self._inflight[delegate] = self._inflight.get(delegate, 0) + 1
+            self._host_delegate[host.name] = delegate
+        if key in self._fatal:
+            self._fatal[key].add(host.name)
+        return super(StrategyModule, self)._queue_task(
+            host, task, task_vars, play_context)
+
+    def _process_pending_results(self, iterator, one_pass=False,
+                                 max_passes=None):
+        results = super(StrategyModule, self)._process_pending_results(
+            iterator, one_pass=one_pass, max_passes=max_passes)
+        for result in results:
+            delegate = self._host_delegate.pop(result._host.name, None)
+            if delegate is not None:
+                self._inflight[delegate] -= 1
+        return results
@@ -0,0 +1,251 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compare the task durations of two ansible runs.
+
+The durations are taken from the log files written by ansible when
+ANSIBLE_LOG_PATH is set. A task lasts from its TASK line until the next
+TASK, RUNNING HANDLER, PLAY or PLAY RECAP line logged by the same process.
+Tasks are aligned by play, role and task name, tasks which ran several
+times are compared by their mean duration.
+
+Ansible 2.9 and older log the user in the p= field and the pid in the u=
+field, newer versions log the pid in p= followed by the user and logger
+name. Both formats are read.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import calendar
+import io
+import json
+import math
+import re
+import sys
+import time
+
+
+LOG_RE = re.compile(
+    r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) '
+    r'p=(\S+) u=(\S+)( n=\S+)? *\| +(.*)$'
+)
+
+HEADERS = ('PLAY', 'TASK', 'RUNNING HANDLER')
+
+HEADER_RE = re.compile(
+    r'^(PLAY RECAP|PLAY|TASK|RUNNING HANDLER) ?(?:\[(.*)\])? *\**$'
+)
+
+# Two sided critical value of the t distribution for 95% confidence, used
+# once both runs have a few samples of a task.
+T_CRITICAL = 2.0
+
+
+class Stats(object):
+    """Running count, mean and variance of the durations of a task."""
+
+    __slots__ = ('count', 'total', 'squares')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.squares += duration * duration
+
+    @property
+    def mean(self):
+        return self.total / self.count
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        variance = (self.squares - self.total * self.mean) / (self.count - 1)
+        return max(variance, 0.0)
+
+
+def _pid(match):
+    """Return the pid of a log line in either format."""
+    pid, user = match.group(3), match.group(4)
+    if match.group(5) or not user.isdigit():
+        return pid
+    return user
+
+
+def parse_log(lines):
+    """Return the durations of the tasks found in ansible log lines.
+
+    The lines are consumed one at a time, only one entry per distinct task
+    is kept in memory.
+
+    returns: `dict`
+    """
+    tasks = {}
+    # pid: (play, task key, start time)
+    current = {}
+    last_second = epoch = None
+    for line in lines:
+        # Most lines are task results, skip them before using the regexes.
+        message = line[line.find('| ') + 2:].lstrip()
+        if not message.startswith(HEADERS):
+            continue
+        match = LOG_RE.match(line.rstrip('\n'))
+        if not match:
+            continue
+        header = HEADER_RE.match(match.group(6).strip())
+        if not header:
+            continue
+        if match.group(1) != last_second:
+            try:
+                epoch = calendar.timegm(time.strptime(
+                    match.group(1), '%Y-%m-%d %H:%M:%S'))
+            except ValueError:
+                continue
+            last_second = match.group(1)
+        stamp = epoch + int(match.group(2)) / 1000
+        pid = _pid(match)
+        play, key, start = current.pop(pid, (None, None, None))
+        if key is not None:
+            tasks.setdefault(key, Stats()).add(stamp - start)
+
+        kind, name = header.group(1), (header.group(2) or '').strip()
+        if kind == 'PLAY':
+            current[pid] = (name, None, None)
+        elif kind != 'PLAY RECAP':
+            role, _, task = name.rpartition(' : ')
+            current[pid] = (play, (play or '', role, task), stamp)
+    return tasks
+
+
+def compare(base, new, threshold, min_seconds):
+    """Compare the task durations of two runs.
+
+    A task is reported when its mean duration changed by more than
+    `threshold` percent and `min_seconds` seconds. When both runs have at
+    least two samples of a task the change also has to pass Welch's t-test.
+
+    returns: `list`
+    """
+    changes = []
+    for key in set(base) & set(new):
+        before, after = base[key], new[key]
+        delta = after.mean - before.mean
+        if abs(delta) < min_seconds:
+            continue
+        if before.mean and abs(delta) * 100 / before.mean < threshold:
+            continue
+        if before.count > 1 and after.count > 1:
+            error = math.sqrt(sum(
+                i.variance / i.count for i in (before, after)))
+            if error and abs(delta) / error < T_CRITICAL:
+                continue
+        changes.append({
+            'play': key[0],
+            'role': key[1],
+            'task': key[2],
+            'before': round(before.mean, 3),
+            'after': round(after.mean, 3),
+            'delta': round(delta, 3),
+            'samples': [before.count, after.count]
+        })
+    changes.sort(key=lambda i: i['delta'], reverse=True)
+    return changes
+
+
+def _parse(path):
+    with io.open(path, encoding='utf-8', errors='replace') as f:
+        return parse_log(f)
+
+
+def _total(tasks):
+    return round(sum(i.total for i in tasks.values()), 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compare the task durations of two ansible log files '
+                    'written with ANSIBLE_LOG_PATH.')
+    parser.add_argument('base', help='Log file of the reference run.')
+    parser.add_argument('new', help='Log file of the run to check.')
+    parser.add_argument(
+        '--threshold', type=float, default=20,
+        help='Minimum change of the mean task duration in percent '
+             '(default: %(default)s).')
+    parser.add_argument(
+        '--min-seconds', type=float, default=1,
+        help='Minimum change of the mean task duration in seconds '
+             '(default: %(default)s).')
+    parser.add_argument(
+        '--exit-code', type=int, default=1,
+        help='Exit code returned when a slowdown is found '
+             '(default: %(default)s).')
+    parser.add_argument(
+        '--top', type=int, default=0,
+        help='Only report this many slowdowns and speedups.')
+    parser.add_argument(
+        '--format', choices=('text', 'json'), default='text',
+        help='Output format (default: %(default)s).')
+    args = parser.parse_args(argv)
+
+    base = _parse(args.base)
+    new = _parse(args.new)
+    for path, tasks in ((args.base, base), (args.new, new)):
+        if not tasks:
+            # Nothing to compare, most likely not an ansible log file.
+            print('{}: no tasks found in the log file'.format(path),
+                  file=sys.stderr)
+            return 2
+    changes = compare(base, new, args.threshold, args.min_seconds)
+    slowdowns = [i for i in changes if i['delta'] > 0]
+    speedups = [i for i in reversed(changes) if i['delta'] < 0]
+    if args.top:
+        slowdowns = slowdowns[:args.top]
+        speedups = speedups[:args.top]
+
+    summary = {
+        'base': {'tasks': len(base), 'duration': _total(base)},
+        'new': {'tasks': len(new), 'duration': _total(new)},
+        'removed': len(set(base) - set(new)),
+        'added': len(set(new) - set(base)),
+        'slowdowns': slowdowns,
+        'speedups': speedups
+    }
+    if args.format == 'json':
+        print(json.dumps(summary, indent=2))
+    else:
+        print('base: {tasks} tasks, {duration}s'.format(**summary['base']))
+        print('new:  {tasks} tasks, {duration}s'.format(**summary['new']))
+        print('tasks only in base: {removed}, only in new: {added}'.format(
+            **summary))
+        for title, items in (('SLOWDOWNS', slowdowns),
+                             ('SPEEDUPS', speedups)):
+            print('\n{} ({})'.format(title, len(items)))
+            for item in items:
+                print('{delta:>+10.2f}s {before:>10.2f}s -> {after:>10.2f}s'
+                      '  {play} | {role}{sep}{task}'.format(
+                          sep=' : ' if item['role'] else '', **item))
+
+    return args.exit_code if slowdowns else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Fixtures shared by the molecule tests of the plugin test roles."""
+
+
+import importlib.util
+import itertools
+import os
+import time
+
+import pytest
+
+
+PLUGINS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir,
+    'ansible_plugins')
+
+
+class Host(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class Role(object):
+    def __init__(self, name):
+        self._name = name
+
+    def get_name(self):
+        return self._name
+
+
+class Playbook(object):
+    def __init__(self, file_name):
+        self._file_name = file_name
+
+
+class Play(object):
+    def __init__(self, name):
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+
+class Task(object):
+    """Task with the attributes read by the callback plugins."""
+
+    _uuids = itertools.count()
+
+    def __init__(self, name, role=None, run_once=False, delegate_to=None):
+        self._uuid = 'task-{}'.format(next(self._uuids))
+        self._role = Role(role) if role else None
+        self.name = name
+        self.run_once = run_once
+        self.delegate_to = delegate_to
+
+    def get_name(self):
+        return self.name
+
+
+class Result(object):
+    def __init__(self, host, task, result):
+        self._host = Host(host)
+        self._task = task
+        self.task_name = task.get_name()
+        self._result = result
+
+
+class Clock(object):
+    """Replacement of `time.time` moved forward by the tests."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def load_plugin():
+    """Return a function loading a plugin from its file.
+
+    The function takes the plugin type, e.g. `callback`, and name.
+    """
+    def load(kind, name):
+        spec = importlib.util.spec_from_file_location(
+            name, os.path.join(PLUGINS, kind, '{}.py'.format(name)))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    return load
+
+
+@pytest.fixture
+def fake_playbook():
+    """Return a function creating a playbook from its file name."""
+    return Playbook
+
+
+@pytest.fixture
+def fake_play():
+    """Return a function creating a play from its name."""
+    return Play
+
+
+@pytest.fixture
+def fake_task():
+    """Return a function creating a task, see `Task`."""
+    return Task
+
+
+@pytest.fixture
+def fake_result():
+    """Return a function creating the result of a task on a host.
+
+    The function takes the host name, the task and the result `dict`.
+    """
+    return Result
+
+
+@pytest.fixture
+def fake_host():
+    """Return a function creating a host from its name."""
+    return Host
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace `time.time` with a clock only moved by the test."""
+    now = Clock()
+    monkeypatch.setattr(time, 'time', now)
+    return now
@@ -0,0 +1,220 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import os
+import random
+import sys
+
+import pytest
+
+from ansible.errors import AnsibleFilterError
+from ansible.inventory.manager import InventoryManager
+from ansible.parsing.dataloader import DataLoader
+from ansible.template import Templar
+from ansible.vars.hostvars import HostVars
+from ansible.vars.manager import VariableManager
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'filter'))
+
+import helpers  # noqa: E402
+
+
+# Template previously used by the tripleo-ssh-known-hosts role to set
+# ssh_known_hosts_lines, the ssh_known_hosts_lines filter must return the
+# same text.
+SSH_KNOWN_HOSTS_TEMPLATE = (
+    "{%- for host in groups['overcloud'] | intersect(play_hosts) %}\n"
+    "[{{ ctlplane_ip }}]*,[{{ host }}.{{ cloud_domain }}]*,[{{ host }}]*{%- if enabled_networks | length > 0 %},{% endif %}\n"
+    "{%- for network in enabled_networks %}\n"
+    "{%- if network in role_networks %}\n"
+    "[{{ hostvars[host][networks[network]['name'] ~ '_ip'] }}]*,[{{ host }}.{{ networks[network]['name'] }}]*,{% if 1 %}{% endif %}\n"
+    "[{{ host }}.{{ networks[network]['name'] }}.{{ cloud_domain }}]*{% if not loop.last %},{% endif %}\n"
+    "{%- endif -%}\n"
+    "{%- endfor -%}\n"
+    "{{ ' ssh-rsa ' ~ hostvars[host]['ansible_ssh_host_key_rsa_public'] }}\n"
+    "{% endfor %}"
+)
+
+SSH_KNOWN_HOSTS_FILTER = (
+    "{{ hostvars | ssh_known_hosts_lines(groups['overcloud'] | intersect(play_hosts), "
+    "ctlplane_ip, cloud_domain, enabled_networks, role_networks, networks) }}"
+)
+
+NETWORKS = {
+    'External': {'name': 'external'},
+    'InternalApi': {'name': 'internal_api'},
+    'Storage': {'name': 'storage'},
+    'StorageMgmt': {'name': 'storage_mgmt'},
+    'Tenant': {'name': 'tenant'},
+    'Management': {'name': 'management'},
+}
+
+
+@pytest.fixture
+def play(monkeypatch):
+    loader = DataLoader()
+    inventory = InventoryManager(loader=loader, sources=[
+        ','.join('controller-{}'.format(i) for i in range(3)) + ','])
+    inventory.add_group('octavia_nodes')
+    variable_manager = VariableManager(loader=loader, inventory=inventory)
+    for i, host in enumerate(inventory.get_hosts()):
+        inventory.add_host(host.name, group='octavia_nodes')
+        host.set_variable('o_hm_ip', '172.24.0.{}'.format(i))
+        host.set_variable('o_hm_port', '{{ 5555 + %d }}' % i)
+    hostvars = HostVars(inventory=inventory, variable_manager=variable_manager,
+                        loader=loader)
+    variable_manager._hostvars = hostvars
+    calls = []
+    raw_get = hostvars.raw_get
+
+    def counted_raw_get(host_name):
+        calls.append(host_name)
+        return raw_get(host_name)
+
+    monkeypatch.setattr(hostvars, 'raw_get', counted_raw_get)
+    monkeypatch.setattr(helpers, '_CACHE', {})
+    return inventory, variable_manager, hostvars, calls
+
+
+def _template(play, template):
+    inventory, variable_manager, hostvars, _ = play
+    variables = variable_manager.get_vars(host=inventory.get_host('controller-0'))
+    variables['hostvars'] = hostvars
+    templar = Templar(loader=DataLoader(), variables=variables)
+    templar.environment.filters.update(helpers.FilterModule().filters())
+    return templar.template(template)
+
+
+def test_octavia_ip_list(play):
+    expected = "{% for octavia_node in groups['octavia_nodes'] %}{{ hostvars[octavia_node].o_hm_ip }}, {%endfor%}"
+    new = "{{ hostvars | hostvars_values(groups['octavia_nodes'], 'o_hm_ip') | join(', ') }}"
+    assert _template(play, new) == _template(play, expected)[:-2]
+    assert _template(play, new) == '172.24.0.0, 172.24.0.1, 172.24.0.2'
+
+
+def test_project(play):
+    projection = _template(
+        play, "{{ hostvars | hostvars_project(groups['all'], ['o_hm_port', 'o_hm_ip', 'undefined']) }}")
+    assert projection['controller-2'] == {
+        'o_hm_ip': '172.24.0.2', 'o_hm_port': '5557'}
+    assert sorted(projection) == ['controller-0', 'controller-1', 'controller-2']
+
+
+def test_undefined(play):
+    with pytest.raises(Exception) as e:
+        _template(play, "{{ hostvars | hostvars_values(groups['all'], 'undefined') }}")
+    assert 'undefined is not defined for controller-0' in str(e.value)
+    assert _template(
+        play, "{{ hostvars | hostvars_values(groups['all'], 'undefined', default='x') }}"
+    ) == ['x', 'x', 'x']
+    with pytest.raises(AnsibleFilterError):
+        helpers.FilterModule().hostvars_values(play[2], ['unknown'], 'o_hm_ip')
+
+
+def test_memoized_in_workers(play, monkeypatch):
+    _, _, hostvars, calls = play
+    filters = helpers.FilterModule()
+    hosts = ['controller-0', 'controller-1', 'controller-2']
+
+    # The controller gathers the variables again for every call.
+    filters.hostvars_values(hostvars, hosts, 'o_hm_ip')
+    filters.hostvars_values(hostvars, hosts, 'o_hm_ip')
+    assert len(calls) == 6
+
+    monkeypatch.setattr(helpers, '_memoize', lambda: True)
+    del calls[:]
+    for _ in range(10):
+        filters.hostvars_values(hostvars, hosts, 'o_hm_ip')
+    assert len(calls) == 3
+    # Only the new keys are gathered.
+    assert filters.hostvars_project(hostvars, hosts, ['o_hm_ip', 'o_hm_port'])[
+        'controller-1'] == {'o_hm_ip': '172.24.0.1', 'o_hm_port': '5556'}
+    assert len(calls) == 6
+
+
+def _known_hosts_play(hosts, seed):
+    rand = random.Random(seed)
+    loader = DataLoader()
+    inventory = InventoryManager(loader=loader, sources=[
+        ','.join('overcloud-{}'.format(i) for i in range(hosts)) + ','])
+    inventory.add_group('overcloud')
+    variable_manager = VariableManager(loader=loader, inventory=inventory)
+    names = sorted(NETWORKS)
+    for i, host in enumerate(inventory.get_hosts()):
+        # Hosts outside of the play and of the overcloud group are skipped.
+        if rand.random() > 0.1:
+            inventory.add_host(host.name, group='overcloud')
+        host.set_variable('ansible_ssh_host_key_rsa_public',
+                          'AAAAB3Nza{}'.format(rand.getrandbits(64)))
+        host.set_variable('ctlplane_ip', '192.168.24.{}'.format(i))
+        host.set_variable('cloud_domain', 'localdomain')
+        host.set_variable('networks', NETWORKS)
+        host.set_variable('enabled_networks', rand.sample(
+            names, rand.randint(0, len(names))))
+        host.set_variable('role_networks', rand.sample(
+            names, rand.randint(0, len(names))))
+        for network in NETWORKS.values():
+            host.set_variable(network['name'] + '_ip', '172.{}.0.{}'.format(
+                rand.randint(16, 31), i))
+    hostvars = HostVars(inventory=inventory, variable_manager=variable_manager,
+                        loader=loader)
+    variable_manager._hostvars = hostvars
+    play_hosts = [h.name for h in inventory.get_hosts()
+                  if rand.random() > 0.1]
+    return inventory, variable_manager, hostvars, play_hosts
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_ssh_known_hosts_lines(seed, monkeypatch):
+    monkeypatch.setattr(helpers, '_CACHE', {})
+    inventory, variable_manager, hostvars, play_hosts = _known_hosts_play(
+        20, seed)
+    for host in play_hosts[:3]:
+        variables = variable_manager.get_vars(host=inventory.get_host(host))
+        variables['hostvars'] = hostvars
+        variables['play_hosts'] = play_hosts
+        templar = Templar(loader=DataLoader(), variables=variables)
+        templar.environment.filters.update(helpers.FilterModule().filters())
+        expected = templar.template(SSH_KNOWN_HOSTS_TEMPLATE)
+        assert templar.template(SSH_KNOWN_HOSTS_FILTER) == expected
+        assert expected.count('\n') == len(
+            [h for h in inventory.get_groups_dict()['overcloud']
+             if h in play_hosts])
+
+
+def test_ssh_known_hosts_lines_no_networks():
+    lines = helpers.FilterModule().ssh_known_hosts_lines(
+        {'node-0': {'ansible_ssh_host_key_rsa_public': 'AAAATEST'}},
+        ['node-0'], '10.0.0.0', 'localdomain', [], [], {})
+    assert lines == '[10.0.0.0]*,[node-0.localdomain]*,[node-0]* ssh-rsa AAAATEST\n'
+
+
+def test_ssh_known_hosts_lines_undefined():
+    with pytest.raises(AnsibleFilterError):
+        helpers.FilterModule().ssh_known_hosts_lines(
+            {'node-0': {'ansible_ssh_host_key_rsa_public': 'AAAATEST'}},
+            ['node-0'], '10.0.0.0', 'localdomain', ['Tenant'], ['Tenant'],
+            NETWORKS)
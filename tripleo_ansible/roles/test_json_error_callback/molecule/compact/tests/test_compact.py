@@ -0,0 +1,42 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+def test_for_logfile(host):
+    log_file = host.file("/tmp/json_error_compact.log")
+    assert log_file.exists
+    errors = list(json.loads(log_file.content_string).values())
+    # The failure of every host is collapsed in a single error, the
+    # ignored error is not logged.
+    assert len(errors) == 1
+    error = errors[0]
+    assert set(error) == set(['task', 'msg', 'hosts', 'count', 'result'])
+    assert error['task'] == 'Force a failure'
+    assert error['msg'] == 'Service failed on <host> after <n> retries'
+    assert sorted(error['hosts']) == sorted(testinfra_hosts)
+    assert error['count'] == len(testinfra_hosts)
+    assert error['result']['msg'] in [
+        'Service failed on {} after 3 retries'.format(i)
+        for i in testinfra_hosts]
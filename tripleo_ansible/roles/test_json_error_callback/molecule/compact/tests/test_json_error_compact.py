@@ -0,0 +1,172 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import json
+import os
+
+import pytest
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+CALLBACK = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'callback', 'json_error.py')
+
+
+class Host(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class Result(object):
+    def __init__(self, host, task, result):
+        self._host = Host(host)
+        self.task_name = task
+        self._result = result
+
+
+@pytest.fixture
+def log_file(tmpdir):
+    return tmpdir.join('errors.log')
+
+
+@pytest.fixture
+def json_error(monkeypatch, log_file):
+    monkeypatch.setenv('JSON_ERROR_LOG_FILE', str(log_file))
+    monkeypatch.setenv('JSON_ERROR_COMPACT', 'true')
+    monkeypatch.setenv('JSON_ERROR_MAX_LINES', '2')
+    monkeypatch.setenv('JSON_ERROR_MAX_SIZE', '10')
+    spec = importlib.util.spec_from_file_location('json_error', CALLBACK)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _failed(host, **result):
+    result['failed'] = True
+    return Result(host, 'Start service', result)
+
+
+FAILURES = [
+    _failed('controller-0', msg='controller-0: failed after 3 retries'),
+    _failed('controller-1', msg='controller-1: failed after 5 retries'),
+    _failed('controller-1', msg='controller-1: failed after 1 retries'),
+    _failed('compute-0', msg='non-zero return code',
+            stderr='Starting\nError: no such container',
+            stdout_lines=['one', 'two', 'three']),
+]
+
+
+def test_normalise_message(json_error):
+    assert json_error.normalise_message(
+        'controller-0 cannot reach 192.168.24.1 for volume '
+        '5f3c1a4e-6b7d-4c2e-9a1f-0e8d7c6b5a49 in container 3f9ac41d22b7 '
+        'after 3 tries', 'controller-0') == (
+        '<host> cannot reach <ip> for volume <uuid> in container <id> '
+        'after <n> tries')
+    # Words made of hexadecimal letters only are kept.
+    assert json_error.normalise_message('deadbeefcafe failed') == (
+        'deadbeefcafe failed')
+
+
+def test_error_message(json_error):
+    assert json_error.error_message(FAILURES[3]._result) == (
+        'non-zero return code\nError: no such container')
+    assert json_error.error_message({'msg': ['a', 'b']}) == '["a", "b"]'
+    assert json_error.error_message({}) == ''
+
+
+def test_compact_result(json_error):
+    result = {
+        'msg': 'short',
+        'stdout': 'x' * 20,
+        'stdout_lines': ['one', 'two', 'three'],
+        'invocation': {'module_args': {'name': 'keystone'}},
+        'results': [{'stderr': 'y' * 20}, 'item'],
+        'rc': 1
+    }
+    assert json_error.compact_result(result, max_lines=2, max_size=10) == {
+        'msg': 'short',
+        'stdout': '...' + 'x' * 10,
+        'stdout_lines': ['... 1 lines truncated', 'two', 'three'],
+        'invocation': '{"module_a...',
+        'results': [{'stderr': '...' + 'y' * 10}, 'item'],
+        'rc': 1
+    }
+    # The result itself is left untouched.
+    assert result['stdout'] == 'x' * 20
+
+
+def test_compact(json_error, log_file):
+    callback = json_error.CallbackModule()
+    callback.v2_playbook_on_start(None)
+    for failure in FAILURES:
+        callback.v2_runner_on_failed(failure)
+    callback.v2_runner_on_failed(
+        _failed('compute-1', msg='compute-1: failed after 2 retries'),
+        ignore_errors=True)
+    callback.v2_playbook_on_stats(None)
+    errors = sorted(
+        json.loads(log_file.read()).values(), key=lambda i: i['count'])
+    assert errors == [{
+        'task': 'Start service',
+        'msg': 'non-zero return code\nError: no such container',
+        'hosts': ['compute-0'],
+        'count': 1,
+        'result': {
+            'failed': True,
+            'msg': '...eturn code',
+            'stderr': '... container',
+            'stdout_lines': ['... 1 lines truncated', 'two', 'three']
+        }
+    }, {
+        'task': 'Start service',
+        'msg': '<host>: failed after <n> retries',
+        'hosts': ['controller-0', 'controller-1'],
+        'count': 3,
+        'result': {
+            'failed': True,
+            'msg': '... 3 retries'
+        }
+    }]
+
+
+def test_compact_stream(json_error, log_file, monkeypatch):
+    monkeypatch.setenv('JSON_ERROR_STREAM', 'true')
+    callback = json_error.CallbackModule()
+    callback.v2_playbook_on_start(None)
+    for failure in FAILURES:
+        callback.v2_runner_on_failed(failure)
+    # Only the fingerprints are held in memory.
+    assert [i['hosts'] for i in callback.errors.values()] == [[], []]
+    callback.v2_playbook_on_stats(None)
+    records = [json.loads(line) for line in log_file.readlines()]
+    # The result is written with the first failure of an error only.
+    assert ['result' in i for i in records] == [True, False, False, True]
+    aggregated = json_error.aggregate_stream(str(log_file))
+    # The stream is rebuilt in the format written without streaming.
+    monkeypatch.setenv('JSON_ERROR_STREAM', 'false')
+    callback = json_error.CallbackModule()
+    for failure in FAILURES:
+        callback.v2_runner_on_failed(failure)
+    assert aggregated == callback.errors
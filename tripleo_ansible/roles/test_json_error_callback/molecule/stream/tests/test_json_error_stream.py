@@ -0,0 +1,133 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import json
+import os
+
+import pytest
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+CALLBACK = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'callback', 'json_error.py')
+
+
+class Host(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class Result(object):
+    def __init__(self, host, task, result):
+        self._host = Host(host)
+        self.task_name = task
+        self._result = result
+
+
+@pytest.fixture
+def log_file(tmpdir):
+    return tmpdir.join('errors.log')
+
+
+@pytest.fixture
+def json_error(monkeypatch, log_file):
+    monkeypatch.setenv('JSON_ERROR_LOG_FILE', str(log_file))
+    monkeypatch.setenv('JSON_ERROR_STREAM', 'true')
+    spec = importlib.util.spec_from_file_location('json_error', CALLBACK)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def syncs(json_error, monkeypatch):
+    """Return the file descriptors synced, without syncing them."""
+    synced = list()
+    monkeypatch.setattr(json_error.os, 'fsync', synced.append)
+    return synced
+
+
+def _records(log_file):
+    return [json.loads(line) for line in log_file.readlines()]
+
+
+def test_stream(json_error, log_file, syncs):
+    callback = json_error.CallbackModule()
+    callback.v2_playbook_on_start(None)
+    callback.v2_runner_on_failed(
+        Result('controller-0', 'Ping', {'msg': 'unreachable'}))
+    # The first record is on disk as soon as it is written.
+    assert _records(log_file) == [{
+        'host': 'controller-0',
+        'task': 'Ping',
+        'result': {'msg': 'unreachable'}
+    }]
+    callback.v2_runner_on_failed(
+        Result('compute-0', 'Ping', {'msg': 'ignored'}), ignore_errors=True)
+    callback.v2_runner_on_failed(
+        Result('compute-0', 'Ping', {'msg': 'timeout'}))
+    # Nothing is kept in memory.
+    assert callback.errors == {}
+    callback.v2_playbook_on_stats(None)
+    assert callback.stream_file is None
+    assert [(i['host'], i['result']['msg']) for i in _records(log_file)] == [
+        ('controller-0', 'unreachable'), ('compute-0', 'timeout')]
+
+
+@pytest.mark.parametrize('interval, count', [
+    ('3600', 2),
+    ('0', 4),
+])
+def test_stream_fsync_interval(json_error, log_file, syncs, monkeypatch,
+                               interval, count):
+    monkeypatch.setenv('JSON_ERROR_FSYNC_INTERVAL', interval)
+    callback = json_error.CallbackModule()
+    callback.v2_playbook_on_start(None)
+    for host in ('controller-0', 'compute-0', 'compute-1'):
+        callback.v2_runner_on_failed(Result(host, 'Ping', {'msg': 'failed'}))
+    callback.v2_playbook_on_stats(None)
+    # The file is always synced when the run ends.
+    assert len(syncs) == count
+    assert len(_records(log_file)) == 3
+
+
+def test_aggregate_stream(json_error, log_file, syncs):
+    callback = json_error.CallbackModule()
+    callback.v2_playbook_on_start(None)
+    callback.v2_runner_on_failed(
+        Result('controller-0', 'Ping', {'msg': 'unreachable'}))
+    callback.v2_runner_on_failed(
+        Result('controller-0', 'Install', {'msg': 'no package'}))
+    callback.v2_runner_on_failed(
+        Result('compute-0', 'Ping', {'msg': 'timeout'}))
+    callback.v2_playbook_on_stats(None)
+    # Last line of an interrupted run.
+    log_file.write('{"host": "compute-1", "ta', mode='a')
+    assert json_error.aggregate_stream(str(log_file)) == {
+        'controller-0': [
+            ('Ping', {'msg': 'unreachable'}),
+            ('Install', {'msg': 'no package'})
+        ],
+        'compute-0': [('Ping', {'msg': 'timeout'})]
+    }
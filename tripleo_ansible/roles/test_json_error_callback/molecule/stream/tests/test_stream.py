@@ -0,0 +1,39 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+def test_for_logfile(host):
+    log_file = host.file("/tmp/json_error_stream.log")
+    assert log_file.exists
+    records = [
+        json.loads(line) for line in log_file.content_string.splitlines()]
+    # The ignored error is not logged, the rescued failure is logged once
+    # for every host.
+    assert sorted(i['host'] for i in records) == sorted(testinfra_hosts)
+    for record in records:
+        assert set(record) == set(['host', 'task', 'result'])
+        assert record['task'] == 'Force a failure'
+        assert record['result']['msg'] == (
+            'Service failed on {} after 3 retries'.format(record['host']))
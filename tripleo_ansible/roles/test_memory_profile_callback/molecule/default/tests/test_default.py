@@ -0,0 +1,34 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+def test_memory_report(host):
+    report_file = host.file("/tmp/ansible-memory.json")
+    assert report_file.exists
+    report = json.loads(report_file.content_string)
+    assert report['rss']['peak'] >= report['rss']['start']
+    variables = report['variables']
+    assert variables['test_large_result']['estimated_bytes'] > 48894
+    assert variables['test_fact']['estimated_bytes'] > 0
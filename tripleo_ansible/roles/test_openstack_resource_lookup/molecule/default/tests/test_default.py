@@ -0,0 +1,196 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from ansible import constants
+from ansible.errors import AnsibleError
+from ansible.module_utils.six.moves import BaseHTTPServer
+from ansible.module_utils.six.moves.urllib.parse import parse_qs, urlparse
+from ansible.plugins.loader import lookup_loader
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PLUGIN_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'lookup')
+
+PROJECTS = [{'id': 'p1', 'name': 'service'}, {'id': 'p2', 'name': 'admin'}]
+NETWORKS = [{'id': 'n1', 'name': 'lb-mgmt-net', 'mtu': 1450}]
+IMAGES = [
+    {'id': 'i1', 'name': 'amphora', 'owner': 'p1', 'visibility': 'private'},
+    {'id': 'i2', 'name': 'amphora', 'owner': 'p2', 'visibility': 'public'}
+]
+
+
+class FakeOpenStack(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Keystone, Neutron and Glance stand-in counting the requests."""
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        server.requests.append(('POST', self.path))
+        length = int(self.headers.get('Content-Length', 0))
+        auth = json.loads(self.rfile.read(length).decode('utf-8'))
+        password = auth['auth']['identity']['password']['user']['password']
+        if self.path != '/v3/auth/tokens' or password != 'secret':
+            return self._reply(401, {'error': {'code': 401}})
+        server.token += 1
+        endpoint = 'http://127.0.0.1:{}'.format(server.server_port)
+        catalog = [
+            {'type': service, 'endpoints': [
+                {'interface': 'public', 'region': 'regionOne',
+                 'url': endpoint + suffix}]}
+            for service, suffix in (('identity', '/v3'), ('network', ''),
+                                    ('image', ''))
+        ]
+        self._reply(201, {'token': {
+            'expires_at': time.strftime(
+                '%Y-%m-%dT%H:%M:%S.000000Z', time.gmtime(time.time() + 3600)),
+            'catalog': catalog
+        }}, {'X-Subject-Token': 'token-{}'.format(server.token)})
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(('GET', self.path))
+        token = self.headers.get('X-Auth-Token')
+        if token != 'token-{}'.format(server.token) or token in server.revoked:
+            return self._reply(401, {'error': {'code': 401}})
+        url = urlparse(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        for path, collection, items in (
+                ('/v3/projects', 'projects', PROJECTS),
+                ('/v2.0/networks', 'networks', NETWORKS),
+                ('/v2/images', 'images', IMAGES)):
+            if url.path == path:
+                return self._reply(200, {collection: [
+                    i for i in items
+                    if all(i.get(k) == v for k, v in query.items())]})
+            if url.path.startswith(path + '/'):
+                for i in items:
+                    if i['id'] == url.path[len(path) + 1:]:
+                        return self._reply(200, {collection[:-1]: i})
+        self._reply(404, {'error': {'code': 404}})
+
+
+@pytest.fixture
+def cloud(monkeypatch, tmpdir):
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), FakeOpenStack)
+    server.requests = []
+    server.token = 0
+    server.revoked = set()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    # Every test gets its own run cache.
+    monkeypatch.setattr(constants, 'DEFAULT_LOCAL_TMP', str(tmpdir))
+    lookup_loader.add_directory(PLUGIN_DIR)
+    plugin = lookup_loader.get('openstack_resource')
+    monkeypatch.setattr(sys.modules[type(plugin).__module__], '_CACHE', {})
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _lookup(server, *terms, **kwargs):
+    kwargs.setdefault('auth_url', 'http://127.0.0.1:{}/v3'.format(
+        server.server_port))
+    kwargs.setdefault('username', 'admin')
+    kwargs.setdefault('password', 'secret')
+    kwargs.setdefault('project_name', 'admin')
+    return lookup_loader.get('openstack_resource').run(
+        list(terms), variables={}, **kwargs)
+
+
+def test_cached_lookups(cloud):
+    assert _lookup(cloud, 'project', 'service', field='id') == ['p1']
+    assert _lookup(cloud, 'network', 'lb-mgmt-net', field='mtu') == [1450]
+    assert len(cloud.requests) == 3
+    assert cloud.token == 1
+    # Repeated lookups are served from the cache.
+    for _ in range(10):
+        assert _lookup(cloud, 'project', 'service', field='id') == ['p1']
+    assert len(cloud.requests) == 3
+
+
+def test_ttl(cloud):
+    assert _lookup(cloud, 'project', 'service', ttl=0, field='id') == ['p1']
+    time.sleep(0.01)
+    assert _lookup(cloud, 'project', 'service', ttl=0, field='id') == ['p1']
+    # The token is reused.
+    assert cloud.token == 1
+    assert len(cloud.requests) == 3
+
+
+def test_lookup_by_id_and_filters(cloud):
+    assert _lookup(cloud, 'project', 'p2', field='name') == ['admin']
+    images = _lookup(cloud, 'image', 'amphora',
+                     filters={'owner': 'p1', 'visibility': 'private'})
+    assert images == [IMAGES[0]]
+    with pytest.raises(AnsibleError):
+        _lookup(cloud, 'image', 'amphora')
+
+
+def test_not_found(cloud):
+    assert _lookup(cloud, 'network', 'missing', default='') == ['']
+    with pytest.raises(AnsibleError):
+        _lookup(cloud, 'network', 'missing')
+
+
+def test_revoked_token(cloud):
+    assert _lookup(cloud, 'project', 'service', field='id') == ['p1']
+    cloud.revoked.add('token-1')
+    assert _lookup(cloud, 'project', 'admin', field='id') == ['p2']
+    assert cloud.token == 2
+
+
+def test_shared_by_workers(cloud):
+    # Lookups run in the forked workers of the controller, what one worker
+    # found is used by the others.
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _lookup(cloud, 'network', 'lb-mgmt-net')
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    requests = len(cloud.requests)
+    assert _lookup(cloud, 'network', 'lb-mgmt-net', field='id') == ['n1']
+    assert len(cloud.requests) == requests == 2
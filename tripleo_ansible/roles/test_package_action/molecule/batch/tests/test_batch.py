@@ -0,0 +1,208 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import os
+
+import pytest
+
+from ansible.parsing.dataloader import DataLoader
+from ansible.playbook.play import Play
+from ansible.playbook.play_context import PlayContext
+from ansible.template import Templar
+from ansible.vars.manager import VariableManager
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PLUGINS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins')
+
+
+def _load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def plugin(monkeypatch, tmpdir):
+    module = _load(
+        'tripleo_package_action',
+        os.path.join(PLUGINS, 'action', 'package.py'))
+    monkeypatch.setattr(module.C, 'DEFAULT_LOCAL_TMP', str(tmpdir))
+    return module
+
+
+class Run(object):
+    """Run the tasks of a play with the package module stubbed out."""
+
+    def __init__(self, plugin, tasks):
+        self.plugin = plugin
+        self.loader = DataLoader()
+        self.play = Play.load(
+            dict(hosts='all', gather_facts=False, tasks=tasks),
+            loader=self.loader,
+            variable_manager=VariableManager(loader=self.loader))
+        self.tasks = [
+            t for t in plugin._play_tasks(self.play.compile())
+            if t.action != 'meta']
+        # (target host, package module arguments) of every run.
+        self.calls = []
+
+    def task(self, index, host, **task_vars):
+        task = self.tasks[index]
+        task_vars = dict(task_vars, inventory_hostname=host)
+        action = self.plugin.ActionModule(
+            task, None, PlayContext(), self.loader,
+            Templar(loader=self.loader, variables=task_vars), None)
+
+        def run_package(tmp, task_vars):
+            self.calls.append(
+                (action._target_host(task_vars), dict(action._task.args)))
+            return {'changed': True}
+
+        action._run_package = run_package
+        return action.run(task_vars=task_vars)
+
+
+def _package(name, **kwargs):
+    return dict(kwargs, package=dict(name=name, state='present'))
+
+
+def test_package_installed(host):
+    assert host.package("bison").is_installed
+
+
+def test_queued_task_pending(plugin):
+    run = Run(plugin, [_package('bison'), _package('flex')])
+    result = run.task(0, 'a', tripleo_package_batch=True)
+    assert result['changed'] is True
+    assert result['pending'] is True
+    assert result['queued'] == ['bison']
+    assert run.calls == []
+
+
+def test_last_package_task_flushes(plugin):
+    run = Run(plugin, [
+        _package('bison'),
+        dict(debug=dict(msg='between')),
+        _package('flex')])
+    run.task(0, 'a', tripleo_package_batch=True)
+    result = run.task(2, 'a', tripleo_package_batch=True)
+    assert run.calls == [('a', {'name': ['bison', 'flex'],
+                                'state': 'present'})]
+    assert result['changed'] is True
+    assert plugin._load_cache('batch', 'a') is None
+
+
+def test_include_is_not_flushed(plugin):
+    run = Run(plugin, [
+        _package('bison'),
+        dict(include_tasks='more-packages.yml')])
+    result = run.task(0, 'a', tripleo_package_batch=True)
+    assert result['pending'] is True
+    assert run.calls == []
+
+
+def test_play_compiled_once(plugin, monkeypatch):
+    run = Run(plugin, [_package(i) for i in ('bison', 'flex', 'm4')])
+    compiled = []
+    compile_play = run.play.compile
+    monkeypatch.setattr(
+        run.play, 'compile', lambda: compiled.append(1) or compile_play())
+    for index in range(3):
+        for host in ('a', 'b'):
+            run.task(index, host, tripleo_package_batch=True)
+    assert len(compiled) == 1
+    assert run.calls == [
+        ('a', {'name': ['bison', 'flex', 'm4'], 'state': 'present'}),
+        ('b', {'name': ['bison', 'flex', 'm4'], 'state': 'present'})]
+
+
+def test_play_layout(plugin):
+    run = Run(plugin, [
+        _package('bison', vars=dict(
+            tripleo_enable_package_install='{{ enabled }}')),
+        dict(include_tasks='more-packages.yml'),
+        _package('{{ item }}', loop=['flex', 'm4']),
+        dict(debug=dict(msg='after'))])
+    layout = plugin._play_layout(run.tasks[0])
+    assert layout['last'][:2] == [run.tasks[2]._uuid, run.tasks[3]._uuid]
+    assert layout['packages'] == [{
+        'args': {'name': 'bison', 'state': 'present'},
+        'loop': None,
+        'loop_with': None,
+        'enabled': '{{ enabled }}'
+    }, {
+        'args': {'name': '{{ item }}', 'state': 'present'},
+        'loop': ['flex', 'm4'],
+        'loop_with': None
+    }]
+    # The layout is read back from the controller side cache.
+    assert plugin._play_layout(run.tasks[2]) == layout
+
+    action = plugin.ActionModule(
+        run.tasks[0], None, PlayContext(), run.loader,
+        Templar(loader=run.loader, variables=dict(enabled=False)), None)
+    assert [action._task_packages(i) for i in layout['packages']] == [
+        None, ('present', ['flex', 'm4'])]
+
+
+def test_delegated_task_keeps_queue(plugin):
+    run = Run(plugin, [
+        _package('bison'),
+        _package('flex', delegate_to='b'),
+        _package('m4')])
+    run.task(0, 'a', tripleo_package_batch=True)
+    result = run.task(1, 'a', tripleo_package_batch=True)
+    # The delegated task only installs its own package on its host.
+    assert run.calls == [('b', {'name': 'flex', 'state': 'present'})]
+    assert 'batch_results' not in result
+    assert plugin._load_cache('batch', 'a')['present'] == ['bison']
+
+    run.task(2, 'a', tripleo_package_batch=True)
+    assert run.calls[1] == ('a', {'name': ['bison', 'm4'],
+                                  'state': 'present'})
+
+
+def test_leftover_queue_reported(plugin, tmpdir):
+    run = Run(plugin, [_package('bison'), _package('flex')])
+    run.task(0, 'a', tripleo_package_batch=True)
+    callback = _load(
+        'tripleo_package_batch_callback',
+        os.path.join(PLUGINS, 'callback', 'package_batch.py'))
+    assert callback.pending_packages(str(tmpdir)) == {
+        'a': {'present': ['bison']}}
+
+    errors = []
+
+    class Display(object):
+        def error(self, msg):
+            errors.append(msg)
+
+    module = callback.CallbackModule()
+    module._display = Display()
+    module.v2_playbook_on_stats(None)
+    assert len(errors) == 1
+    assert 'on a ' in errors[0] and 'bison (present)' in errors[0]
@@ -0,0 +1,138 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import json
+import os
+import time
+
+import pytest
+
+from ansible.parsing.dataloader import DataLoader
+from ansible.playbook.play import Play
+from ansible.playbook.play_context import PlayContext
+from ansible.template import Templar
+from ansible.vars.manager import VariableManager
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PLUGIN = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'action', 'package.py')
+
+CENTOS = dict(distribution='CentOS', distribution_version='7.7')
+
+
+@pytest.fixture
+def plugin():
+    spec = importlib.util.spec_from_file_location(
+        'tripleo_package_action', PLUGIN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Host(object):
+    """Detect the package manager of a host, setup is stubbed out."""
+
+    def __init__(self, plugin, cache_dir, facts=None, **task_vars):
+        loader = DataLoader()
+        play = Play.load(
+            dict(hosts='all', gather_facts=False,
+                 tasks=[dict(package=dict(name='bison', state='present'))]),
+            loader=loader,
+            variable_manager=VariableManager(loader=loader))
+        task = [t for t in plugin._play_tasks(play.compile())
+                if t.action != 'meta'][0]
+        self.task_vars = dict(
+            task_vars,
+            inventory_hostname='a',
+            ansible_facts=facts or dict(),
+            tripleo_package_manager_cache_dir=str(cache_dir))
+        self.action = plugin.ActionModule(
+            task, None, PlayContext(), loader,
+            Templar(loader=loader, variables=self.task_vars), None)
+        self.action._task_vars = self.task_vars
+        self.action._execute_module = self.setup
+        self.setups = 0
+
+    def setup(self, module_name, module_args, task_vars):
+        assert module_name == 'setup'
+        self.setups += 1
+        return dict(ansible_facts=dict(
+            ansible_pkg_mgr='yum',
+            ansible_distribution='CentOS',
+            ansible_distribution_version='7.7'))
+
+    def package_manager(self):
+        return self.action._package_manager(self.task_vars)
+
+
+def _entry(cache_dir, **entry):
+    cache_dir.join('a.json').write(json.dumps(entry))
+
+
+def test_pkg_mgr_cache_miss(plugin, tmpdir):
+    host = Host(plugin, tmpdir)
+    assert host.package_manager() == 'yum'
+    assert host.setups == 1
+    entry = json.loads(tmpdir.join('a.json').read())
+    assert entry['pkg_mgr'] == 'yum'
+    assert entry['distribution'] == 'CentOS 7.7'
+
+
+def test_pkg_mgr_cache_hit(plugin, tmpdir):
+    _entry(tmpdir, pkg_mgr='dnf', distribution='CentOS 7.7',
+           time=time.time())
+    host = Host(plugin, tmpdir, facts=CENTOS)
+    assert host.package_manager() == 'dnf'
+    assert host.setups == 0
+
+
+def test_pkg_mgr_cache_expired(plugin, tmpdir):
+    _entry(tmpdir, pkg_mgr='dnf', distribution='CentOS 7.7',
+           time=time.time() - 120)
+    host = Host(plugin, tmpdir, tripleo_package_manager_cache_ttl=60)
+    assert host.package_manager() == 'yum'
+    assert host.setups == 1
+    assert json.loads(tmpdir.join('a.json').read())['pkg_mgr'] == 'yum'
+
+
+def test_pkg_mgr_cache_distribution_changed(plugin, tmpdir):
+    _entry(tmpdir, pkg_mgr='dnf', distribution='Fedora 28',
+           time=time.time())
+    host = Host(plugin, tmpdir, facts=CENTOS)
+    assert host.package_manager() == 'yum'
+    assert host.setups == 1
+
+
+def test_pkg_mgr_cache_disabled(plugin, tmpdir):
+    host = Host(plugin, tmpdir, tripleo_package_manager_cache_ttl=0)
+    assert host.package_manager() is None
+    assert host.setups == 0
+    assert not tmpdir.join('a.json').exists()
+
+
+def test_pkg_mgr_from_facts(plugin, tmpdir):
+    host = Host(plugin, tmpdir, facts=dict(pkg_mgr='dnf'))
+    assert host.package_manager() is None
+    assert host.setups == 0
@@ -0,0 +1,143 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import os
+import time
+
+import pytest
+
+from ansible.parsing.dataloader import DataLoader
+from ansible.playbook.play import Play
+from ansible.playbook.play_context import PlayContext
+from ansible.template import Templar
+from ansible.vars.manager import VariableManager
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PLUGIN = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'action', 'package.py')
+
+# Variables read by the shim for every task.
+SHIM_VARS = (
+    'tripleo_enable_package_install',
+    'tripleo_package_prefetch',
+    'tripleo_package_snapshot',
+    'tripleo_package_batch'
+)
+
+
+@pytest.fixture
+def plugin():
+    spec = importlib.util.spec_from_file_location(
+        'tripleo_package_action', PLUGIN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _task(plugin, task):
+    loader = DataLoader()
+    play = Play.load(
+        dict(hosts='all', gather_facts=False, tasks=[task]),
+        loader=loader,
+        variable_manager=VariableManager(loader=loader))
+    return loader, [t for t in plugin._play_tasks(play.compile())
+                    if t.action != 'meta'][0]
+
+
+def _action(plugin, loader, task, task_vars):
+    return plugin.ActionModule(
+        task, None, PlayContext(), loader,
+        Templar(loader=loader, variables=task_vars), None)
+
+
+def test_templated_lookup_per_loop_item(plugin):
+    loader, task = _task(plugin, dict(
+        package=dict(name='{{ item.name }}', state='present'),
+        loop=[dict(name='bison', en=False), dict(name='flex', en=True)]))
+    installed = []
+    results = []
+    # Loop items run in the same worker, one action for every item.
+    for item in task.loop:
+        task_vars = dict(
+            inventory_hostname='a',
+            item=item,
+            tripleo_enable_package_install='{{ item.en }}')
+        action = _action(plugin, loader, task, task_vars)
+        action._run_package = (
+            lambda tmp, task_vars, item=item:
+            installed.append(item['name']) or {'changed': True})
+        results.append(action.run(task_vars=task_vars))
+    assert results[0]['skipped'] is True
+    assert results[1] == {'changed': True}
+    assert installed == ['flex']
+
+
+def test_templated_lookup_dependent_vars(plugin):
+    loader, task = _task(plugin, dict(
+        package=dict(name='bison', state='present')))
+    results = []
+    # Same raw value, the variable it depends on changes between tasks.
+    for enabled in (True, False):
+        task_vars = dict(
+            inventory_hostname='a',
+            enabled=enabled,
+            tripleo_enable_package_install='{{ enabled }}')
+        action = _action(plugin, loader, task, task_vars)
+        action._run_package = lambda tmp, task_vars: {'changed': True}
+        results.append(action.run(task_vars=task_vars))
+    assert results[0] == {'changed': True}
+    assert results[1]['skipped'] is True
+
+
+def test_lookup_overhead(plugin):
+    """Compare the shim variable lookups with templating them.
+
+    Run with ``pytest -s`` to display the per task overhead.
+    """
+    loader, task = _task(plugin, dict(
+        package=dict(name='bison', state='present')))
+    task_vars = dict(('var_{}'.format(i), 'value') for i in range(300))
+    task_vars.update(dict((i, 'true') for i in SHIM_VARS))
+    task_vars['inventory_hostname'] = 'a'
+    runs = 200
+
+    start = time.time()
+    for _ in range(runs):
+        templar = Templar(loader=loader, variables=task_vars)
+        for var_name in SHIM_VARS:
+            plugin._bool_set(templar.template('{{ %s }}' % var_name))
+    templated = (time.time() - start) / runs
+
+    start = time.time()
+    for _ in range(runs):
+        action = _action(plugin, loader, task, task_vars)
+        action._task_vars = task_vars
+        for var_name in SHIM_VARS:
+            action._lookup_bool(var_name)
+    direct = (time.time() - start) / runs
+
+    print('templated lookup: {:.1f} us/task, shim lookup: {:.1f} us/task'
+          .format(templated * 1e6, direct * 1e6))
+    assert direct < templated
@@ -0,0 +1,99 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import os
+import time
+
+import pytest
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PLUGIN = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'action', 'package.py')
+
+
+def test_package_installed(host):
+    assert host.package("bison").is_installed
+
+
+@pytest.fixture
+def plugin(monkeypatch, tmpdir):
+    spec = importlib.util.spec_from_file_location(
+        'tripleo_package_action', PLUGIN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module.C, 'DEFAULT_LOCAL_TMP', str(tmpdir))
+    return module
+
+
+def test_prefetch_slot_acquired(plugin):
+    with plugin._PrefetchSlot('repo', 2, wait=0) as first:
+        with plugin._PrefetchSlot('repo', 2, wait=0) as second:
+            assert first.lock_file is not None
+            assert second.lock_file is not None
+    assert first.lock_file is None
+    assert second.lock_file is None
+
+
+def test_prefetch_slot_deadline(plugin):
+    with plugin._PrefetchSlot('repo', 1, wait=0) as held:
+        start = time.time()
+        with plugin._PrefetchSlot('repo', 1, wait=1) as slot:
+            assert slot.lock_file is None
+        assert time.time() - start < 5
+        assert held.lock_file is not None
+    with plugin._PrefetchSlot('repo', 1, wait=0) as slot:
+        assert slot.lock_file is not None
+
+
+def test_prefetch_skipped_without_slot(plugin, monkeypatch):
+    action = plugin.ActionModule.__new__(plugin.ActionModule)
+    action._task = None
+    task_vars = {'tripleo_package_prefetch_wait': 0}
+    monkeypatch.setattr(plugin, '_play_of', lambda task: None)
+    monkeypatch.setattr(
+        action, '_batch_state', lambda: None, raising=False)
+    monkeypatch.setattr(
+        action, '_lookup_bool', lambda name: None, raising=False)
+    monkeypatch.setattr(
+        action, '_lookup_var', lambda name: task_vars.get(name),
+        raising=False)
+
+    def run_packages(*args, **kwargs):
+        raise AssertionError('prefetch ran without a slot')
+
+    monkeypatch.setattr(action, '_run_packages', run_packages, raising=False)
+    holders = [
+        plugin._PrefetchSlot('default', plugin.PREFETCH_CONCURRENCY, 0)
+        for _ in range(plugin.PREFETCH_CONCURRENCY)
+    ]
+    for holder in holders:
+        holder.__enter__()
+    try:
+        result = action._run_prefetch(None, task_vars)
+    finally:
+        for holder in holders:
+            holder.__exit__()
+    assert result['changed'] is False
+    assert 'no package prefetch slot was free' in result['warnings'][0]
@@ -0,0 +1,132 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import os
+import subprocess
+
+import pytest
+
+from ansible.parsing.dataloader import DataLoader
+from ansible.playbook.play import Play
+from ansible.playbook.play_context import PlayContext
+from ansible.template import Templar
+from ansible.vars.manager import VariableManager
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PLUGIN = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'action', 'package.py')
+
+
+@pytest.fixture
+def host_files(monkeypatch, tmpdir):
+    """Load the plugin with the files of the host in a directory."""
+    spec = importlib.util.spec_from_file_location(
+        'tripleo_package_action', PLUGIN)
+    plugin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(plugin)
+    monkeypatch.setattr(
+        plugin.C, 'DEFAULT_LOCAL_TMP', str(tmpdir.mkdir('local')))
+    root = tmpdir.mkdir('host')
+    root.join('rpmdb').write('bison x86_64 0 3.0.4 2.el7\n')
+    root.mkdir('yum.repos.d').join('base.repo').write('[base]\n')
+    monkeypatch.setattr(plugin, 'SNAPSHOT_FILES', (
+        str(root.join('yum.repos.d', '*')),
+        str(root.join('rpmdb'))))
+    monkeypatch.setattr(
+        plugin, 'RPM_QUERY', 'cat {}'.format(root.join('rpmdb')))
+    return plugin, root
+
+
+class Host(object):
+    """Run the snapshot of a host, remote commands run locally."""
+
+    def __init__(self, plugin):
+        loader = DataLoader()
+        play = Play.load(
+            dict(hosts='all', gather_facts=False,
+                 tasks=[dict(package=dict(name='bison', state='present'))]),
+            loader=loader,
+            variable_manager=VariableManager(loader=loader))
+        task = [t for t in plugin._play_tasks(play.compile())
+                if t.action != 'meta'][0]
+        self.task_vars = dict(inventory_hostname='a')
+        self.action = plugin.ActionModule(
+            task, None, PlayContext(), loader,
+            Templar(loader=loader, variables=self.task_vars), None)
+        self.action._low_level_execute_command = self.execute
+        self.commands = 0
+        self.queries = 0
+
+    def execute(self, cmd, sudoable=True):
+        self.commands += 1
+        output = subprocess.check_output(['/bin/sh', '-c', cmd])
+        self.queries += len(output.splitlines()) > 1
+        return dict(rc=0, stdout=output.decode())
+
+    def snapshot(self):
+        return self.action._snapshot(self.task_vars)
+
+
+def test_package_installed(host):
+    assert host.package("bison").is_installed
+
+
+def test_snapshot_kept(host_files):
+    plugin, root = host_files
+    host = Host(plugin)
+    assert host.snapshot() == ['bison x86_64 0 3.0.4 2.el7']
+    assert host.snapshot() == ['bison x86_64 0 3.0.4 2.el7']
+    # The fingerprint is checked every time, the packages are read once.
+    assert host.commands == 2
+    assert host.queries == 1
+
+
+def test_snapshot_repo_changed(host_files):
+    plugin, root = host_files
+    host = Host(plugin)
+    host.snapshot()
+    root.join('yum.repos.d', 'updates.repo').write('[updates]\n')
+    host.snapshot()
+    assert host.queries == 2
+
+
+def test_snapshot_rpmdb_changed(host_files):
+    plugin, root = host_files
+    host = Host(plugin)
+    host.snapshot()
+    root.join('rpmdb').write('bison x86_64 0 3.0.4 2.el7\n'
+                             'flex x86_64 0 2.5.37 6.el7\n')
+    assert host.snapshot()[-1] == 'flex x86_64 0 2.5.37 6.el7'
+    assert host.queries == 2
+
+
+def test_snapshot_new_play(host_files):
+    plugin, root = host_files
+    host = Host(plugin)
+    host.snapshot()
+    snapshot = plugin._load_cache('snapshot', 'a')
+    plugin._save_cache('snapshot', 'a', dict(snapshot, play='previous'))
+    host.snapshot()
+    assert host.queries == 2
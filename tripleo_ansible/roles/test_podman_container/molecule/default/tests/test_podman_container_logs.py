@@ -0,0 +1,93 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import io
+import os
+import sys
+
+import pytest
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PLUGINS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins')
+
+
+def _load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def logs(monkeypatch):
+    monkeypatch.setitem(
+        sys.modules,
+        'ansible.module_utils.podman_utils',
+        _load('podman_utils',
+              os.path.join(PLUGINS, 'module_utils', 'podman_utils.py')))
+    return _load(
+        'podman_container_logs',
+        os.path.join(PLUGINS, 'modules', 'podman_container_logs.py'))
+
+
+def _reverse(logs, content, block_size, max_line, max_bytes=None):
+    logs.BLOCK_SIZE = block_size
+    return [
+        line for line, _ in logs.reverse_lines(
+            io.BytesIO(content), max_bytes=max_bytes, max_line=max_line)
+    ]
+
+
+def test_podman_stub_installed(host):
+    assert host.file('/usr/local/bin/podman').exists
+
+
+def test_reverse_lines(logs):
+    content = b'one\ntwo\nthree\n'
+    for block_size in (1, 2, 5, 64):
+        assert _reverse(logs, content, block_size, 64) == [
+            b'', b'three', b'two', b'one']
+
+
+def test_reverse_lines_capped_within_block(logs):
+    # Every line fits in a single block but is longer than the cap.
+    content = b'a' * 10 + b'\n' + b'0123456789' + b'\nend\n'
+    assert _reverse(logs, content, 64, 4) == [
+        b'', b'end', b'6789', b'aaaa']
+
+
+def test_reverse_lines_capped_across_blocks(logs):
+    content = b'first\n' + b'x' * 20 + b'0123\nlast\n'
+    for block_size in (3, 4, 7, 64):
+        lines = _reverse(logs, content, block_size, 4)
+        assert lines == [b'', b'last', b'0123', b'irst']
+        assert max(len(i) for i in lines) <= 4
+
+
+def test_reverse_lines_max_bytes(logs):
+    content = b'one\ntwo\nthree\n'
+    assert _reverse(logs, content, 4, 64, max_bytes=10) == [
+        b'', b'three', b'two']
@@ -0,0 +1,151 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import os
+
+import pytest
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PODMAN_UTILS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'module_utils', 'podman_utils.py')
+
+LOCKED = 'Error: error acquiring lock 3 for container: database is locked'
+
+
+@pytest.fixture
+def podman_utils():
+    spec = importlib.util.spec_from_file_location(
+        'podman_utils', PODMAN_UTILS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def sleeps(podman_utils, monkeypatch):
+    """Return the delays slept between retries, without sleeping."""
+    delays = list()
+    monkeypatch.setattr(podman_utils.time, 'sleep', delays.append)
+    return delays
+
+
+class Failed(Exception):
+    pass
+
+
+class Module(object):
+    """Module answering the commands it runs with canned results."""
+
+    def __init__(self, results, timeout=None, retries=3):
+        self.params = dict(timeout=timeout, retries=retries)
+        self.results = list(results)
+        self.commands = list()
+        self.failure = None
+
+    def run_command(self, command, data=None):
+        self.commands.append(command)
+        return self.results.pop(0)
+
+    def get_bin_path(self, name):
+        return '/usr/bin/' + name
+
+    def warn(self, msg):
+        pass
+
+    def fail_json(self, **kwargs):
+        self.failure = kwargs
+        raise Failed(kwargs['msg'])
+
+
+def test_transient_error_retried(podman_utils, sleeps):
+    module = Module([(125, '', LOCKED), (125, '', LOCKED), (0, 'ok', '')])
+    timings = dict()
+    runner = podman_utils.PodmanRunner(module, 'podman', timings)
+    assert runner.run(['container', 'exists', 'keystone']) == (0, 'ok', '')
+    assert module.commands == [['podman', 'container', 'exists',
+                                'keystone']] * 3
+    assert len(sleeps) == 2
+    # Jittered exponential backoff from the 1 second base delay.
+    assert 0.5 <= sleeps[0] <= 1.5
+    assert 1 <= sleeps[1] <= 3
+    assert list(timings) == ['container exists']
+
+
+def test_retries_exhausted(podman_utils, sleeps):
+    module = Module([(125, '', LOCKED)] * 3, retries=2)
+    runner = podman_utils.PodmanRunner(module, 'podman')
+    with pytest.raises(Failed) as error:
+        runner.run(['pull', 'centos:7'])
+    assert len(module.commands) == 3
+    assert len(sleeps) == 2
+    assert 'database is locked' in str(error.value)
+    assert 'pull' in module.failure['timings']
+
+
+def test_retries_exhausted_ignore_errors(podman_utils, sleeps):
+    module = Module([(125, '', LOCKED)] * 2, retries=1)
+    runner = podman_utils.PodmanRunner(module, 'podman')
+    assert runner.run(['rm', 'keystone'], ignore_errors=True) == (
+        125, '', LOCKED)
+    assert len(module.commands) == 2
+
+
+def test_error_not_retried(podman_utils, sleeps):
+    module = Module([(125, '', 'Error: no such container keystone')])
+    runner = podman_utils.PodmanRunner(module, 'podman')
+    with pytest.raises(Failed) as error:
+        runner.run(['start', 'keystone'])
+    assert len(module.commands) == 1
+    assert sleeps == []
+    assert 'no such container' in str(error.value)
+
+
+def test_expected_rc(podman_utils, sleeps):
+    module = Module([(1, '', '')])
+    runner = podman_utils.PodmanRunner(module, 'podman')
+    assert runner.run(['container', 'exists', 'keystone'],
+                      expected_rc=1) == (1, '', '')
+    assert len(module.commands) == 1
+
+
+def test_timeout(podman_utils, sleeps):
+    module = Module([(podman_utils.TIMEOUT_RC, '', LOCKED)], timeout=30)
+    runner = podman_utils.PodmanRunner(module, 'podman')
+    with pytest.raises(Failed) as error:
+        runner.run(['image', 'pull', 'centos:7'])
+    assert module.commands == [[
+        '/usr/bin/timeout', '--kill-after=10', '30',
+        'podman', 'image', 'pull', 'centos:7']]
+    # A timed out command is not run again, even with a transient error.
+    assert sleeps == []
+    assert 'podman image pull timed out after 30 seconds' in str(error.value)
+
+
+def test_timeout_per_command(podman_utils, sleeps):
+    module = Module([(0, '', '')], timeout=30)
+    runner = podman_utils.PodmanRunner(module, 'podman')
+    runner.run(['stop', 'keystone'], timeout=5)
+    assert module.commands[0][:3] == ['/usr/bin/timeout', '--kill-after=10',
+                                      '5']
@@ -0,0 +1,182 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PLUGINS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins')
+
+STATS = [
+    {
+        'id': 'b4dd1e5ff2a7c1d9',
+        'name': 'keystone',
+        'cpu_percent': '1.50%',
+        'mem_usage': '200MiB / 1.5GiB',
+        'mem_percent': '12.50%',
+        'netio': '1kB / 2kB',
+        'blocki': '4MB / 0B',
+        'pids': '12'
+    },
+    {
+        'ID': '0a1b2c3d4e5f',
+        'Name': 'nova_api',
+        'CPUPerc': '10%',
+        'MemUsage': '1GiB / 2GiB',
+        'MemPerc': '50%',
+        'NetIO': '-- / --',
+        'BlockIO': '1KiB / 1KiB',
+        'PIDs': '--'
+    }
+]
+
+
+def _load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def podman_stats(monkeypatch):
+    monkeypatch.setitem(
+        sys.modules,
+        'ansible.module_utils.podman_utils',
+        _load('podman_utils',
+              os.path.join(PLUGINS, 'module_utils', 'podman_utils.py')))
+    module = _load(
+        'podman_stats', os.path.join(PLUGINS, 'modules', 'podman_stats.py'))
+    monkeypatch.setattr(module.time, 'sleep', lambda seconds: None)
+    return module
+
+
+class Failed(Exception):
+    pass
+
+
+class Module(object):
+    """Module answering podman commands with canned results."""
+
+    def __init__(self, results):
+        self.params = dict(timeout=None, retries=0)
+        self.results = list(results)
+        self.commands = list()
+
+    def run_command(self, command, data=None):
+        self.commands.append(command)
+        return self.results.pop(0)
+
+    def fail_json(self, **kwargs):
+        raise Failed(kwargs['msg'])
+
+
+def _sample(podman_stats, results, names=None, samples=1):
+    module = Module(results)
+    runner = podman_stats.PodmanRunner(module, 'podman')
+    stats = podman_stats.sample_stats(
+        module, runner, names or list(), samples, 0)
+    return module, stats
+
+
+def test_podman_stub_installed(host):
+    assert host.file('/usr/local/bin/podman').exists
+
+
+def test_parse_sizes(podman_stats):
+    assert podman_stats.parse_size('1.5GiB') == 1.5 * 1024 ** 3
+    assert podman_stats.parse_size('2kB') == 2000
+    assert podman_stats.parse_size('0B') == 0
+    assert podman_stats.parse_size(12) == 12.0
+    assert podman_stats.parse_size('--') is None
+    assert podman_stats.parse_size('1 parsec') is None
+    assert podman_stats.parse_percent('1.23%') == 1.23
+    assert podman_stats.parse_percent('--') is None
+    assert podman_stats.parse_pair('1kB / 2kB') == (1000, 2000)
+    assert podman_stats.parse_pair('1kB') == (None, None)
+
+
+def test_parse_stats_keys(podman_stats):
+    keystone = podman_stats.parse_stats(STATS[0])
+    assert keystone == {
+        'cpu_percent': 1.5,
+        'mem_percent': 12.5,
+        'mem_usage_bytes': 200 * 1024 ** 2,
+        'net_input_bytes': 1000,
+        'net_output_bytes': 2000,
+        'block_input_bytes': 4000000,
+        'block_output_bytes': 0,
+        'pids': 12.0
+    }
+    nova_api = podman_stats.parse_stats(STATS[1])
+    assert nova_api['cpu_percent'] == 10
+    assert nova_api['mem_usage_bytes'] == 1024 ** 3
+    assert nova_api['net_input_bytes'] is None
+    assert nova_api['pids'] is None
+
+
+def test_sample_aggregated(podman_stats):
+    second = [dict(STATS[0], cpu_percent='4.5%'), STATS[1]]
+    module, stats = _sample(
+        podman_stats,
+        [(0, json.dumps(STATS), ''), (0, json.dumps(second), '')],
+        samples=2)
+    assert len(module.commands) == 2
+    assert module.commands[0] == [
+        'podman', 'stats', '--no-stream', '--format', 'json']
+    assert stats['keystone']['id'] == 'b4dd1e5ff2a7c1d9'
+    assert stats['keystone']['samples'] == 2
+    assert stats['keystone']['cpu_percent'] == {
+        'min': 1.5, 'max': 4.5, 'avg': 3.0, 'p95': 4.5}
+    assert 'net_input_bytes' not in stats['nova_api']
+    assert 'pids' not in stats['nova_api']
+
+
+def test_sample_names(podman_stats):
+    _, stats = _sample(
+        podman_stats, [(0, json.dumps(STATS), '')], names=['0a1b2c'])
+    assert list(stats) == ['nova_api']
+
+
+def test_sample_no_containers(podman_stats):
+    _, stats = _sample(podman_stats, [(0, '\n', '')])
+    assert stats == {}
+
+
+def test_stats_failed(podman_stats):
+    with pytest.raises(Failed) as error:
+        _sample(podman_stats, [(125, '', 'cannot connect to podman')])
+    assert str(error.value) == (
+        'Unable to gather container stats: cannot connect to podman')
+
+
+def test_stats_malformed(podman_stats):
+    with pytest.raises(Failed) as error:
+        _sample(podman_stats, [(0, '[{"name": "keystone"', '')])
+    assert str(error.value).startswith('Unable to parse container stats')
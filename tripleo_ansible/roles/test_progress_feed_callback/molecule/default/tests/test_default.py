@@ -0,0 +1,152 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+import pytest
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PLUGIN = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'callback', 'progress_feed.py')
+
+EVENTS = 10000
+
+# Share of the time Ansible takes per task the callback may add to it.
+OVERHEAD = 0.01
+
+PLAYBOOK = """
+- hosts: localhost
+  connection: local
+  gather_facts: false
+  tasks: %s
+"""
+
+TASK = """
+    - name: Run a task
+      debug:
+        msg: task
+"""
+
+
+class FakeTask(object):
+    def get_name(self):
+        return 'task'
+
+
+class FakeHost(object):
+    name = 'localhost'
+
+
+class FakeResult(object):
+    _host = FakeHost()
+    _result = {'changed': False}
+
+
+@pytest.fixture
+def progress_feed(monkeypatch):
+    socket_dir = tempfile.mkdtemp()
+    monkeypatch.setenv(
+        'PROGRESS_FEED_SOCKET', os.path.join(socket_dir, 'progress.sock'))
+    monkeypatch.setenv('PROGRESS_FEED_BUFFER', '100')
+    spec = importlib.util.spec_from_file_location('progress_feed', PLUGIN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    callback = module.CallbackModule()
+    callback._listen()
+    try:
+        yield callback
+    finally:
+        for consumer in callback.consumers:
+            consumer.connection.close()
+        callback.server.close()
+        shutil.rmtree(socket_dir)
+
+
+@pytest.fixture
+def listener(progress_feed):
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        listener.connect(progress_feed.socket_path)
+        yield listener
+    finally:
+        listener.close()
+
+
+def _run_time(tmpdir, tasks):
+    playbook = tmpdir.join('playbook.yml')
+    playbook.write(PLAYBOOK % (TASK * tasks if tasks else '[]'))
+    env = dict(os.environ)
+    env.pop('ANSIBLE_CALLBACK_WHITELIST', None)
+    env.pop('ANSIBLE_CALLBACKS_ENABLED', None)
+    env['ANSIBLE_CONFIG'] = str(tmpdir.join('ansible.cfg'))
+    start = time.time()
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(
+            ['ansible-playbook', '-i', 'localhost,', str(playbook)],
+            stdin=devnull, stdout=devnull, stderr=devnull, env=env)
+    return time.time() - start
+
+
+@pytest.fixture(scope='module')
+def task_time(tmpdir_factory):
+    """Return the time Ansible takes per task without the callback."""
+    tmpdir = tmpdir_factory.mktemp('baseline')
+    tmpdir.join('ansible.cfg').write('')
+    return (_run_time(tmpdir, 30) - _run_time(tmpdir, 0)) / 30
+
+
+def _publish_time(callback):
+    """Return the time the callback takes per task on a single host."""
+    task = FakeTask()
+    result = FakeResult()
+    start = time.time()
+    for _ in range(EVENTS):
+        callback.v2_playbook_on_task_start(task, False)
+        callback.v2_runner_on_ok(result)
+    return (time.time() - start) / EVENTS
+
+
+def test_socket_removed(host):
+    assert not host.file("/tmp/ansible-progress.sock").exists
+
+
+def test_no_listener_latency(progress_feed, task_time):
+    # Publishing without any listener adds no noticeable time to a task,
+    # events are only kept in the ring buffer.
+    assert _publish_time(progress_feed) < task_time * OVERHEAD
+    assert len(progress_feed.events) == 100
+
+
+def test_stalled_listener_latency(progress_feed, listener, task_time):
+    # The listener never reads, once the socket buffer is full events are
+    # dropped from the ring buffer instead of blocking.
+    assert _publish_time(progress_feed) < task_time * OVERHEAD
+    assert len(progress_feed.consumers) == 1
+    assert len(progress_feed.consumers[0].pending) <= 100
@@ -0,0 +1,43 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import os
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+def test_textfile(host):
+    textfile = host.file("/tmp/tripleo_ansible.prom")
+    assert textfile.exists
+    samples = dict()
+    for line in textfile.content_string.splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    results = dict()
+    for name, value in samples.items():
+        if name.startswith('tripleo_ansible_task_results_total{'):
+            if 'role="test_prometheus_textfile_callback"' in name:
+                status = name.split('status="')[1].split('"')[0]
+                results[status] = value
+    assert results.get('ok', 0) >= 1
+    assert results.get('ignored', 0) >= 1
+    assert [v for k, v in samples.items()
+            if k.startswith('tripleo_ansible_playbook_running{')] == [0]
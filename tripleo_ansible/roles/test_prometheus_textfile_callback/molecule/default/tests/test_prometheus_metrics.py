@@ -0,0 +1,62 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import os
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+def test_task_duration_histogram(load_plugin, clock, monkeypatch, tmpdir,
+                                 fake_playbook, fake_play, fake_host,
+                                 fake_task, fake_result):
+    monkeypatch.setenv('PROMETHEUS_TEXTFILE', str(tmpdir.join('run.prom')))
+    prometheus_textfile = load_plugin('callback', 'prometheus_textfile')
+    callback = prometheus_textfile.CallbackModule()
+    callback.v2_playbook_on_start(fake_playbook('deploy.yml'))
+    callback.v2_playbook_on_play_start(fake_play('Deploy'))
+    task = fake_task('Install', role='packages')
+    callback.v2_playbook_on_task_start(task, False)
+    for host in ('controller-0', 'compute-0'):
+        callback.v2_runner_on_start(fake_host(host), task)
+    clock.advance(0.2)
+    callback.v2_runner_on_ok(fake_result('compute-0', task, {}))
+    clock.advance(4000)
+    callback.v2_runner_on_ok(
+        fake_result('controller-0', task, {'changed': True}))
+    assert callback.timer.running == {}
+    callback.v2_playbook_on_stats(None)
+
+    samples = dict(
+        line.rsplit(' ', 1) for line in tmpdir.join('run.prom').readlines(
+            cr=False)
+        if line and not line.startswith('#'))
+    series = 'play="Deploy",playbook="deploy.yml",role="packages"'
+    bucket = 'tripleo_ansible_task_duration_seconds_bucket{{{},le="{}"}}'
+    assert samples[bucket.format(series, '0.1')] == '0'
+    assert samples[bucket.format(series, '0.25')] == '1'
+    assert samples[bucket.format(series, '3600')] == '1'
+    assert samples[bucket.format(series, '+Inf')] == '2'
+    assert samples[
+        'tripleo_ansible_task_duration_seconds_sum{%s}' % series] == (
+        '4000.400')
+    assert samples['tripleo_ansible_task_results_total{%s,status="ok"}'
+                   % series] == '1'
+    assert samples['tripleo_ansible_task_results_total{%s,status="changed"}'
+                   % series] == '1'
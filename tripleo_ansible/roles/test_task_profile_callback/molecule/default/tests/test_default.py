@@ -0,0 +1,37 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+def test_profile(host):
+    profile_file = host.file("/tmp/task_profile.json")
+    assert profile_file.exists
+    profile = json.loads(profile_file.content_string)
+    slow = [v for k, v in profile['tasks'].items()
+            if k.endswith('Run a slow task')]
+    assert slow and slow[0]['max'] >= 1
+    assert 'test_task_profile_callback' in profile['roles']
+    for histogram in profile['hosts'].values():
+        assert len(histogram['buckets']) == len(profile['buckets']) + 1
+        assert sum(histogram['buckets']) == histogram['count']
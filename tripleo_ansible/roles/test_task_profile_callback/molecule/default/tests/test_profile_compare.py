@@ -0,0 +1,206 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import json
+import os
+
+import pytest
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PROFILE_COMPARE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'profile_compare.py')
+
+
+def _line(stamp, message, pid=100):
+    return '2019-09-01 12:00:{} p={} u=stack n=ansible | {}\n'.format(
+        stamp, pid, message)
+
+
+def _line_29(stamp, message, pid=100):
+    # Ansible 2.9 logs the user in p= and the pid in u=.
+    return '2019-09-01 12:00:{} p=stack u={} | {}\n'.format(
+        stamp, pid, message)
+
+
+BASE = [
+    _line('00,000', 'PLAY [Deploy] *****'),
+    _line('00,100', 'TASK [tripleo-bootstrap : Install packages] *****'),
+    _line('00,200', 'ok: [controller-0]'),
+    _line('05,100', 'TASK [Restart services] *****'),
+    _line('06,100', 'RUNNING HANDLER [Reload] *****'),
+    _line('06,600', 'PLAY RECAP *****'),
+]
+
+
+@pytest.fixture
+def profile_compare():
+    spec = importlib.util.spec_from_file_location(
+        'profile_compare', PROFILE_COMPARE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _durations(tasks):
+    return dict(
+        (key, [stats.count, round(stats.mean, 3)])
+        for key, stats in tasks.items())
+
+
+def test_parse_log(profile_compare):
+    assert _durations(profile_compare.parse_log(BASE)) == {
+        ('Deploy', 'tripleo-bootstrap', 'Install packages'): [1, 5.0],
+        ('Deploy', '', 'Restart services'): [1, 1.0],
+        ('Deploy', '', 'Reload'): [1, 0.5],
+    }
+
+
+def test_parse_log_processes(profile_compare):
+    lines = [
+        _line('00,000', 'PLAY [Deploy] *****', pid=1),
+        _line('00,000', 'PLAY [Other] *****', pid=2),
+        _line('01,000', 'TASK [Ping] *****', pid=1),
+        _line('02,000', 'TASK [Ping] *****', pid=2),
+        _line('03,000', 'TASK [Ping] *****', pid=1),
+        _line('06,000', 'PLAY RECAP *****', pid=2),
+        _line('07,000', 'PLAY RECAP *****', pid=1),
+    ]
+    assert _durations(profile_compare.parse_log(lines)) == {
+        ('Deploy', '', 'Ping'): [2, 3.0],
+        ('Other', '', 'Ping'): [1, 4.0],
+    }
+
+
+def test_parse_log_ansible_29(profile_compare):
+    lines = [
+        _line_29('00,000', 'PLAY [Deploy] *****', pid=1),
+        _line_29('00,000', 'PLAY [Other] *****', pid=2),
+        _line_29('01,000', 'TASK [Ping] *****', pid=1),
+        _line_29('02,000', 'TASK [Ping] *****', pid=2),
+        _line_29('03,000', 'TASK [Ping] *****', pid=1),
+        _line_29('06,000', 'PLAY RECAP *****', pid=2),
+        _line_29('07,000', 'PLAY RECAP *****', pid=1),
+    ]
+    assert _durations(profile_compare.parse_log(lines)) == {
+        ('Deploy', '', 'Ping'): [2, 3.0],
+        ('Other', '', 'Ping'): [1, 4.0],
+    }
+    # Users made of digits are told apart from pids by the logger name.
+    assert _durations(profile_compare.parse_log([
+        '2019-09-01 12:00:00,000 p=7 u=1000 n=ansible | TASK [Ping] **\n',
+        '2019-09-01 12:00:01,000 p=8 u=1000 n=ansible | TASK [Ping] **\n',
+        '2019-09-01 12:00:02,000 p=7 u=1000 n=ansible | PLAY RECAP **\n',
+    ])) == {('', '', 'Ping'): [1, 2.0]}
+
+
+def test_parse_log_malformed(profile_compare):
+    lines = [
+        _line('00,000', 'PLAY [Deploy] *****'),
+        _line('01,000', 'TASK [Ping] *****'),
+        'TASK [Not logged by ansible] *****\n',
+        '2019-09-01 12:00:02 p=100 u=stack |  TASK [No milliseconds]\n',
+        '2019-09-01 12:00:02,000 p=100 |  TASK [No user] ***\n',
+        '2019-13-45 12:00:02,000 p=100 u=stack |  TASK [Bad date] ***\n',
+        _line('02,000', 'TASK unterminated [header'),
+        _line('02,500', 'TASKS are not headers'),
+        '',
+        '\n',
+        _line('04,000', 'PLAY RECAP *****'),
+    ]
+    assert _durations(profile_compare.parse_log(lines)) == {
+        ('Deploy', '', 'Ping'): [1, 3.0],
+    }
+
+
+def test_parse_log_unfinished(profile_compare):
+    assert profile_compare.parse_log(BASE[:3]) == {}
+
+
+def _stats(profile_compare, *durations):
+    stats = profile_compare.Stats()
+    for duration in durations:
+        stats.add(duration)
+    return stats
+
+
+def test_compare(profile_compare):
+    base = {
+        ('p', '', 'slower'): _stats(profile_compare, 10),
+        ('p', '', 'faster'): _stats(profile_compare, 10),
+        ('p', '', 'small change'): _stats(profile_compare, 1),
+        ('p', '', 'below threshold'): _stats(profile_compare, 100),
+        ('p', '', 'removed'): _stats(profile_compare, 10),
+    }
+    new = {
+        ('p', '', 'slower'): _stats(profile_compare, 15),
+        ('p', '', 'faster'): _stats(profile_compare, 4),
+        ('p', '', 'small change'): _stats(profile_compare, 1.5),
+        ('p', '', 'below threshold'): _stats(profile_compare, 110),
+        ('p', '', 'added'): _stats(profile_compare, 10),
+    }
+    changes = profile_compare.compare(base, new, 20, 1)
+    assert [i['task'] for i in changes] == ['slower', 'faster']
+    assert changes[0] == {
+        'play': 'p',
+        'role': '',
+        'task': 'slower',
+        'before': 10.0,
+        'after': 15.0,
+        'delta': 5.0,
+        'samples': [1, 1]
+    }
+    assert changes[1]['delta'] == -6.0
+
+
+def test_compare_noise(profile_compare):
+    key = ('p', '', 'noisy')
+    base = {key: _stats(profile_compare, 2, 20, 5, 30)}
+    new = {key: _stats(profile_compare, 30, 4, 25, 10)}
+    assert profile_compare.compare(base, new, 20, 1) == []
+    new = {key: _stats(profile_compare, 60, 61, 59, 62)}
+    assert len(profile_compare.compare(base, new, 20, 1)) == 1
+
+
+def test_main(profile_compare, tmpdir, capsys):
+    base = tmpdir.join('base.log')
+    base.write(''.join(BASE))
+    new = tmpdir.join('new.log')
+    new.write(''.join(BASE).replace('05,100', '09,100').replace(
+        '06,100', '10,100').replace('06,600', '10,600'))
+    assert profile_compare.main(
+        [str(base), str(new), '--format', 'json']) == 1
+    summary = json.loads(capsys.readouterr().out)
+    assert summary['base'] == {'tasks': 3, 'duration': 6.5}
+    assert [i['task'] for i in summary['slowdowns']] == ['Install packages']
+    assert profile_compare.main([str(base), str(base)]) == 0
+
+
+def test_main_no_tasks(profile_compare, tmpdir, capsys):
+    base = tmpdir.join('base.log')
+    base.write(''.join(BASE))
+    new = tmpdir.join('new.log')
+    new.write('PLAY [Deploy] *****\nTASK [Ping] *****\n')
+    assert profile_compare.main([str(base), str(new)]) == 2
+    assert 'new.log: no tasks found' in capsys.readouterr().err
@@ -0,0 +1,87 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+
+import pytest
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+@pytest.fixture
+def task_timing(load_plugin):
+    return load_plugin('module_utils', 'task_timing')
+
+
+def test_histogram(task_timing):
+    histogram = task_timing.Histogram()
+    for duration in (0.05, 0.3, 0.4, 4000):
+        histogram.add(duration)
+    assert histogram.buckets == [1, 0, 2] + [0] * 11 + [1]
+    assert list(histogram.cumulative())[:3] == [(0.1, 1), (0.25, 1), (0.5, 3)]
+    assert list(histogram.cumulative())[-1] == (3600, 3)
+    assert histogram.quantile(0.5) == 0.5
+    assert histogram.quantile(0.95) == 4000
+    assert histogram.to_dict() == {
+        'count': 4,
+        'sum': 4000.75,
+        'max': 4000,
+        'p95': 4000,
+        'buckets': histogram.buckets
+    }
+
+
+def test_task_timer(task_timing, clock, fake_host, fake_task, fake_result):
+    timer = task_timing.TaskTimer()
+    task = fake_task('Install')
+    assert timer.task_started() == clock.now
+    clock.advance(2)
+    timer.host_started(fake_host('controller-0'), task)
+    assert timer.host_done(fake_result('controller-0', task, {})) == (
+        clock.now)
+    # A host which did not report a start is timed from the task start.
+    assert timer.host_done(fake_result('compute-0', task, {})) == (
+        clock.now - 2)
+    assert timer.running == {}
+
+
+def test_task_profile(load_plugin, clock, monkeypatch, tmpdir, fake_play,
+                      fake_host, fake_task, fake_result):
+    monkeypatch.setenv('TASK_PROFILE_FILE', str(tmpdir.join('profile.json')))
+    task_profile = load_plugin('callback', 'task_profile')
+    callback = task_profile.CallbackModule()
+    callback.v2_playbook_on_play_start(fake_play('Deploy'))
+    task = fake_task('Install', role='packages')
+    callback.v2_playbook_on_task_start(task, False)
+    for host in ('controller-0', 'compute-0'):
+        callback.v2_runner_on_start(fake_host(host), task)
+        clock.advance(2)
+    callback.v2_runner_on_ok(fake_result('compute-0', task, {}))
+    clock.advance(3)
+    callback.v2_runner_on_failed(fake_result('controller-0', task, {}))
+    assert callback.timer.running == {}
+    callback.v2_playbook_on_stats(None)
+
+    profile = json.loads(tmpdir.join('profile.json').read())
+    assert profile['tasks']['Deploy | packages : Install']['count'] == 2
+    assert profile['roles']['packages']['sum'] == 9
+    assert profile['hosts']['controller-0']['max'] == 7
+    assert profile['hosts']['compute-0']['max'] == 2
@@ -0,0 +1,37 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+def test_trace(host):
+    trace_file = host.file("/tmp/ansible-trace.json")
+    assert trace_file.exists
+    events = json.loads(trace_file.content_string)
+    spans = dict((e['name'], e) for e in events if e['ph'] == 'X')
+    assert 'run_once' in spans['Run a task once']['cat']
+    assert 'delegated' in spans['Run a delegated task']['cat']
+    hosts = [e['args']['name'] for e in events
+             if e['ph'] == 'M' and e['name'] == 'thread_name']
+    assert 'tasks' in hosts
+    assert len(hosts) > 1
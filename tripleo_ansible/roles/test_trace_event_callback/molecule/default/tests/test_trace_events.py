@@ -0,0 +1,53 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import json
+import os
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+def test_task_spans(load_plugin, clock, monkeypatch, tmpdir, fake_playbook,
+                    fake_play, fake_host, fake_task, fake_result):
+    monkeypatch.setenv('TRACE_EVENT_FILE', str(tmpdir.join('trace.json')))
+    trace_event = load_plugin('callback', 'trace_event')
+    callback = trace_event.CallbackModule()
+    callback.v2_playbook_on_start(fake_playbook('deploy.yml'))
+    callback.v2_playbook_on_play_start(fake_play('Deploy'))
+    task = fake_task('Install', run_once=True)
+    clock.advance(1)
+    callback.v2_playbook_on_task_start(task, False)
+    clock.advance(1)
+    callback.v2_runner_on_start(fake_host('controller-0'), task)
+    clock.advance(2)
+    callback.v2_runner_on_ok(fake_result('controller-0', task, {}))
+    # The result of a host which did not report a start.
+    callback.v2_runner_on_failed(fake_result('compute-0', task, {}))
+    assert callback.timer.running == {}
+    callback.v2_playbook_on_stats(None)
+
+    events = json.loads(tmpdir.join('trace.json').read())
+    spans = [(e['tid'], e['ts'], e['dur'], e['cat'])
+             for e in events if e['ph'] == 'X']
+    assert spans == [
+        (1, 2000000.0, 2000000.0, 'task,run_once'),
+        (2, 1000000.0, 3000000.0, 'task,run_once'),
+        (trace_event.TASKS_TID, 1000000.0, 3000000.0, 'task,run_once')
+    ]
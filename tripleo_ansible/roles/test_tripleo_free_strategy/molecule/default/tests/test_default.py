@@ -0,0 +1,89 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import os
+import subprocess
+import sys
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+STRATEGY_PLUGINS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'strategy')
+
+INCLUDED = """
+- name: Run a task once
+  shell: echo {{ inventory_hostname }} >> once.log
+  args:
+    chdir: "%(dir)s"
+  run_once: true
+"""
+
+PLAYBOOK = """
+- hosts: all
+  gather_facts: false
+  strategy: tripleo_free
+  tasks:
+    - name: Run a task taking a different time on every host
+      command: "sleep {{ ansible_play_hosts.index(inventory_hostname) * 0.2 }}"
+    - name: Include a task run once
+      include_tasks: "%(dir)s/included.yml"
+    - name: Fail on one host
+      command: "{{ 'false' if inventory_hostname == 'host3' else 'true' }}"
+      any_errors_fatal: true
+    - name: Run a task after the failure
+      shell: echo {{ inventory_hostname }} >> after.log
+      args:
+        chdir: "%(dir)s"
+"""
+
+
+def test_run_once(host):
+    # /tmp is shared by all the hosts, the task run once must have run on
+    # the first host only and its result must be known by all hosts.
+    results = set()
+    for name in testinfra_hosts:
+        once_file = host.file("/tmp/tripleo-free-once-{}".format(name))
+        assert once_file.exists
+        results.add(once_file.content_string.strip())
+    assert len(results) == 1
+
+
+def test_included_run_once_any_errors_fatal(tmpdir):
+    # Hosts reaching the include at different times get their own copy of
+    # the included task, it must still run once, and no host may go past
+    # the failed any_errors_fatal task.
+    tmpdir.join('inventory').write(''.join(
+        'host{} ansible_connection=local ansible_python_interpreter={}\n'
+        .format(i, sys.executable) for i in range(8)))
+    tmpdir.join('included.yml').write(INCLUDED % {'dir': tmpdir})
+    tmpdir.join('playbook.yml').write(PLAYBOOK % {'dir': tmpdir})
+    env = dict(os.environ)
+    env['ANSIBLE_STRATEGY_PLUGINS'] = STRATEGY_PLUGINS
+    with open(os.devnull) as devnull:
+        rc = subprocess.call(
+            ['ansible-playbook', '-i', str(tmpdir.join('inventory')),
+             str(tmpdir.join('playbook.yml'))],
+            stdin=devnull, stdout=devnull, env=env)
+    assert rc == 2
+    assert len(tmpdir.join('once.log').readlines()) == 1
+    assert not tmpdir.join('after.log').exists()
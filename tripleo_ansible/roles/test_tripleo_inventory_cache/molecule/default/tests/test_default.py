@@ -0,0 +1,151 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import os
+import tempfile
+import time
+
+import yaml
+
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import inventory_loader
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+PLUGIN_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'inventory')
+
+INVENTORY = {
+    'Controller': {
+        'hosts': dict(
+            ('controller-{}'.format(i), {'ctlplane_ip': '192.168.24.{}'.format(i)})
+            for i in range(3)),
+        'vars': {'tripleo_role_name': 'Controller'}
+    },
+    'Compute': {
+        'hosts': dict(
+            ('compute-{}'.format(i), {'ctlplane_ip': '192.168.25.{}'.format(i)})
+            for i in range(100)),
+        'vars': {'tripleo_role_name': 'Compute'}
+    },
+    'overcloud': {
+        'children': {'Controller': {}, 'Compute': {}},
+        'vars': {'container_cli': 'podman'}
+    }
+}
+
+
+def _parse(plugin_name, path):
+    inventory_loader.add_directory(PLUGIN_DIR)
+    inventory = InventoryData()
+    inventory_loader.get(plugin_name).parse(inventory, DataLoader(), path)
+    hosts = dict(
+        (name, (sorted(g.name for g in host.groups), host.vars))
+        for name, host in inventory.hosts.items())
+    groups = dict(
+        (name, group.vars) for name, group in inventory.groups.items())
+    return hosts, groups
+
+
+def test_cache():
+    work_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(work_dir, 'cache')
+    os.environ['TRIPLEO_INVENTORY_CACHE_DIR'] = cache_dir
+    path = os.path.join(work_dir, 'inventory.yaml')
+    with open(path, 'w') as f:
+        yaml.safe_dump(INVENTORY, f)
+
+    expected = _parse('yaml', path)
+    assert len(expected[0]) == 103
+    assert _parse('tripleo_inventory_cache', path) == expected
+    assert len(os.listdir(cache_dir)) == 1
+    # The second parse is done from the cache.
+    assert _parse('tripleo_inventory_cache', path) == expected
+    assert len(os.listdir(cache_dir)) == 1
+
+    # A modified inventory gets its own cache entry.
+    with open(path, 'a') as f:
+        f.write('Undercloud:\n  hosts:\n    undercloud: {}\n')
+    hosts, groups = _parse('tripleo_inventory_cache', path)
+    assert 'Undercloud' in groups
+    assert 'undercloud' in hosts
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_ansible_tag_not_cached():
+    work_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(work_dir, 'cache')
+    os.environ['TRIPLEO_INVENTORY_CACHE_DIR'] = cache_dir
+    path = os.path.join(work_dir, 'inventory.yaml')
+    with open(path, 'w') as f:
+        f.write('all:\n  hosts:\n    node-0:\n      secret: !unsafe "{{ x }}"\n')
+    hosts, _ = _parse('tripleo_inventory_cache', path)
+    assert hosts['node-0'][1]['secret'] == '{{ x }}'
+    assert not os.path.exists(cache_dir)
+
+
+def test_unused_cache_pruned():
+    work_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(work_dir, 'cache')
+    os.environ['TRIPLEO_INVENTORY_CACHE_DIR'] = cache_dir
+    os.environ['TRIPLEO_INVENTORY_CACHE_MAX_AGE'] = '3600'
+    try:
+        os.makedirs(cache_dir)
+        expired = time.time() - 7200
+        for name in ('old-py27.marshal', '.interrupted', 'README'):
+            open(os.path.join(cache_dir, name), 'w').close()
+            os.utime(os.path.join(cache_dir, name), (expired, expired))
+        open(os.path.join(cache_dir, 'recent-py27.marshal'), 'w').close()
+
+        path = os.path.join(work_dir, 'inventory.yaml')
+        with open(path, 'w') as f:
+            yaml.safe_dump(INVENTORY, f)
+        _parse('tripleo_inventory_cache', path)
+        names = os.listdir(cache_dir)
+        assert 'old-py27.marshal' not in names
+        assert '.interrupted' not in names
+        assert 'README' in names
+        assert 'recent-py27.marshal' in names
+        cache_file = [i for i in names if i not in (
+            'README', 'recent-py27.marshal')][0]
+
+        # Using a cache file keeps it from being pruned.
+        cache_path = os.path.join(cache_dir, cache_file)
+        os.utime(cache_path, (expired, expired))
+        _parse('tripleo_inventory_cache', path)
+        assert os.path.getmtime(cache_path) > expired
+        with open(path, 'a') as f:
+            f.write('Undercloud:\n  hosts:\n    undercloud: {}\n')
+        _parse('tripleo_inventory_cache', path)
+        assert cache_file in os.listdir(cache_dir)
+
+        # With a max age of 0 nothing is removed.
+        os.environ['TRIPLEO_INVENTORY_CACHE_MAX_AGE'] = '0'
+        os.utime(cache_path, (expired, expired))
+        with open(path, 'a') as f:
+            f.write('Standalone:\n  hosts:\n    standalone: {}\n')
+        _parse('tripleo_inventory_cache', path)
+        assert cache_file in os.listdir(cache_dir)
+    finally:
+        del os.environ['TRIPLEO_INVENTORY_CACHE_MAX_AGE']
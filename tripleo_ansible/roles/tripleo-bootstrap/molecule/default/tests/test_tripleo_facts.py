@@ -0,0 +1,107 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import os
+
+import pytest
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+MODULE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'modules', 'tripleo_facts.py')
+
+
+@pytest.fixture
+def tripleo_facts():
+    spec = importlib.util.spec_from_file_location('tripleo_facts', MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def collectors(tripleo_facts, monkeypatch):
+    """Replace the fact collectors, return the names of those run."""
+    ran = list()
+
+    def collector(name, facts):
+        class Collector(object):
+            def collect(self, module=None, collected_facts=None):
+                ran.append(name)
+                return dict(facts)
+        return Collector
+
+    monkeypatch.setattr(tripleo_facts, 'COLLECTORS', (
+        (collector('distribution', {
+            'distribution': 'CentOS',
+            'distribution_major_version': '7',
+            'os_family': 'RedHat'
+        }), ('distribution', 'distribution_major_version', 'os_family')),
+        (collector('ssh', {
+            'ssh_host_key_rsa_public': 'AAAA',
+            'ssh_host_key_rsa_public_keytype': 'ssh-rsa'
+        }), ('ssh_host_key_rsa_public', 'ssh_host_key_rsa_public_keytype')),
+        (collector('platform', {
+            'fqdn': 'controller-0.localdomain',
+            'hostname': 'controller-0'
+        }), ('fqdn', 'hostname')),
+    ))
+    return ran
+
+
+def test_requested_facts_only(tripleo_facts, collectors):
+    facts = tripleo_facts.gather_facts(
+        None, ['ansible_distribution*', 'os_family'])
+    assert collectors == ['distribution']
+    assert facts == {
+        'ansible_distribution': 'CentOS',
+        'ansible_distribution_major_version': '7',
+        'ansible_os_family': 'RedHat'
+    }
+
+
+def test_requested_subsets(tripleo_facts, collectors):
+    facts = tripleo_facts.gather_facts(
+        None, ['ansible_ssh_host_key_rsa_public', 'hostname'])
+    assert collectors == ['ssh', 'platform']
+    assert facts == {
+        'ansible_ssh_host_key_rsa_public': 'AAAA',
+        'ansible_hostname': 'controller-0'
+    }
+
+
+def test_no_facts(tripleo_facts, collectors):
+    assert tripleo_facts.gather_facts(None, []) == {}
+    assert collectors == []
+
+
+def test_unknown_facts(tripleo_facts):
+    assert tripleo_facts.unknown_facts([
+        'ansible_distribution*',
+        'ansible_ssh_host_key_*',
+        'fqdn',
+        'ansible_memtotal_mb',
+        'ansible_eth*',
+        'mounts'
+    ]) == ['ansible_memtotal_mb', 'ansible_eth*', 'mounts']
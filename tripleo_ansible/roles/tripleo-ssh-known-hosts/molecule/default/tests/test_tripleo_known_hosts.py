@@ -0,0 +1,136 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import importlib.util
+import json
+import os
+
+import pytest
+
+from ansible.module_utils import basic
+from ansible.module_utils._text import to_bytes
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('all')
+
+
+MODULE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, os.pardir, os.pardir, os.pardir,
+    'ansible_plugins', 'modules', 'tripleo_known_hosts.py')
+
+CONTROLLER = '[10.0.0.1]*,[controller-0]* ssh-rsa AAAACONTROLLER'
+COMPUTE = '[10.0.0.2]*,[compute-0]* ssh-rsa AAAACOMPUTE'
+COMPUTE_OLD = '[10.0.0.2]*,[compute-0]* ssh-rsa AAAAOLD'
+COMPUTE_ED25519 = '[10.0.0.2]*,[compute-0]* ssh-ed25519 AAAAED25519'
+OPERATOR = 'bastion ssh-rsa AAAABASTION'
+
+
+@pytest.fixture
+def known_hosts(tmpdir):
+    return tmpdir.join('ssh_known_hosts')
+
+
+def _run(monkeypatch, capsys, check_mode=False, **args):
+    """Run the module with the given arguments, return its result."""
+    spec = importlib.util.spec_from_file_location(
+        'tripleo_known_hosts', MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    args['_ansible_check_mode'] = check_mode
+    args['_ansible_diff'] = True
+    monkeypatch.setattr(basic, '_ANSIBLE_ARGS', to_bytes(
+        json.dumps({'ANSIBLE_MODULE_ARGS': args})))
+    with pytest.raises(SystemExit):
+        module.main()
+    return json.loads(capsys.readouterr().out)
+
+
+def test_no_duplicate_lines(host):
+    content = host.file("/etc/ssh/ssh_known_hosts").content_string
+    assert len(content.splitlines()) == len(set(content.splitlines()))
+
+
+def test_lines_added_in_place(monkeypatch, capsys, known_hosts):
+    known_hosts.write(OPERATOR + '\n' + CONTROLLER)
+    inode = known_hosts.stat().ino
+    result = _run(monkeypatch, capsys, path=str(known_hosts),
+                  lines=[CONTROLLER, COMPUTE, COMPUTE])
+    assert result['changed'] is True
+    assert result['added'] == 1
+    assert known_hosts.read() == '\n'.join(
+        [OPERATOR, CONTROLLER, COMPUTE, ''])
+    assert known_hosts.stat().ino == inode
+
+
+def test_file_created(monkeypatch, capsys, known_hosts):
+    result = _run(monkeypatch, capsys, path=str(known_hosts),
+                  lines=[CONTROLLER])
+    assert result['added'] == 1
+    assert known_hosts.read() == CONTROLLER + '\n'
+    assert known_hosts.stat().mode & 0o777 == 0o644
+
+
+def test_idempotent(monkeypatch, capsys, known_hosts):
+    known_hosts.write(CONTROLLER + '\r\n' + COMPUTE + '\n')
+    mtime = known_hosts.stat().mtime
+    result = _run(monkeypatch, capsys, path=str(known_hosts),
+                  lines=[COMPUTE, CONTROLLER], remove_stale=True)
+    assert result['changed'] is False
+    assert result['added'] == result['removed'] == 0
+    assert known_hosts.stat().mtime == mtime
+
+
+def test_stale_lines_removed(monkeypatch, capsys, known_hosts):
+    known_hosts.write('\n'.join([
+        '# managed by TripleO', COMPUTE_OLD, OPERATOR, COMPUTE_ED25519,
+        CONTROLLER, COMPUTE_OLD, '']))
+    inode = known_hosts.stat().ino
+    result = _run(monkeypatch, capsys, path=str(known_hosts),
+                  lines=[CONTROLLER, COMPUTE], remove_stale=True)
+    assert result['changed'] is True
+    assert result['added'] == 1
+    assert result['removed'] == 2
+    # Other hosts and the other key types of the host are kept.
+    assert known_hosts.read() == '\n'.join([
+        '# managed by TripleO', OPERATOR, COMPUTE_ED25519, CONTROLLER,
+        COMPUTE, ''])
+    assert known_hosts.stat().ino == inode
+
+    result = _run(monkeypatch, capsys, path=str(known_hosts),
+                  lines=[CONTROLLER, COMPUTE], remove_stale=True)
+    assert result['changed'] is False
+
+
+def test_stale_lines_kept_by_default(monkeypatch, capsys, known_hosts):
+    known_hosts.write(COMPUTE_OLD + '\n')
+    result = _run(monkeypatch, capsys, path=str(known_hosts),
+                  lines=[COMPUTE])
+    assert result['removed'] == 0
+    assert known_hosts.read() == COMPUTE_OLD + '\n' + COMPUTE + '\n'
+
+
+def test_check_mode(monkeypatch, capsys, known_hosts):
+    known_hosts.write(COMPUTE_OLD)
+    result = _run(monkeypatch, capsys, check_mode=True,
+                  path=str(known_hosts), lines=[COMPUTE], remove_stale=True)
+    assert result['changed'] is True
+    assert result['diff']['before'] == COMPUTE_OLD
+    assert result['diff']['after'] == COMPUTE + '\n'
+    assert known_hosts.read() == COMPUTE_OLD
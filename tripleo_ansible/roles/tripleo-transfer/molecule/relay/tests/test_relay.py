@@ -0,0 +1,40 @@
+# Copyright 2019 Red Hat, Inc.
+# All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import os
+
+import testinfra.utils.ansible_runner
+
+
+testinfra_hosts = testinfra.utils.ansible_runner.AnsibleRunner(
+    os.environ['MOLECULE_INVENTORY_FILE']).get_hosts('overcloud-controller-1')
+
+
+def test_directory_transferred(host):
+    origin = host.file('/srv/transfer-dest/origin')
+    assert origin.is_file
+    assert origin.content_string == 'overcloud-controller-0\n'
+
+
+def test_permissions_kept(host):
+    secret = host.file('/srv/transfer-dest/nested/secret')
+    assert secret.content_string == 'secret\n'
+    assert secret.mode == 0o600
+    assert secret.user == 'root'
+
+
+def test_source_directory_not_copied(host):
+    assert not host.file('/srv/transfer-src').exists